@@ -9,6 +9,49 @@ REDDIT_CLIENT_ID = os.getenv("REDDIT_CLIENT_ID")
 REDDIT_CLIENT_SECRET = os.getenv("REDDIT_CLIENT_SECRET")
 REDDIT_USER_AGENT = os.getenv("REDDIT_USER_AGENT")
 
+# Width the meme is scaled to on the 1080x1920 canvas; image downloads
+# pick the smallest Reddit preview at least this wide
+OVERLAY_WIDTH = 920
+
+# Reddit-hosted videos longer than this are not used as foregrounds
+MAX_FOREGROUND_CLIP_SECONDS = 60
+
+# Foreground motion, evaluated inside the merge filter graph: any of
+# "zoom" (slow push-in), "pan" (scroll through images taller than
+# FOREGROUND_VIEW_HEIGHT once scaled) and "bounce" (lift on word onsets)
+FOREGROUND_MOTION = [
+    name.strip()
+    for name in os.getenv("FOREGROUND_MOTION", "").lower().split(",")
+    if name.strip()
+]
+FOREGROUND_VIEW_HEIGHT = 1860
+FOREGROUND_ZOOM_PER_SECOND = 0.004
+FOREGROUND_ZOOM_MAX = 1.1
+FOREGROUND_PAN_HOLD_SECONDS = 1.0
+FOREGROUND_BOUNCE_PIXELS = 14
+FOREGROUND_BOUNCE_SECONDS = 0.18
+
+# Runtime config blob (subreddits, time filters, voice, duration window),
+# validated by services.config_service
+RUNTIME_CONFIG_BLOB = "reddit_config.json"
+
+# Duration-aware selection: narration pace used for estimates, and the
+# preferred total video length window (narration + 4 s of padding).
+# reddit_config.json may override the window with "duration_window".
+NARRATION_WORDS_PER_SECOND = 2.6
+VIDEO_PADDING_SECONDS = 4
+TARGET_DURATION_MIN_SECONDS = 6
+TARGET_DURATION_MAX_SECONDS = 30
+
+# Perceptual-hash dedup of published images (64-bit dHash)
+PHASH_INDEX_BLOB = "phash_index.bin"
+PHASH_MAX_DISTANCE = 6
+
+# Candidate harvesting: concurrent listings (kept low to respect Reddit's
+# per-client rate limit) and how many unseen image posts are enough
+REDDIT_MAX_CONCURRENCY = 4
+REDDIT_CANDIDATE_TARGET = 20
+
 # Cloud
 BUCKET_NAME = "yt-reddit"
 
@@ -16,12 +59,156 @@ BUCKET_NAME = "yt-reddit"
 FFMPEG_PATH = "ffmpeg"
 FFPROBE_PATH = "ffprobe"
 
+# Concurrent ffmpeg encodes; 0 sizes it from the container CPU quota
+FFMPEG_MAX_CONCURRENT = int(os.getenv("FFMPEG_MAX_CONCURRENT", "0"))
+FFMPEG_MIN_THREADS_PER_JOB = 2
+
+# ffmpeg watchdog: kill when output time stops advancing, or after
+# base + per-second-of-output; the default applies when length is unknown
+FFMPEG_STALL_TIMEOUT_SECONDS = int(os.getenv("FFMPEG_STALL_TIMEOUT_SECONDS", "60"))
+FFMPEG_DEADLINE_BASE_SECONDS = 120
+FFMPEG_DEADLINE_PER_MEDIA_SECOND = 10
+FFMPEG_DEFAULT_TIMEOUT_SECONDS = 900
+FFMPEG_PROGRESS_LOG_SECONDS = 10
+
 CSV_FILE = "/tmp/posts.csv"
 ERROR_FILE = "/tmp/errors.csv"
 POST_TIMES_FILE = "/tmp/post_times.csv"
 
-LOCAL_MUSIC_DIR = "/tmp/music"
-LOCAL_GAMEPLAY_DIR = "/tmp/gameplay"
+# Asset caches. On /tmp they are RAM-backed on Cloud Run and add to the
+# workspace budget, so the defaults are small (the most recent clip is
+# always kept); larger sizes expect the directories on a mounted volume,
+# which also shares them across instances
+LOCAL_MUSIC_DIR = os.getenv("LOCAL_MUSIC_DIR", "/tmp/music")
+LOCAL_GAMEPLAY_DIR = os.getenv("LOCAL_GAMEPLAY_DIR", "/tmp/gameplay")
+ASSET_CACHE_MUSIC_MB = int(os.getenv("ASSET_CACHE_MUSIC_MB", "32"))
+ASSET_CACHE_GAMEPLAY_MB = int(os.getenv("ASSET_CACHE_GAMEPLAY_MB", "128"))
 TOKEN_FILE = "/tmp/Tctoken.pickle"
 
-PREDEFINED_TAGS = ["meme", "funny", "humor", "wholesome"]
\ No newline at end of file
+# GCS transfers at or above this size are split into concurrent chunks
+GCS_PARALLEL_THRESHOLD_MB = int(os.getenv("GCS_PARALLEL_THRESHOLD_MB", "32"))
+GCS_CHUNK_SIZE_MB = 8
+GCS_MAX_WORKERS = int(os.getenv("GCS_MAX_WORKERS", "8"))
+
+# Outbound calls (utils.network): pooled sessions, retry budgets and
+# hedged reads. Retries may add at most RATIO per call plus a slow
+# time-based refill, so an outage never turns into a retry storm.
+NET_POOL_SIZE = int(os.getenv("NET_POOL_SIZE", "16"))
+NET_RETRY_BUDGET_RATIO = 0.2
+NET_RETRY_BUDGET_BURST = 10
+NET_RETRY_REFILL_PER_MINUTE = 6
+# Idempotent reads slower than this latency percentile get a second,
+# concurrent request; the first answer wins
+NET_HEDGING = os.getenv("NET_HEDGING", "true").lower() == "true"
+NET_HEDGE_PERCENTILE = 95
+NET_HEDGE_WORKERS = 32
+
+# Per-run workspace for intermediates (RAM-backed /tmp on Cloud Run);
+# a run fails once the files in it exceed WORKSPACE_BUDGET_MB
+WORKSPACE_ROOT = "/tmp/runs"
+WORKSPACE_BUDGET_MB = int(os.getenv("WORKSPACE_BUDGET_MB", "512"))
+
+# YouTube credentials cached as JSON in the bucket; refreshed this many
+# seconds before expiry so the upload never waits on a token refresh.
+TOKEN_JSON_BLOB = "youtube_token.json"
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+# Fallback for client libraries that do not ship static discovery docs
+DISCOVERY_DOC_BLOB = "youtube_v3_discovery.json"
+DISCOVERY_DOC_FILE = "/tmp/youtube_v3_discovery.json"
+
+PREDEFINED_TAGS = ["meme", "funny", "humor", "wholesome"]
+
+# Optional channel profiles (credentials blob plus title/description
+# templates per channel); when present one render is uploaded to all
+# of them, at most CHANNEL_UPLOAD_CONCURRENCY at a time
+CHANNELS_BLOB = "channels.json"
+CHANNEL_UPLOAD_CONCURRENCY = int(os.getenv("CHANNEL_UPLOAD_CONCURRENCY", "3"))
+
+# YouTube Data API quota. Every videos.insert spends
+# YOUTUBE_UPLOAD_QUOTA_COST units of the project's daily budget, which
+# resets at midnight Pacific time; spend is kept in a ledger blob per
+# project per day so runs stop before rendering what cannot be uploaded.
+YOUTUBE_PROJECT_ID = os.getenv("YOUTUBE_PROJECT_ID", "default")
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+YOUTUBE_UPLOAD_QUOTA_COST = int(os.getenv("YOUTUBE_UPLOAD_QUOTA_COST", "1600"))
+QUOTA_LEDGER_PREFIX = "quota/"
+QUOTA_TIMEZONE = "America/Los_Angeles"
+# Render-only jobs stop once the queue holds this many days of uploads
+QUOTA_RENDER_AHEAD_DAYS = 2
+
+# Pipeline mode: "full" renders and uploads in one run, "render" only
+# renders into the publish queue, "publish" only drains the queue,
+# "compile" joins recently cached segments into one longer video.
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "full").lower()
+
+# Resident worker (worker.py). Job requests ({"mode": ...} JSON) are
+# pulled from WORKER_PREFIX in the bucket, or from WORKER_QUEUE_DIR
+# when set. A running job's claim is refreshed every third of
+# WORKER_CLAIM_TIMEOUT_SECONDS; one not refreshed within the timeout
+# belongs to a worker that died mid-job and is taken over.
+WORKER_PREFIX = "worker/"
+WORKER_QUEUE_DIR = os.getenv("WORKER_QUEUE_DIR")
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "15"))
+# 0 keeps the worker running while idle
+WORKER_IDLE_EXIT_SECONDS = float(os.getenv("WORKER_IDLE_EXIT_SECONDS", "0"))
+WORKER_CLAIM_TIMEOUT_SECONDS = float(os.getenv("WORKER_CLAIM_TIMEOUT_SECONDS", "600"))
+
+# Opt-in profiling (PROFILE_RUN=true): Python stack samples (or cProfile
+# with PROFILE_MODE=cprofile), tracemalloc at stage boundaries and
+# per-child ffmpeg rusage, uploaded as one bundle per run
+PROFILE_RUN = os.getenv("PROFILE_RUN", "false").lower() == "true"
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample").lower()
+PROFILE_SAMPLE_INTERVAL_MS = 10
+PROFILE_TOP_ALLOCATIONS = 15
+PROFILE_PREFIX = "diagnostics/"
+
+# Publishing
+# Upload the final render while it is still being encoded (fragmented MP4)
+STREAM_PUBLISH = os.getenv("STREAM_PUBLISH", "false").lower() == "true"
+
+# Captions: ASS written from the alignment, words grouped into short
+# phrases. Fonts load from the bundled directory, whose fontconfig cache
+# is prebuilt in the image, so libass never scans system fonts.
+CAPTION_FONTS_DIR = os.getenv(
+    "CAPTION_FONTS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "fonts")
+)
+CAPTION_FONT = "Montserrat"
+CAPTION_FONT_SIZE = 80
+CAPTION_MAX_WORDS = 3
+CAPTION_MAX_CHARS = 18
+CAPTION_MAX_GAP_SECONDS = 0.35
+CAPTION_KARAOKE = os.getenv("CAPTION_KARAOKE", "false").lower() == "true"
+
+# Extra renditions encoded alongside the master from the same decode
+# (see video_service.RENDITIONS); uploaded under RENDITIONS_PREFIX
+OUTPUT_RENDITIONS = [
+    name.strip()
+    for name in os.getenv("OUTPUT_RENDITIONS", "compressed").split(",")
+    if name.strip()
+]
+RENDITIONS_PREFIX = "renditions/"
+
+# Size-targeted encoding of the final renditions (video_service.ENCODE_PROFILES),
+# as a video bytes-per-second budget per profile. "capped" is CRF held
+# under a maxrate/bufsize cap; "two_pass" adds a fast analysis pass and
+# then encodes at the budget's average bitrate
+ENCODE_MODE = os.getenv("ENCODE_MODE", "capped").lower()
+MASTER_VIDEO_BYTES_PER_SECOND = int(os.getenv("MASTER_VIDEO_BYTES_PER_SECOND", "500000"))
+COMPRESSED_VIDEO_BYTES_PER_SECOND = int(os.getenv("COMPRESSED_VIDEO_BYTES_PER_SECOND", "150000"))
+
+# Content-addressed cache of uniformly encoded segments for compilations
+RENDER_CACHE_PREFIX = "render_cache/segments/"
+COMPILATION_DAYS = 7
+COMPILATION_SIZE = 10
+
+# Render/publish work queue
+QUEUE_PREFIX = "queue/"
+PUBLISH_SLOTS_BLOB = "queue/slots.json"
+PUBLISH_SLOT_HOURS_UTC = [15, 19, 23]
+PUBLISH_LEAD_MINUTES = 60
+PUBLISH_BATCH_LIMIT = int(os.getenv("PUBLISH_BATCH_LIMIT", "5"))
+# A publish claim older than this was left by a job that died mid-publish
+# and is taken over by the next publish run
+PUBLISH_CLAIM_TIMEOUT_SECONDS = int(os.getenv("PUBLISH_CLAIM_TIMEOUT_SECONDS", "3600"))
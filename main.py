@@ -1,92 +1,367 @@
+import os
 import sys
 import gc
 import logging
 
 from utils.logger import setup_logging
 from services.reddit_service import fetch_top_post
-from services.tts_service import text_to_speech_with_alignment, save_srt
-from services.video_service import create_video_from_image, merge_with_background, burn_srt_subtitles
+from services.tts_service import text_to_speech_with_alignment
+from services.caption_service import save_ass
+from services.video_service import (
+    merge_with_background,
+    render_renditions,
+    start_fragmented_subtitle_burn,
+    unknown_renditions,
+    unknown_motion_effects,
+    RENDITIONS,
+    MOTION_EFFECTS,
+    ENCODE_MODES
+)
 from services.audio_service import merge_audio_tracks, trim_music_random, get_audio_duration
-from services.youtube_service import upload_video
+from services.youtube_service import upload_video, upload_video_streaming, UploadNotAttemptedError
 from services.storage_service import (
     get_random_music_file,
     get_next_gameplay_file,
-    download_from_gcs
+    upload_to_gcs
+)
+from services.queue_service import enqueue_render, drain_publish_queue, queue_has_capacity
+from services.quota_service import (
+    QuotaExhaustedError,
+    upload_projects,
+    reserve_uploads,
+    release_uploads,
+    release_unattempted
 )
-from utils.logging_utils import cleanup_files, log_error
+from services.config_service import load_runtime_config
+from services.phash_service import record_published_hash
+from services.compilation_service import cache_segment, select_recent_segments, build_compilation
+from services.channel_service import load_channel_profiles, publish_to_channels
+from utils.logging_utils import cleanup_files, log_error, log_post, log_post_time
 from utils.job_control import should_run_job
+from utils.workspace import Workspace
+from utils.ffmpeg_runner import log_scheduler_metrics
+from utils.network import log_network_metrics
+from utils.timing import stage
+from utils.profiling import profiled_run
+from config import (
+    STREAM_PUBLISH,
+    PIPELINE_MODE,
+    PUBLISH_BATCH_LIMIT,
+    OUTPUT_RENDITIONS,
+    FOREGROUND_MOTION,
+    ENCODE_MODE,
+    RENDITIONS_PREFIX,
+    COMPILATION_DAYS,
+    COMPILATION_SIZE,
+    VIDEO_PADDING_SECONDS
+)
 
 logger = logging.getLogger(__name__)
 
 
-CONFIG_PATH = "/tmp/reddit_config.json"
+def render_short(ws, publish_streamed=False):
+    """
+    Runs the render half of the pipeline inside workspace `ws`.
+    Returns (final_video, title, subreddit_name, image_hash), or None when no post
+    was available. With publish_streamed the final encode is uploaded
+    as it is produced and final_video is None.
+    """
+    # 🔴 REQUIRED: validated runtime config, before any paid work
+    with stage("config"):
+        runtime_config = load_runtime_config()
 
+    logger.info("fetching_reddit_post")
+    with stage("reddit"):
+        title, image_path, subreddit_name, image_hash = fetch_top_post(runtime_config, image_dir=ws.dir)
 
-def main():
-    setup_logging()
+    if not title:
+        logger.warning("no_post_found_exiting")
+        return None
 
-    logger.info("job_started")
+    ws.track(image_path)
 
-    if not should_run_job(10):
-        logger.info("job_skipped_threshold_condition")
-        sys.exit(0)
+    logger.info("generating_tts")
+    with stage("tts"):
+        tts_audio, align_data = text_to_speech_with_alignment(
+            title,
+            config=runtime_config,
+            output_audio=ws.path("tts_output.mp3"),
+            trimmed_audio=ws.path("trimmed_tts_output.mp3")
+        )
+
+    # The untrimmed narration is only needed inside the TTS step
+    if tts_audio != ws.path("tts_output.mp3"):
+        ws.discard(ws.path("tts_output.mp3"))
+
+    ws.track(tts_audio)
+
+    subtitle_file = ws.path("output_captions.ass")
+    save_ass(align_data, output_ass=subtitle_file)
+    ws.track(subtitle_file)
+
+    duration = get_audio_duration(tts_audio) + VIDEO_PADDING_SECONDS
+
+    logger.info("selecting_music")
+    with stage("music"):
+        music_file = get_random_music_file()
+        trimmed_music = trim_music_random(music_file, duration, output=ws.path("trimmed_music.mp3"))
+    ws.track(trimmed_music)
+
+    logger.info("merging_audio")
+    with stage("audio_mix"):
+        mixed_audio = merge_audio_tracks(tts_audio, trimmed_music, output=ws.path("mixed_audio.m4a"))
+    ws.release(tts_audio, trimmed_music)
+    ws.track(mixed_audio)
+
+    logger.info("selecting_gameplay")
+    with stage("gameplay"):
+        gameplay_file = get_next_gameplay_file()
 
+    logger.info("merging_video")
+    with stage("video_merge"):
+        merged_video = merge_with_background(
+            image_path,
+            gameplay_file,
+            duration,
+            output=ws.path("merged_video.mp4"),
+            trimmed_gameplay=ws.path("trimmed_gameplay.mp4"),
+            word_timings=align_data
+        )
+    # Tracked while the trimmed gameplay still exists: the merge is the
+    # run's high-water mark
+    ws.track(merged_video)
+    ws.release(image_path, mixed_audio)
+    ws.discard(ws.path("trimmed_gameplay.mp4"))
+
+    final_path = ws.path("OUT.mp4")
+
+    if publish_streamed:
+        logger.info("burning_subtitles_and_uploading_streamed")
+        with stage("encode_and_upload"):
+            encoder = start_fragmented_subtitle_burn(merged_video, subtitle_file)
+            upload_video_streaming(
+                subreddit_name,
+                encoder,
+                final_path,
+                title,
+                "Enjoy memes daily!"
+            )
+        ws.release(merged_video, subtitle_file)
+        return None, title, subreddit_name, image_hash
+
+    logger.info("burning_subtitles_and_encoding_renditions")
+    outputs = {"master": final_path}
+    for name in OUTPUT_RENDITIONS:
+        if name != "master":
+            outputs[name] = ws.path(f"{name}.{RENDITIONS[name]['ext']}")
+
+    with stage("renditions"):
+        render_renditions(merged_video, subtitle_file, outputs)
+    ws.check()
+    ws.release(merged_video, subtitle_file)
+
+    for name, path in outputs.items():
+        if name == "master":
+            continue
+        ws.track(path)
+        with stage(f"store_{name}"):
+            if name == "segment":
+                cache_segment(path, title, subreddit_name)
+            else:
+                upload_to_gcs(path, f"{RENDITIONS_PREFIX}{ws.run_id}/{os.path.basename(path)}")
+        ws.release(path)
+
+    return final_path, title, subreddit_name, image_hash
+
+
+def run_full(ws):
+    channels = load_channel_profiles()
+
+    # A streamed encode feeds a single upload session; several channels
+    # need the finished file
+    streamed = STREAM_PUBLISH and not channels
+
+    # Quota is reserved before any paid work; a render that could not be
+    # uploaded today is not started
     try:
-        cleanup_files()
+        reservations = reserve_uploads(upload_projects(channels), label=ws.run_id)
+    except QuotaExhaustedError as e:
+        logger.warning("render_skipped_quota_exhausted | %s", e)
+        return
 
-        # 🔴 REQUIRED: download runtime config
-        download_from_gcs("reddit_config.json", CONFIG_PATH)
+    try:
+        rendered = render_short(ws, publish_streamed=streamed)
+    except Exception as e:
+        # A streamed render may already have made its insert
+        if not streamed or isinstance(e, UploadNotAttemptedError):
+            release_uploads(reservations)
+        raise
 
-        logger.info("reddit_config_loaded")
+    if not rendered:
+        release_uploads(reservations)
+        return
 
-        logger.info("fetching_reddit_post")
-        title, image_path, subreddit_name = fetch_top_post(CONFIG_PATH)
+    final_video, title, subreddit_name, image_hash = rendered
+    failed = {}
 
-        if not title:
-            logger.warning("no_post_found_exiting")
-            return
+    if channels:
+        logger.info("uploading_to_channels | channels=%d", len(channels))
+        with stage("upload"):
+            _, failed = publish_to_channels(final_video, title, subreddit_name, channels)
+        release_unattempted(reservations, [
+            channel.project for channel in channels
+            if isinstance(failed.get(channel.name), UploadNotAttemptedError)
+        ])
+        log_post(subreddit_name, title)
+        log_post_time(subreddit_name, title)
 
-        logger.info("generating_tts")
-        tts_audio, align_data = text_to_speech_with_alignment(
-            title,
-            config_blob_path=CONFIG_PATH
+    elif not streamed:
+        logger.info("uploading_to_youtube")
+        with stage("upload"):
+            try:
+                upload_video(
+                    0,
+                    subreddit_name,
+                    final_video,
+                    title,
+                    "Enjoy memes daily!"
+                )
+            except UploadNotAttemptedError:
+                release_uploads(reservations)
+                raise
+
+    with stage("record_hash"):
+        record_published_hash(image_hash)
+
+    if failed:
+        raise RuntimeError(f"channel_publish_incomplete | failed={','.join(sorted(failed))}")
+
+
+def run_render_only(ws):
+    channels = load_channel_profiles()
+
+    if not queue_has_capacity(channels):
+        logger.warning("render_skipped_publish_backlog_full")
+        return
+
+    rendered = render_short(ws)
+
+    if not rendered:
+        return
+
+    final_video, title, subreddit_name, image_hash = rendered
+
+    logger.info("enqueueing_render")
+    enqueue_render(final_video, title, subreddit_name, channels=channels)
+
+    # Mark the post as used now so the next render does not pick it again
+    log_post(subreddit_name, title)
+    record_published_hash(image_hash)
+    cleanup_files()
+
+
+def run_publish_only(ws):
+    logger.info("draining_publish_queue")
+    drain_publish_queue(PUBLISH_BATCH_LIMIT)
+
+
+def run_compilation(ws):
+    segments = select_recent_segments(COMPILATION_DAYS, COMPILATION_SIZE)
+
+    if not segments:
+        logger.warning("no_cached_segments_for_compilation")
+        return
+
+    try:
+        reservations = reserve_uploads(upload_projects(None), label=ws.run_id)
+    except QuotaExhaustedError as e:
+        logger.warning("compilation_skipped_quota_exhausted | %s", e)
+        return
+
+    title = f"Top {len(segments)} memes this week"
+
+    logger.info("building_compilation | segments=%d", len(segments))
+    try:
+        compilation = build_compilation(
+            [segment["key"] for segment in segments],
+            ws.path("compilation.mp4"),
+            ws.dir,
+            intro_text=title,
+            outro_text="Subscribe for daily memes!"
         )
+        # Segments and the joined video coexist here: the run's peak
+        ws.check()
+    except Exception:
+        release_uploads(reservations)
+        raise
+
+    description = "\n".join(
+        f"{i + 1}. {segment['title']}" for i, segment in enumerate(segments)
+    )
 
-        save_srt(align_data)
+    logger.info("uploading_compilation")
+    try:
+        upload_video(0, "compilation", compilation, title, description)
+    except UploadNotAttemptedError:
+        release_uploads(reservations)
+        raise
 
-        duration = get_audio_duration(tts_audio) + 4
 
-        logger.info("creating_static_video")
-        video_image = create_video_from_image(image_path, duration)
+MODES = {
+    "full": run_full,
+    "render": run_render_only,
+    "publish": run_publish_only,
+    "compile": run_compilation
+}
 
-        logger.info("selecting_music")
-        music_file = get_random_music_file()
-        trimmed_music = trim_music_random(music_file, duration)
 
-        logger.info("merging_audio")
-        mixed_audio = merge_audio_tracks(tts_audio, trimmed_music)
+def main():
+    setup_logging()
 
-        logger.info("selecting_gameplay")
-        gameplay_file = get_next_gameplay_file()
+    logger.info("job_started | mode=%s", PIPELINE_MODE)
 
-        logger.info("merging_video")
-        merged_video = merge_with_background(video_image, gameplay_file, duration)
+    if PIPELINE_MODE not in MODES:
+        logger.error("unknown_pipeline_mode | mode=%s", PIPELINE_MODE)
+        sys.exit(2)
 
-        logger.info("burning_subtitles")
-        final_video = burn_srt_subtitles(
-            merged_video,
-            "output_subtitles.srt",
-            "OUT.mp4"
+    # Checked before any work, not when the renditions are first encoded
+    unknown = unknown_renditions(OUTPUT_RENDITIONS)
+    if unknown:
+        logger.error(
+            "unknown_output_renditions | renditions=%s known=%s",
+            ",".join(unknown),
+            ",".join(RENDITIONS)
         )
+        sys.exit(2)
 
-        logger.info("uploading_to_youtube")
-        upload_video(
-            0,
-            subreddit_name,
-            final_video,
-            title,
-            "Enjoy memes daily!"
+    unknown = unknown_motion_effects(FOREGROUND_MOTION)
+    if unknown:
+        logger.error(
+            "unknown_foreground_motion | effects=%s known=%s",
+            ",".join(unknown),
+            ",".join(MOTION_EFFECTS)
         )
+        sys.exit(2)
+
+    if ENCODE_MODE not in ENCODE_MODES:
+        logger.error(
+            "unknown_encode_mode | mode=%s known=%s",
+            ENCODE_MODE,
+            ",".join(ENCODE_MODES)
+        )
+        sys.exit(2)
+
+    if not should_run_job(10):
+        logger.info("job_skipped_threshold_condition")
+        sys.exit(0)
+
+    ws = Workspace()
+
+    try:
+        cleanup_files()
+
+        with profiled_run(ws.run_id):
+            MODES[PIPELINE_MODE](ws)
 
         gc.collect()
         logger.info("job_completed_successfully")
@@ -96,6 +371,11 @@ def main():
         log_error("unknown", "unknown", str(e))
         raise  # 🔴 Important: let Cloud Run mark job as FAILED
 
+    finally:
+        log_scheduler_metrics()
+        log_network_metrics()
+        ws.close()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,11 @@
+"""
+Offline replay harness.
+
+Runs the real pipeline against local stand-ins for every external
+service (filesystem bucket, recorded Reddit listings, canned TTS and a
+local resumable-upload endpoint) so end-to-end latency can be measured
+and slow runs reproduced without network access.
+
+    python -m replay --build-fixture /tmp/replay_fixture
+    python -m replay /tmp/replay_fixture --runs 3
+"""
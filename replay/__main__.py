@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import logging
+import statistics
+import tempfile
+
+logger = logging.getLogger("replay")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="python -m replay",
+        description="Runs the pipeline offline against local stand-ins and reports stage timings."
+    )
+    parser.add_argument("fixture_dir", help="fixture with bucket/, media/ and listings.json")
+    parser.add_argument("--build-fixture", action="store_true", help="synthesise the fixture first")
+    parser.add_argument("--mode", default="full", help="pipeline mode to replay (default: full)")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stream", action="store_true", help="use the streamed publish path")
+    parser.add_argument("--cold", action="store_true", help="clear asset caches before every run")
+    parser.add_argument("--tts-latency", type=float, default=0.0, help="simulated TTS seconds")
+    parser.add_argument("--report", help="also write the timings as JSON to this path")
+    return parser.parse_args()
+
+
+def summarise(runs):
+    """
+    Per-stage median/min/max across runs, in first-seen stage order.
+    """
+    samples = {}
+    for timings in runs:
+        for name, seconds, _ in timings:
+            samples.setdefault(name, []).append(seconds)
+
+    return [
+        {
+            "stage": name,
+            "runs": len(values),
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values)
+        }
+        for name, values in samples.items()
+    ]
+
+
+def print_report(summary, uploads):
+    print(f"\n{'stage':<22}{'runs':>5}{'median s':>11}{'min s':>9}{'max s':>9}")
+    for row in summary:
+        print(
+            f"{row['stage']:<22}{row['runs']:>5}"
+            f"{row['median']:>11.3f}{row['min']:>9.3f}{row['max']:>9.3f}"
+        )
+
+    for upload in uploads:
+        print(f"upload {upload['video_id']}: {upload['bytes']} bytes in {upload['chunks']} chunks")
+
+
+def main():
+    args = parse_args()
+    fixture_dir = os.path.abspath(args.fixture_dir)
+    scratch = tempfile.mkdtemp(prefix="replay_")
+
+    # Config reads these at import time, so they are set before any
+    # pipeline module is imported
+    os.environ["LOCAL_MUSIC_DIR"] = os.path.join(scratch, "cache", "music")
+    os.environ["LOCAL_GAMEPLAY_DIR"] = os.path.join(scratch, "cache", "gameplay")
+
+    import main as pipeline
+    from config import CSV_FILE, ERROR_FILE, POST_TIMES_FILE
+    from services import phash_service
+    from services.storage_service import set_bucket
+    from services.reddit_service import set_reddit_factory
+    from services.tts_service import set_tts_client
+    from services.youtube_service import set_youtube_client_factory
+    from utils.logger import setup_logging
+    from utils.workspace import Workspace
+    from utils.timing import stage, stage_timings, reset_stage_timings
+    from utils.ffmpeg_runner import log_scheduler_metrics
+    from utils.network import log_network_metrics
+    from replay.bucket import LocalBucket
+    from replay.fixture import BUCKET_DIR, MEDIA_DIR, LISTINGS_FILE, build_fixture
+    from replay.reddit import RecordedReddit
+    from replay.tts import CannedTTS
+    from replay.upload_server import LocalServer
+    from replay.stream_check import check_chunk_boundary
+
+    setup_logging()
+
+    if args.mode not in pipeline.MODES:
+        logger.error("unknown_pipeline_mode | mode=%s", args.mode)
+        sys.exit(2)
+
+    if args.build_fixture:
+        build_fixture(fixture_dir)
+
+    server = LocalServer(
+        os.path.join(fixture_dir, MEDIA_DIR),
+        os.path.join(scratch, "uploads")
+    ).start()
+
+    set_reddit_factory(lambda: RecordedReddit.from_file(
+        os.path.join(fixture_dir, LISTINGS_FILE),
+        server.media_base_url
+    ))
+    set_tts_client(CannedTTS(os.path.join(scratch, "tts"), args.tts_latency))
+    set_youtube_client_factory(lambda token_blob: server.youtube_client())
+    pipeline.STREAM_PUBLISH = args.stream
+
+    runs = []
+
+    try:
+        if args.stream:
+            check_chunk_boundary(server, scratch)
+
+        for index in range(args.runs):
+            # Every run starts from the fixture state: fresh bucket copy,
+            # no local post log and no in-memory hash index
+            bucket_dir = os.path.join(scratch, f"bucket_{index}")
+            shutil.copytree(os.path.join(fixture_dir, BUCKET_DIR), bucket_dir)
+            set_bucket(LocalBucket(bucket_dir))
+            phash_service._index = None
+
+            for path in (CSV_FILE, ERROR_FILE, POST_TIMES_FILE):
+                if os.path.exists(path):
+                    os.remove(path)
+
+            if args.cold:
+                shutil.rmtree(os.path.join(scratch, "cache"), ignore_errors=True)
+
+            random.seed(args.seed)
+            reset_stage_timings()
+
+            logger.info("replay_run_started | run=%d mode=%s", index, args.mode)
+
+            with Workspace(run_id=f"replay-{index}") as ws:
+                with stage("total"):
+                    pipeline.MODES[args.mode](ws)
+
+            runs.append(stage_timings())
+            shutil.rmtree(bucket_dir, ignore_errors=True)
+
+        log_scheduler_metrics()
+        log_network_metrics()
+
+    finally:
+        server.stop()
+
+    summary = summarise(runs)
+    print_report(summary, server.uploads)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"runs": runs, "summary": summary, "uploads": server.uploads}, f, indent=2)
+
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import base64
+import shutil
+import threading
+from datetime import datetime, timezone
+
+import google_crc32c
+from google.api_core.exceptions import NotFound, NotModified, PreconditionFailed
+
+OBJECTS_DIR = "objects"
+META_DIR = "meta"
+
+
+def _crc32c(data):
+    return base64.b64encode(google_crc32c.Checksum(data).digest()).decode("utf-8")
+
+
+class LocalBucket:
+    """
+    Filesystem stand-in for a google.cloud.storage Bucket.
+
+    Objects live under <root>/objects and their generation, metadata and
+    CRC32C under <root>/meta. Only the calls storage_service makes are
+    implemented, with the same precondition semantics; timeout and
+    retry arguments are accepted and ignored.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.name = os.path.basename(os.path.abspath(root))
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.join(root, OBJECTS_DIR), exist_ok=True)
+        os.makedirs(os.path.join(root, META_DIR), exist_ok=True)
+
+    def object_path(self, name):
+        return os.path.join(self.root, OBJECTS_DIR, name)
+
+    def _meta_path(self, name):
+        return os.path.join(self.root, META_DIR, f"{name}.json")
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+    def get_blob(self, name, timeout=None, retry=None):
+        blob = LocalBlob(self, name)
+        return blob if blob.exists() else None
+
+    def list_blobs(self, prefix="", timeout=None, retry=None):
+        objects_root = os.path.join(self.root, OBJECTS_DIR)
+        names = []
+
+        for dirpath, _, filenames in os.walk(objects_root):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(dirpath, filename), objects_root)
+                name = name.replace(os.sep, "/")
+                if name.startswith(prefix):
+                    names.append(name)
+
+        blobs = [LocalBlob(self, name) for name in sorted(names)]
+        for blob in blobs:
+            blob._load()
+        return blobs
+
+    # ----------------------------------------
+    # Object metadata
+    # ----------------------------------------
+
+    def read_meta(self, name):
+        path = self.object_path(name)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(self._meta_path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+
+        # Objects copied in by hand get metadata on first sight
+        with open(path, "rb") as f:
+            data = f.read()
+
+        stat = os.stat(path)
+        meta = {
+            "generation": stat.st_mtime_ns,
+            "crc32c": _crc32c(data),
+            "metadata": {},
+            "time_created": stat.st_mtime
+        }
+        self._write_meta(name, meta)
+        return meta
+
+    def _write_meta(self, name, meta):
+        path = self._meta_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def write_object(self, name, data, metadata=None, if_generation_match=None):
+        with self._lock:
+            current = self.read_meta(name)
+            current_generation = current["generation"] if current else 0
+
+            if if_generation_match is not None and if_generation_match != current_generation:
+                raise PreconditionFailed(
+                    f"generation_mismatch | blob={name} expected={if_generation_match}"
+                )
+
+            path = self.object_path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            meta = {
+                "generation": max(time.time_ns(), current_generation + 1),
+                "crc32c": _crc32c(data),
+                "metadata": metadata or {},
+                "time_created": time.time()
+            }
+            self._write_meta(name, meta)
+            return meta
+
+    def delete_object(self, name):
+        with self._lock:
+            try:
+                os.remove(self.object_path(name))
+            except FileNotFoundError:
+                raise NotFound(f"blob_missing | blob={name}")
+
+            try:
+                os.remove(self._meta_path(name))
+            except FileNotFoundError:
+                pass
+
+
+class LocalBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.metadata = None
+        self.generation = None
+        self.size = None
+        self.crc32c = None
+        self.time_created = None
+
+    def _load(self):
+        meta = self.bucket.read_meta(self.name)
+        if meta is None:
+            raise NotFound(f"blob_missing | blob={self.name}")
+
+        self.generation = meta["generation"]
+        self.crc32c = meta["crc32c"]
+        self.metadata = meta["metadata"] or None
+        self.size = os.path.getsize(self.bucket.object_path(self.name))
+        self.time_created = datetime.fromtimestamp(meta["time_created"], tz=timezone.utc)
+        return meta
+
+    def exists(self, timeout=None, retry=None):
+        return self.bucket.read_meta(self.name) is not None
+
+    def reload(self):
+        self._load()
+
+    # ----------------------------------------
+    # Reads
+    # ----------------------------------------
+
+    def download_as_bytes(
+        self,
+        start=None,
+        end=None,
+        if_generation_match=None,
+        if_generation_not_match=None,
+        checksum=None,
+        timeout=None,
+        retry=None
+    ):
+        with self.bucket._lock:
+            meta = self._load()
+
+            if if_generation_match is not None and meta["generation"] != if_generation_match:
+                raise PreconditionFailed(f"generation_mismatch | blob={self.name}")
+
+            if if_generation_not_match is not None and meta["generation"] == if_generation_not_match:
+                raise NotModified(f"generation_unchanged | blob={self.name}")
+
+            with open(self.bucket.object_path(self.name), "rb") as f:
+                f.seek(start or 0)
+                if end is None:
+                    return f.read()
+                return f.read(end - (start or 0) + 1)
+
+    def download_as_text(self, timeout=None, retry=None):
+        return self.download_as_bytes().decode("utf-8")
+
+    def download_to_filename(self, filename, timeout=None, retry=None):
+        with self.bucket._lock:
+            self._load()
+            shutil.copyfile(self.bucket.object_path(self.name), filename)
+
+    # ----------------------------------------
+    # Writes
+    # ----------------------------------------
+
+    def upload_from_string(
+        self,
+        data,
+        content_type=None,
+        if_generation_match=None,
+        checksum=None,
+        timeout=None,
+        retry=None
+    ):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        self.bucket.write_object(self.name, data, self.metadata, if_generation_match)
+        self._load()
+
+    def upload_from_filename(self, filename, content_type=None, if_generation_match=None, timeout=None, retry=None):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read(), content_type, if_generation_match)
+
+    def compose(self, sources, timeout=None, retry=None):
+        data = b"".join(source.download_as_bytes() for source in sources)
+        self.upload_from_string(data)
+
+    def delete(self, timeout=None, retry=None):
+        self.bucket.delete_object(self.name)
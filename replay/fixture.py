@@ -0,0 +1,98 @@
+import os
+import json
+import logging
+import subprocess
+
+from config import FFMPEG_PATH, RUNTIME_CONFIG_BLOB
+from replay.bucket import LocalBucket
+from replay.reddit import MEDIA_PLACEHOLDER
+
+logger = logging.getLogger(__name__)
+
+BUCKET_DIR = "bucket"
+MEDIA_DIR = "media"
+LISTINGS_FILE = "listings.json"
+
+# Distinct lavfi patterns so the generated memes do not collide in the
+# perceptual-hash index
+MEME_SOURCES = ["testsrc", "testsrc2", "smptebars", "rgbtestsrc", "mandelbrot", "smptehdbars"]
+
+MEME_TITLES = [
+    "When the code works on the first try",
+    "Me explaining to my mom why I need another monitor",
+    "Nobody: Absolutely nobody: My cat at 3am",
+    "The face you make when the meeting could have been an email",
+    "POV you finally fixed the bug but do not know how",
+    "Trying to stay awake during the last lecture of the day"
+]
+
+
+def _ffmpeg(*args):
+    subprocess.run([FFMPEG_PATH, "-y", "-v", "error", *args], check=True)
+
+
+def build_fixture(fixture_dir, gameplay_seconds=60):
+    """
+    Synthesises a self-contained fixture: bucket with runtime config,
+    music and gameplay, plus recorded listings and their images.
+    Everything is generated from lavfi sources, so runs are reproducible.
+    """
+    bucket = LocalBucket(os.path.join(fixture_dir, BUCKET_DIR))
+    media_dir = os.path.join(fixture_dir, MEDIA_DIR)
+    os.makedirs(media_dir, exist_ok=True)
+
+    subreddits = ["memes", "wholesomememes"]
+
+    bucket.write_object(
+        RUNTIME_CONFIG_BLOB,
+        json.dumps({
+            "subreddits": subreddits,
+            "time_filters": ["day", None],
+            "voice": {"voice_id": "replay", "settings": {}}
+        }).encode("utf-8")
+    )
+
+    music_path = bucket.object_path("music/replay_theme.mp3")
+    os.makedirs(os.path.dirname(music_path), exist_ok=True)
+    _ffmpeg(
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={gameplay_seconds}",
+        "-c:a", "libmp3lame", "-b:a", "128k", music_path
+    )
+
+    gameplay_path = bucket.object_path("gameplay/replay_run.mp4")
+    os.makedirs(os.path.dirname(gameplay_path), exist_ok=True)
+    _ffmpeg(
+        "-f", "lavfi", "-i", f"testsrc2=s=1080x1920:r=30:d={gameplay_seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", gameplay_path
+    )
+
+    # Register hand-written objects so they get a generation and CRC32C
+    for name in ("music/replay_theme.mp3", "gameplay/replay_run.mp4"):
+        bucket.read_meta(name)
+
+    listings = {name: {"all": [], "day": []} for name in subreddits}
+
+    for i, (source, title) in enumerate(zip(MEME_SOURCES, MEME_TITLES)):
+        image_name = f"meme_{i}.jpg"
+        _ffmpeg(
+            "-f", "lavfi", "-i", f"{source}=s=1000x800",
+            "-frames:v", "1", os.path.join(media_dir, image_name)
+        )
+
+        subreddit = subreddits[i % len(subreddits)]
+        time_filter = "day" if i < len(MEME_SOURCES) // 2 else "all"
+
+        listings[subreddit][time_filter].append({
+            "title": title,
+            "url": f"{MEDIA_PLACEHOLDER}/{image_name}",
+            "score": 1000 - i * 10,
+            "post_hint": "image",
+            "preview": None,
+            "is_video": False,
+            "media": None
+        })
+
+    with open(os.path.join(fixture_dir, LISTINGS_FILE), "w", encoding="utf-8") as f:
+        json.dump(listings, f, indent=2)
+
+    logger.info("replay_fixture_built | dir=%s posts=%d", fixture_dir, len(MEME_TITLES))
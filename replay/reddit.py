@@ -0,0 +1,115 @@
+import os
+import json
+import logging
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Listing attributes the selection code reads
+RECORDED_FIELDS = ("title", "url", "score", "post_hint", "preview", "is_video", "media")
+
+# Placeholder in recorded URLs for the replay media server
+MEDIA_PLACEHOLDER = "{media}"
+
+
+class RecordedReddit:
+    """
+    Stand-in for praw.Reddit serving recorded listings.
+
+    listings.json maps subreddit -> time filter ("all" for the all-time
+    listing) -> list of post dicts with RECORDED_FIELDS.
+    """
+
+    def __init__(self, listings, media_base_url):
+        self._listings = listings
+        self._media_base_url = media_base_url.rstrip("/")
+
+    @classmethod
+    def from_file(cls, path, media_base_url):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), media_base_url)
+
+    def subreddit(self, name):
+        return _RecordedSubreddit(self, name)
+
+    def posts(self, subreddit_name, time_filter, limit):
+        by_filter = self._listings.get(subreddit_name, {})
+        posts = by_filter.get(time_filter or "all", by_filter.get("all", []))
+
+        for fields in posts[:limit]:
+            fields = json.loads(
+                json.dumps(fields).replace(MEDIA_PLACEHOLDER, self._media_base_url)
+            )
+            yield SimpleNamespace(**fields)
+
+
+class _RecordedSubreddit:
+    def __init__(self, reddit, name):
+        self._reddit = reddit
+        self._name = name
+
+    def top(self, time_filter=None, limit=100):
+        return self._reddit.posts(self._name, time_filter, limit)
+
+
+def record_listings(reddit, subreddits, time_filters, fixture_dir, limit=50):
+    """
+    Captures live listings into <fixture_dir>/listings.json and their
+    direct image links into <fixture_dir>/media, so a slow or failing
+    selection can be replayed offline.
+    """
+    media_dir = os.path.join(fixture_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+
+    listings = {}
+
+    for subreddit_name in subreddits:
+        for time_filter in time_filters:
+            subreddit = reddit.subreddit(subreddit_name)
+            posts = (
+                subreddit.top(time_filter, limit=limit)
+                if time_filter
+                else subreddit.top(limit=limit)
+            )
+
+            recorded = []
+            for post in posts:
+                attrs = vars(post)
+                fields = {field: attrs.get(field) for field in RECORDED_FIELDS}
+                fields["url"] = _record_media(fields["url"], media_dir)
+                # Previews point at Reddit's CDN; replay the original instead
+                fields["preview"] = None
+                recorded.append(fields)
+
+            listings.setdefault(subreddit_name, {})[time_filter or "all"] = recorded
+
+            logger.info(
+                "listing_recorded | subreddit=%s time_filter=%s posts=%d",
+                subreddit_name,
+                time_filter or "all",
+                len(recorded)
+            )
+
+    with open(os.path.join(fixture_dir, "listings.json"), "w", encoding="utf-8") as f:
+        json.dump(listings, f, indent=2)
+
+
+def _record_media(url, media_dir):
+    name = os.path.basename(urlparse(url or "").path)
+    if not name or "." not in name:
+        return url
+
+    try:
+        response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException:
+        logger.warning("listing_media_skipped | url=%s", url)
+        return url
+
+    with open(os.path.join(media_dir, name), "wb") as f:
+        f.write(response.content)
+
+    return f"{MEDIA_PLACEHOLDER}/{name}"
@@ -0,0 +1,58 @@
+import os
+import sys
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Writes `chunks` chunk-sized blocks with a pause after each, so the
+# uploader catches up with the writer exactly on a chunk boundary
+WRITER = (
+    "import sys, time\n"
+    "chunk, chunks = int(sys.argv[1]), int(sys.argv[2])\n"
+    "for _ in range(chunks):\n"
+    "    sys.stdout.buffer.write(b'\\0' * chunk)\n"
+    "    sys.stdout.buffer.flush()\n"
+    "    time.sleep(1.0)\n"
+)
+
+
+def check_chunk_boundary(server, scratch, chunks=2):
+    """
+    Streams an output whose size is an exact multiple of the upload
+    chunk size through the streamed publish path and checks the local
+    server received all of it.
+    """
+    from services.youtube_service import (
+        UPLOAD_CHUNK_SIZE,
+        EncoderTee,
+        GrowingFileUpload,
+        build_video_body,
+        run_resumable_upload
+    )
+
+    expected = UPLOAD_CHUNK_SIZE * chunks
+    path = os.path.join(scratch, "boundary_check.mp4")
+
+    writer = subprocess.Popen(
+        [sys.executable, "-c", WRITER, str(UPLOAD_CHUNK_SIZE), str(chunks)],
+        stdout=subprocess.PIPE
+    )
+
+    tee = EncoderTee(writer, path)
+
+    # Driven directly rather than through upload_video, which also logs
+    # the post and would need a bucket
+    request = server.youtube_client().videos().insert(
+        part="snippet,status",
+        body=build_video_body("chunk boundary check", ""),
+        media_body=GrowingFileUpload(path, tee)
+    )
+    video_id = run_resumable_upload(request, path, max_retries=1)
+    tee.join()
+
+    received = next(upload["bytes"] for upload in server.uploads if upload["video_id"] == video_id)
+    if received != expected:
+        raise RuntimeError(f"replay_boundary_check_failed | expected={expected} received={received}")
+
+    logger.info("replay_boundary_check_passed | bytes=%d chunks=%d", received, chunks)
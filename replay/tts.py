@@ -0,0 +1,75 @@
+import os
+import time
+import hashlib
+import subprocess
+from types import SimpleNamespace
+
+from config import FFMPEG_PATH, NARRATION_WORDS_PER_SECOND
+
+
+class CannedTTS:
+    """
+    Stand-in for the ElevenLabs client.
+
+    Speech is a tone lasting as long as the narration estimate, and the
+    alignment spaces the words evenly across it, so output depends only
+    on the text. Renders are cached per text in `cache_dir`.
+    """
+
+    def __init__(self, cache_dir, latency_seconds=0.0):
+        self.cache_dir = cache_dir
+        self.latency_seconds = latency_seconds
+        self.text_to_speech = SimpleNamespace(convert=self._convert)
+        self.forced_alignment = SimpleNamespace(create=self._align)
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _word_seconds():
+        return 1.0 / NARRATION_WORDS_PER_SECOND
+
+    def _convert(
+        self,
+        text,
+        voice_id=None,
+        model_id=None,
+        output_format=None,
+        voice_settings=None,
+        request_options=None
+    ):
+        path = os.path.join(
+            self.cache_dir,
+            f"{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}.mp3"
+        )
+
+        if not os.path.exists(path):
+            duration = max(1, len(text.split())) * self._word_seconds()
+            subprocess.run(
+                [
+                    FFMPEG_PATH, "-y", "-v", "error",
+                    "-f", "lavfi",
+                    "-i", f"sine=frequency=220:sample_rate=44100:duration={duration:.3f}",
+                    "-c:a", "libmp3lame",
+                    "-b:a", "128k",
+                    path
+                ],
+                check=True
+            )
+
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    return
+                yield chunk
+
+    def _align(self, file, text, request_options=None):
+        step = self._word_seconds()
+        words = [
+            SimpleNamespace(text=word, start=i * step, end=(i + 1) * step)
+            for i, word in enumerate(text.split())
+        ]
+        return SimpleNamespace(words=words)
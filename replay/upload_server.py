@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import logging
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import httplib2
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_PATH = "/upload/youtube/v3/videos"
+SESSION_PREFIX = "/upload/session/"
+MEDIA_PREFIX = "/media/"
+
+CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+class LocalServer:
+    """
+    Local HTTP endpoint for the replay harness.
+
+    Serves recorded media under /media/ and implements the YouTube
+    resumable-upload protocol (session POST, ranged PUTs answered with
+    308 until the final chunk) so upload_video runs unmodified. Received
+    videos are kept in `upload_dir`.
+    """
+
+    def __init__(self, media_dir, upload_dir, host="127.0.0.1"):
+        self.media_dir = media_dir
+        self.upload_dir = upload_dir
+        self.sessions = {}
+        self.uploads = []
+        self.lock = threading.Lock()
+
+        os.makedirs(upload_dir, exist_ok=True)
+
+        self._httpd = ThreadingHTTPServer((host, 0), _handler_for(self))
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def media_base_url(self):
+        return f"{self.base_url}{MEDIA_PREFIX.rstrip('/')}"
+
+    def start(self):
+        self._thread.start()
+        logger.info("replay_server_started | url=%s", self.base_url)
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def youtube_client(self):
+        """
+        A YouTube client built from the bundled discovery document with
+        every request sent to this server.
+        """
+        return build_from_document(
+            discovery_cache.get_static_doc("youtube", "v3"),
+            http=_PlainHttp(self.base_url),
+            client_options={"api_endpoint": f"{self.base_url}/youtube/v3/"}
+        )
+
+
+class _PlainHttp(httplib2.Http):
+    """
+    The discovery client keeps https on media URLs when only the host is
+    overridden; the local server speaks plain http.
+    """
+
+    def __init__(self, base_url):
+        super().__init__()
+        # Resumable uploads answer 308 without a Location (as
+        # googleapiclient.http.build_http configures it)
+        self.redirect_codes = self.redirect_codes - {308}
+        self._https_base = base_url.replace("http://", "https://", 1)
+        self._base = base_url
+
+    def request(self, uri, *args, **kwargs):
+        if uri.startswith(self._https_base):
+            uri = self._base + uri[len(self._https_base):]
+        return super().request(uri, *args, **kwargs)
+
+
+def _handler_for(server):
+    class Handler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=server.media_dir, **kwargs)
+
+        def log_message(self, format, *args):
+            logger.debug("replay_server_request | %s", format % args)
+
+        def translate_path(self, path):
+            if path.startswith(MEDIA_PREFIX):
+                path = "/" + path[len(MEDIA_PREFIX):]
+            return super().translate_path(path)
+
+        def do_POST(self):
+            if not self.path.startswith(UPLOAD_PATH):
+                self.send_error(404)
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            metadata = json.loads(self.rfile.read(length) or b"{}")
+
+            with server.lock:
+                session_id = f"{len(server.sessions) + 1:06d}"
+                path = os.path.join(server.upload_dir, f"{session_id}.mp4")
+                open(path, "wb").close()
+
+                server.sessions[session_id] = {
+                    "path": path,
+                    "received": 0,
+                    "chunks": 0,
+                    "metadata": metadata
+                }
+
+            self.send_response(200)
+            self.send_header("Location", f"{server.base_url}{SESSION_PREFIX}{session_id}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_PUT(self):
+            session_id = self.path[len(SESSION_PREFIX):]
+            session = server.sessions.get(session_id)
+
+            if not self.path.startswith(SESSION_PREFIX) or session is None:
+                self.send_error(404)
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+
+            match = CONTENT_RANGE.match(self.headers.get("Content-Range", ""))
+            if not match:
+                self.send_error(400, "content_range_missing")
+                return
+
+            start, end, total = match.groups()
+
+            # Reject what the real endpoint rejects, so a client bug
+            # (such as an empty closing chunk) fails the replay
+            if start is not None and (
+                int(end) < int(start) or int(end) - int(start) + 1 != len(body)
+                or (total != "*" and int(end) >= int(total))
+            ):
+                self.send_error(400, "content_range_invalid")
+                return
+
+            with server.lock:
+                if start is not None and int(start) == session["received"]:
+                    with open(session["path"], "ab") as f:
+                        f.write(body)
+                    session["received"] += len(body)
+                    session["chunks"] += 1
+
+                received = session["received"]
+
+            if total != "*" and received >= int(total):
+                self._finish(session_id, session)
+                return
+
+            self.send_response(308)
+            if received:
+                self.send_header("Range", f"bytes=0-{received - 1}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def _finish(self, session_id, session):
+            video_id = f"replay-{session_id}"
+
+            with server.lock:
+                server.uploads.append({
+                    "video_id": video_id,
+                    "path": session["path"],
+                    "bytes": session["received"],
+                    "chunks": session["chunks"],
+                    "title": session["metadata"].get("snippet", {}).get("title")
+                })
+
+            body = json.dumps({"id": video_id, "kind": "youtube#video"}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+            logger.info(
+                "replay_upload_received | video_id=%s bytes=%d chunks=%d",
+                video_id,
+                session["received"],
+                session["chunks"]
+            )
+
+    return Handler
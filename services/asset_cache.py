@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+
+
+class AssetCache:
+    """
+    Least-recently-used file cache in front of the bucket.
+
+    Entries are keyed by blob name and generation, so validity is decided
+    from blob metadata alone (a listing or get_blob) and a replaced object
+    never serves stale bytes. Files land via rename so readers never see
+    partial downloads, and the index is guarded by a file lock so several
+    processes can share one mounted volume.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._thread_lock = threading.Lock()
+
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, blob, download):
+        """
+        Returns a local path for `blob`, calling download(blob, path) on a
+        miss. `blob` must carry name, generation and size.
+        """
+        key = self._key(blob)
+        path = os.path.join(self.root, key)
+
+        with self._index() as index:
+            entry = index.get(key)
+            if entry and os.path.exists(path):
+                entry["last_used"] = time.time()
+                logger.info("asset_cache_hit | blob=%s generation=%s", blob.name, blob.generation)
+                return path
+
+        logger.info("asset_cache_miss | blob=%s generation=%s", blob.name, blob.generation)
+
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            download(blob, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._index() as index:
+            index[key] = {
+                "blob": blob.name,
+                "generation": blob.generation,
+                "size": os.path.getsize(path),
+                "last_used": time.time()
+            }
+            self._evict(index, keep=key)
+
+        return path
+
+    def _key(self, blob):
+        name_hash = hashlib.sha1(blob.name.encode("utf-8")).hexdigest()[:10]
+        return f"{name_hash}-{blob.generation}-{os.path.basename(blob.name)}"
+
+    def _evict(self, index, keep):
+        blob_name = index[keep]["blob"]
+
+        # Older generations of the same object can never be served again
+        stale = [
+            key for key, entry in index.items()
+            if entry["blob"] == blob_name and key != keep
+        ]
+
+        total = sum(entry["size"] for entry in index.values())
+        by_age = sorted(
+            (key for key in index if key != keep and key not in stale),
+            key=lambda key: index[key]["last_used"]
+        )
+
+        for key in stale + by_age:
+            if key not in stale and total <= self.max_bytes:
+                break
+
+            total -= index[key]["size"]
+            del index[key]
+            self._remove(key)
+
+    def _remove(self, key):
+        try:
+            os.remove(os.path.join(self.root, key))
+            logger.info("asset_cache_evicted | key=%s", key)
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def _index(self):
+        index_path = os.path.join(self.root, INDEX_FILE)
+
+        with self._thread_lock, open(os.path.join(self.root, LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(index_path, "r", encoding="utf-8") as f:
+                        index = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    index = {}
+
+                index = {
+                    key: entry for key, entry in index.items()
+                    if os.path.exists(os.path.join(self.root, key))
+                }
+
+                yield index
+
+                tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, index_path)
+
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -3,6 +3,7 @@ import subprocess
 import logging
 
 from config import FFMPEG_PATH, FFPROBE_PATH
+from utils.ffmpeg_runner import run_ffmpeg
 
 logger = logging.getLogger(__name__)
 # ----------------------------------------
@@ -54,7 +55,7 @@ def trim_music_random(music_file: str, duration: float, output="trimmed_music.mp
         output
     ]
 
-    subprocess.run(command, check=True)
+    run_ffmpeg(command, encode=False, check=True)
 
     logger.info("Music trimmed successfully | output=%s", output)
     return output
@@ -95,7 +96,7 @@ def merge_audio_tracks(
         output
     ]
 
-    subprocess.run(command, check=True)
+    run_ffmpeg(command, check=True)
 
     logger.info("Audio tracks merged successfully | output=%s", output)
     return output
@@ -0,0 +1,139 @@
+import logging
+
+from config import (
+    CAPTION_FONT,
+    CAPTION_FONT_SIZE,
+    CAPTION_MAX_WORDS,
+    CAPTION_MAX_CHARS,
+    CAPTION_MAX_GAP_SECONDS,
+    CAPTION_KARAOKE
+)
+from services.tts_service import clean_text_for_subtitles
+
+logger = logging.getLogger(__name__)
+
+# ASS colours are &HAABBGGRR. Highlight matches the old force_style
+# colour; karaoke shows not-yet-spoken words in white.
+HIGHLIGHT_COLOUR = "&H00FFFF00"
+PENDING_COLOUR = "&H00FFFFFF"
+OUTLINE_COLOUR = "&H00000000"
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1080
+PlayResY: 1920
+WrapStyle: 2
+ScaledBorderAndShadow: yes
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Caption,{font},{size},{primary},{secondary},{outline},&H00000000,-1,0,0,0,100,100,0,0,1,5,0,5,60,60,0,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def ass_timestamp(seconds):
+    centis = int(round(max(0.0, seconds) * 100))
+    hours, centis = divmod(centis, 360000)
+    minutes, centis = divmod(centis, 6000)
+    secs, centis = divmod(centis, 100)
+    return f"{hours}:{minutes:02}:{secs:02}.{centis:02}"
+
+
+def group_words(word_timings, max_words=CAPTION_MAX_WORDS, max_chars=CAPTION_MAX_CHARS, max_gap=CAPTION_MAX_GAP_SECONDS):
+    """
+    Groups aligned words into short phrases. A phrase closes at
+    max_words, when adding a word would pass max_chars, or at a pause
+    longer than max_gap. Words that clean to nothing are dropped.
+    Returns lists of {"text", "start", "end"}.
+    """
+    phrases = []
+    current = []
+
+    for word in word_timings:
+        text = clean_text_for_subtitles(word["text"].strip().upper())
+        if not text:
+            continue
+
+        entry = {"text": text, "start": word["start"], "end": word["end"]}
+
+        if current:
+            chars = sum(len(w["text"]) + 1 for w in current) + len(text)
+            gap = entry["start"] - current[-1]["end"]
+
+            if len(current) >= max_words or chars > max_chars or gap > max_gap:
+                phrases.append(current)
+                current = []
+
+        current.append(entry)
+
+    if current:
+        phrases.append(current)
+
+    return phrases
+
+
+def _phrase_text(phrase, karaoke):
+    if not karaoke:
+        return " ".join(w["text"] for w in phrase)
+
+    # \k durations (centiseconds) run back to back from the cue start, so
+    # pauses are folded into the following word
+    parts = []
+    cursor = phrase[0]["start"]
+    for w in phrase:
+        centis = max(1, int(round((w["end"] - cursor) * 100)))
+        parts.append(f"{{\\k{centis}}}{w['text']}")
+        cursor = w["end"]
+
+    return " ".join(parts)
+
+
+def save_ass(word_timings, output_ass="output_captions.ass", offset_seconds=1.0, karaoke=CAPTION_KARAOKE):
+    """
+    Writes grouped-phrase captions as a styled ASS script, one event per
+    phrase. Each phrase stays up until the next one starts, so captions
+    do not flicker between words.
+    """
+    try:
+        phrases = group_words(word_timings)
+
+        header = ASS_HEADER.format(
+            font=CAPTION_FONT,
+            size=CAPTION_FONT_SIZE,
+            # With karaoke, words are drawn in the secondary colour until
+            # their \k time is reached, then switch to the primary
+            primary=HIGHLIGHT_COLOUR,
+            secondary=PENDING_COLOUR if karaoke else HIGHLIGHT_COLOUR,
+            outline=OUTLINE_COLOUR
+        )
+
+        with open(output_ass, "w", encoding="utf-8") as f:
+            f.write(header)
+
+            for i, phrase in enumerate(phrases):
+                start = phrase[0]["start"]
+                end = phrase[-1]["end"]
+                if i + 1 < len(phrases):
+                    end = max(end, phrases[i + 1][0]["start"])
+
+                f.write(
+                    "Dialogue: 0,"
+                    f"{ass_timestamp(start + offset_seconds)},"
+                    f"{ass_timestamp(end + offset_seconds)},"
+                    f"Caption,,0,0,0,,{_phrase_text(phrase, karaoke)}\n"
+                )
+
+        logger.info(
+            "captions_written | file=%s events=%d words=%d karaoke=%s",
+            output_ass,
+            len(phrases),
+            sum(len(p) for p in phrases),
+            karaoke
+        )
+
+    except Exception:
+        logger.exception("caption_generation_failed")
+        raise
@@ -0,0 +1,189 @@
+import logging
+from dataclasses import dataclass
+from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.http import MediaFileUpload
+
+from config import (
+    CHANNELS_BLOB,
+    CHANNEL_UPLOAD_CONCURRENCY,
+    PREDEFINED_TAGS,
+    YOUTUBE_PROJECT_ID
+)
+from services.config_service import ConfigError
+from services.storage_service import read_json_from_gcs
+from services.youtube_service import (
+    UPLOAD_CHUNK_SIZE,
+    insert_request,
+    build_video_body,
+    run_resumable_upload
+)
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FIELDS = {"title", "subreddit"}
+
+
+@dataclass(frozen=True)
+class ChannelProfile:
+    name: str
+    token_blob: str
+    # str.format templates over {title} and {subreddit}
+    title_template: str
+    description_template: str
+    tags: Tuple[str, ...]
+    # Google Cloud project whose API quota the channel's token spends
+    project: str = YOUTUBE_PROJECT_ID
+
+    def render(self, title, subreddit_name):
+        fields = {"title": title, "subreddit": subreddit_name}
+        return (
+            self.title_template.format(**fields),
+            self.description_template.format(**fields)
+        )
+
+
+# ----------------------------------------
+# Profiles
+# ----------------------------------------
+
+def _check_template(template, field):
+    try:
+        template.format(**{name: "" for name in TEMPLATE_FIELDS})
+    except (KeyError, IndexError, ValueError) as e:
+        raise ConfigError(f"channel_template_invalid | field={field} error={e}") from e
+
+
+def parse_channel_profiles(raw):
+    """
+    Validates channels.json: {"channels": [{"name", "token_blob",
+    "title_template", "description_template", "tags", "project"}]}.
+    """
+    if not isinstance(raw, dict) or not isinstance(raw.get("channels"), list):
+        raise ConfigError("channels_must_be_list")
+
+    profiles = []
+    seen = set()
+
+    for entry in raw["channels"]:
+        if not isinstance(entry, dict):
+            raise ConfigError("channel_entry_not_object")
+
+        name = entry.get("name")
+        token_blob = entry.get("token_blob")
+
+        if not isinstance(name, str) or not name or name in seen:
+            raise ConfigError(f"channel_name_missing_or_duplicate | name={name!r}")
+        if not isinstance(token_blob, str) or not token_blob:
+            raise ConfigError(f"channel_token_blob_missing | name={name}")
+
+        title_template = entry.get("title_template", "{title}")
+        description_template = entry.get("description_template", "Enjoy memes daily!")
+        _check_template(title_template, "title_template")
+        _check_template(description_template, "description_template")
+
+        tags = entry.get("tags", PREDEFINED_TAGS)
+        if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+            raise ConfigError(f"channel_tags_invalid | name={name}")
+
+        project = entry.get("project", YOUTUBE_PROJECT_ID)
+        if not isinstance(project, str) or not project:
+            raise ConfigError(f"channel_project_invalid | name={name}")
+
+        seen.add(name)
+        profiles.append(ChannelProfile(
+            name=name,
+            token_blob=token_blob,
+            title_template=title_template,
+            description_template=description_template,
+            tags=tuple(tags),
+            project=project
+        ))
+
+    return profiles
+
+
+def load_channel_profiles():
+    """
+    Returns the configured channel profiles, or [] when channels.json is
+    absent (single-channel publishing through the default token).
+    """
+    raw = read_json_from_gcs(CHANNELS_BLOB)
+    if raw is None:
+        return []
+
+    profiles = parse_channel_profiles(raw)
+    logger.info("channel_profiles_loaded | channels=%d", len(profiles))
+    return profiles
+
+
+# ----------------------------------------
+# Fan-out
+# ----------------------------------------
+
+def upload_to_channel(channel, video_file, title, subreddit_name, scheduled_time=None, max_retries=3):
+    """
+    Uploads a rendered file to one channel with its own client, media
+    handle and resumable session, so channels retry independently.
+    """
+    channel_title, description = channel.render(title, subreddit_name)
+
+    request = insert_request(
+        build_video_body(channel_title, description, scheduled_time, channel.tags),
+        MediaFileUpload(video_file, chunksize=UPLOAD_CHUNK_SIZE, resumable=True),
+        token_blob=channel.token_blob
+    )
+
+    return run_resumable_upload(
+        request,
+        video_file,
+        max_retries=max_retries,
+        label=channel.name,
+        project=channel.project
+    )
+
+
+def publish_to_channels(video_file, title, subreddit_name, channels, scheduled_time=None, already_published=None):
+    """
+    Uploads one render to every channel concurrently, at most
+    CHANNEL_UPLOAD_CONCURRENCY at a time. Channels listed in
+    `already_published` (name -> video id, from an earlier attempt) are
+    skipped. Returns (published, failed): name -> video id, and
+    name -> the exception its upload raised.
+    """
+    published = dict(already_published or {})
+    pending = [channel for channel in channels if channel.name not in published]
+    failed = {}
+
+    if not pending:
+        return published, failed
+
+    with ThreadPoolExecutor(max_workers=min(CHANNEL_UPLOAD_CONCURRENCY, len(pending))) as pool:
+        futures = {
+            channel.name: pool.submit(
+                upload_to_channel,
+                channel,
+                video_file,
+                title,
+                subreddit_name,
+                scheduled_time
+            )
+            for channel in pending
+        }
+
+        for name, future in futures.items():
+            try:
+                published[name] = future.result()
+            except Exception as e:
+                failed[name] = e
+                logger.error("channel_publish_failed | channel=%s error=%s", name, e)
+
+    logger.info(
+        "channels_published | published=%d failed=%d skipped=%d",
+        len(published) - len(already_published or {}),
+        len(failed),
+        len(channels) - len(pending)
+    )
+
+    return published, failed
@@ -0,0 +1,247 @@
+import os
+import hashlib
+import logging
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+from config import (
+    FFMPEG_PATH,
+    FFPROBE_PATH,
+    RENDER_CACHE_PREFIX
+)
+from services.storage_service import (
+    upload_to_gcs,
+    download_from_gcs,
+    list_blob_info,
+    blob_exists
+)
+from services.video_service import SEGMENT_ENCODE_ARGS
+from utils.ffmpeg_runner import run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------------------
+# Segment Cache
+# ----------------------------------------
+
+def _has_audio(video_file):
+    result = subprocess.run(
+        [
+            FFPROBE_PATH,
+            "-i", video_file,
+            "-select_streams", "a",
+            "-show_entries", "stream=index",
+            "-v", "quiet",
+            "-of", "csv=p=0"
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        check=True
+    )
+    return bool(result.stdout.strip())
+
+
+def add_silent_audio(video_file, output):
+    """
+    Copies the video stream and adds a silent track with the segment
+    audio parameters, so every part of a compilation has the same streams.
+    """
+    run_ffmpeg(
+        [
+            FFMPEG_PATH,
+            "-i", video_file,
+            "-f", "lavfi",
+            "-i", "anullsrc=r=44100:cl=stereo",
+            "-map", "0:v",
+            "-map", "1:a",
+            "-c:v", "copy",
+            "-c:a", "aac",
+            "-ar", "44100",
+            "-ac", "2",
+            "-b:a", "128k",
+            "-shortest",
+            "-y",
+            output
+        ],
+        check=True
+    )
+
+    logger.info("silent_audio_added | input=%s output=%s", video_file, output)
+    return output
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+def cache_segment(segment_file, title, subreddit_name):
+    """
+    Stores a uniformly encoded segment under its content hash, with a
+    silent track added first if it has no audio.
+    Returns the cache key; re-caching identical content is a no-op.
+    """
+    if not _has_audio(segment_file):
+        normalised = add_silent_audio(segment_file, f"{segment_file}.audio.mp4")
+        os.replace(normalised, segment_file)
+
+    key = _file_digest(segment_file)
+    blob_name = f"{RENDER_CACHE_PREFIX}{key}.mp4"
+
+    if blob_exists(blob_name):
+        logger.info("segment_cache_hit | key=%s", key)
+        return key
+
+    upload_to_gcs(
+        segment_file,
+        blob_name,
+        metadata={
+            "title": title,
+            "subreddit": subreddit_name,
+            "rendered_at": datetime.now(timezone.utc).isoformat()
+        }
+    )
+
+    logger.info("segment_cached | key=%s subreddit=%s", key, subreddit_name)
+    return key
+
+
+def fetch_segment(key, workdir):
+    """
+    Downloads a cached segment into the run's workspace, so it counts
+    against the workspace budget and goes away with the run.
+    """
+    local_path = os.path.join(workdir, f"{key}.mp4")
+    download_from_gcs(f"{RENDER_CACHE_PREFIX}{key}.mp4", local_path)
+    return local_path
+
+
+def select_recent_segments(days, limit):
+    """
+    Returns up to `limit` cached segments rendered in the last `days`,
+    newest first, as dicts with key, title and subreddit.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+
+    segments = [
+        info for info in list_blob_info(RENDER_CACHE_PREFIX)
+        if info["name"].endswith(".mp4") and info["time_created"] >= cutoff
+    ]
+    segments.sort(key=lambda info: info["time_created"], reverse=True)
+
+    return [
+        {
+            "key": os.path.basename(info["name"])[:-len(".mp4")],
+            "title": info["metadata"].get("title", ""),
+            "subreddit": info["metadata"].get("subreddit", "")
+        }
+        for info in segments[:limit]
+    ]
+
+
+# ----------------------------------------
+# Compilation Assembly
+# ----------------------------------------
+
+def _escape_drawtext(text):
+    return (
+        text.replace("\\", "\\\\")
+        .replace(":", "\\:")
+        .replace("'", "’")
+        .replace("%", "\\%")
+    )
+
+
+def render_title_card(text, output, duration=2.0, with_audio=True):
+    """
+    Renders a short text card with the segment encode parameters so it
+    can be stream-copied next to cached segments.
+    """
+    command = [
+        FFMPEG_PATH,
+        "-f", "lavfi",
+        "-i", f"color=c=black:s=1080x1920:r=30:d={duration}"
+    ]
+
+    if with_audio:
+        command += [
+            "-f", "lavfi",
+            "-i", f"anullsrc=r=44100:cl=stereo:d={duration}"
+        ]
+
+    command += [
+        "-vf",
+        (
+            f"drawtext=text='{_escape_drawtext(text)}':"
+            "fontsize=84:fontcolor=white:"
+            "x=(w-text_w)/2:y=(h-text_h)/2"
+        ),
+        "-shortest"
+    ] + SEGMENT_ENCODE_ARGS + [output]
+
+    run_ffmpeg(command, check=True)
+
+    logger.info("title_card_rendered | output=%s", output)
+    return output
+
+
+def build_compilation(segment_keys, output, workdir, intro_text=None, outro_text=None):
+    """
+    Joins cached segments into one video with the concat demuxer.
+    Only the intro and outro cards are encoded; every segment is copied.
+    """
+    try:
+        if not segment_keys:
+            raise ValueError("compilation_has_no_segments")
+
+        parts = []
+        for key in segment_keys:
+            part = fetch_segment(key, workdir)
+
+            # Segments cached before they were normalised may be silent;
+            # concat needs the same streams in every part
+            if not _has_audio(part):
+                part = add_silent_audio(part, os.path.join(workdir, f"{key}.audio.mp4"))
+
+            parts.append(part)
+
+        if intro_text:
+            parts.insert(0, render_title_card(intro_text, os.path.join(workdir, "intro.mp4")))
+
+        if outro_text:
+            parts.append(render_title_card(outro_text, os.path.join(workdir, "outro.mp4")))
+
+        concat_list = os.path.join(workdir, "concat.txt")
+        with open(concat_list, "w", encoding="utf-8") as f:
+            for part in parts:
+                f.write(f"file '{os.path.abspath(part)}'\n")
+
+        run_ffmpeg(
+            [
+                FFMPEG_PATH,
+                "-f", "concat",
+                "-safe", "0",
+                "-i", concat_list,
+                "-c", "copy",
+                "-movflags", "+faststart",
+                output
+            ],
+            encode=False,
+            check=True
+        )
+
+        logger.info(
+            "compilation_built | output=%s segments=%d",
+            output,
+            len(segment_keys)
+        )
+
+        return output
+
+    except Exception:
+        logger.exception("compilation_build_failed")
+        raise
@@ -0,0 +1,150 @@
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from config import (
+    RUNTIME_CONFIG_BLOB,
+    TARGET_DURATION_MIN_SECONDS,
+    TARGET_DURATION_MAX_SECONDS
+)
+from services.storage_service import read_bytes_if_changed
+
+logger = logging.getLogger(__name__)
+
+VALID_TIME_FILTERS = {"hour", "day", "week", "month", "year", "all"}
+
+
+class ConfigError(ValueError):
+    """
+    Raised when reddit_config.json does not match the expected schema.
+    """
+
+
+@dataclass(frozen=True)
+class VoiceConfig:
+    voice_id: str
+    settings: Mapping
+
+
+@dataclass(frozen=True)
+class DurationWindow:
+    min_seconds: float
+    max_seconds: float
+
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    subreddits: Tuple[str, ...]
+    # None means the all-time listing
+    time_filters: Tuple[Optional[str], ...]
+    voice: VoiceConfig
+    duration_window: DurationWindow
+    generation: int
+
+
+# ----------------------------------------
+# Validation
+# ----------------------------------------
+
+def _require(condition, message):
+    if not condition:
+        raise ConfigError(message)
+
+
+def parse_runtime_config(raw, generation=0):
+    """
+    Validates the raw JSON object and returns an immutable snapshot.
+    """
+    _require(isinstance(raw, dict), "config_root_not_object")
+
+    subreddits = raw.get("subreddits")
+    _require(
+        isinstance(subreddits, list) and subreddits
+        and all(isinstance(s, str) and s for s in subreddits),
+        "subreddits_must_be_non_empty_list_of_names"
+    )
+
+    time_filters = raw.get("time_filters") or [None]
+    _require(isinstance(time_filters, list), "time_filters_must_be_list")
+    for time_filter in time_filters:
+        _require(
+            time_filter in (None, "") or time_filter in VALID_TIME_FILTERS,
+            f"time_filter_invalid | value={time_filter!r}"
+        )
+
+    voice = raw.get("voice")
+    _require(isinstance(voice, dict), "voice_must_be_object")
+    _require(
+        isinstance(voice.get("voice_id"), str) and voice["voice_id"],
+        "voice_id_missing"
+    )
+    settings = voice.get("settings", {})
+    _require(isinstance(settings, dict), "voice_settings_must_be_object")
+
+    window = raw.get("duration_window", {})
+    _require(isinstance(window, dict), "duration_window_must_be_object")
+    min_seconds = window.get("min_seconds", TARGET_DURATION_MIN_SECONDS)
+    max_seconds = window.get("max_seconds", TARGET_DURATION_MAX_SECONDS)
+    _require(
+        isinstance(min_seconds, (int, float)) and isinstance(max_seconds, (int, float))
+        and 0 <= min_seconds < max_seconds,
+        "duration_window_invalid"
+    )
+
+    return RuntimeConfig(
+        subreddits=tuple(subreddits),
+        time_filters=tuple(t or None for t in time_filters),
+        voice=VoiceConfig(
+            voice_id=voice["voice_id"],
+            settings=MappingProxyType(dict(settings))
+        ),
+        duration_window=DurationWindow(float(min_seconds), float(max_seconds)),
+        generation=generation
+    )
+
+
+# ----------------------------------------
+# Snapshot
+# ----------------------------------------
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def load_runtime_config():
+    """
+    Returns the validated runtime config snapshot.
+
+    The first call downloads and validates the blob. Later calls (e.g. one
+    per batch iteration) send a single generation-conditional request and
+    keep the current snapshot when the blob has not changed.
+    """
+    global _snapshot
+
+    with _snapshot_lock:
+        generation = _snapshot.generation if _snapshot else 0
+
+        data, new_generation = read_bytes_if_changed(RUNTIME_CONFIG_BLOB, generation)
+
+        if data is None and _snapshot is not None:
+            logger.info("runtime_config_unchanged | generation=%s", generation)
+            return _snapshot
+
+        try:
+            raw = json.loads(data)
+        except ValueError as e:
+            raise ConfigError(f"config_not_valid_json | {e}") from e
+
+        _snapshot = parse_runtime_config(raw, new_generation)
+
+        logger.info(
+            "runtime_config_loaded | generation=%s subreddits=%d time_filters=%d",
+            new_generation,
+            len(_snapshot.subreddits),
+            len(_snapshot.time_filters)
+        )
+
+        return _snapshot
@@ -0,0 +1,219 @@
+import logging
+import threading
+import subprocess
+from array import array
+
+from PIL import Image
+
+from config import FFMPEG_PATH, PHASH_INDEX_BLOB, PHASH_MAX_DISTANCE
+from services.storage_service import (
+    read_bytes_with_generation,
+    read_bytes_if_changed,
+    write_bytes_if_generation
+)
+from utils.ffmpeg_runner import run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+
+# ----------------------------------------
+# Hashing
+# ----------------------------------------
+
+def _first_frame_pixels(video_path):
+    """
+    9x8 grayscale pixels of a clip's first frame, scaled by ffmpeg.
+    """
+    result = run_ffmpeg(
+        [
+            FFMPEG_PATH,
+            "-v", "error",
+            "-i", video_path,
+            "-frames:v", "1",
+            "-vf", "scale=9:8,format=gray",
+            "-f", "rawvideo",
+            "pipe:1"
+        ],
+        encode=False,
+        stdout=subprocess.PIPE,
+        check=True
+    )
+    return list(result.stdout)
+
+
+def compute_dhash(image_path):
+    """
+    64-bit difference hash of an image (first frame for GIFs and clips).
+    JPEGs are decoded at reduced resolution via draft mode, so the full
+    image is never materialised.
+    """
+    if image_path.lower().endswith(".mp4"):
+        pixels = _first_frame_pixels(image_path)
+    else:
+        with Image.open(image_path) as img:
+            img.draft("L", (64, 64))
+            small = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+            pixels = list(small.getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+
+    return value
+
+
+# ----------------------------------------
+# Multi-Index Hamming Search
+# ----------------------------------------
+
+class PHashIndex:
+    """
+    Hamming-radius search over 64-bit hashes by multi-index hashing.
+
+    Hashes are split into max_distance + 1 bands; by pigeonhole any hash
+    within max_distance of the query matches it exactly on at least one
+    band, so a query only compares against hashes sharing a band value.
+    """
+
+    def __init__(self, hashes=(), max_distance=PHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._bands = self._band_layout(max_distance + 1)
+        self._tables = [{} for _ in self._bands]
+        self._hashes = array("Q")
+
+        for value in hashes:
+            self.add(value)
+
+    @staticmethod
+    def _band_layout(count):
+        base, extra = divmod(HASH_BITS, count)
+        layout = []
+        shift = 0
+        for i in range(count):
+            width = base + (1 if i < extra else 0)
+            layout.append((shift, (1 << width) - 1))
+            shift += width
+        return layout
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, value):
+        self._hashes.append(value)
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table.setdefault((value >> shift) & mask, []).append(value)
+
+    def nearest_within(self, value):
+        """
+        Returns the distance to the closest indexed hash within
+        max_distance, or None when there is none.
+        """
+        best = None
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            for other in table.get((value >> shift) & mask, ()):
+                distance = (value ^ other).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best):
+                    best = distance
+        return best
+
+    def to_bytes(self):
+        return self._hashes.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, max_distance=PHASH_MAX_DISTANCE):
+        hashes = array("Q")
+        hashes.frombytes(data)
+        return cls(hashes, max_distance)
+
+
+# ----------------------------------------
+# Persisted Index
+# ----------------------------------------
+
+_index = None
+# Generation of the bucket copy _index was built from; 0 while absent
+_index_generation = 0
+_index_lock = threading.Lock()
+
+
+def _load_index(data, generation):
+    global _index, _index_generation
+
+    _index = PHashIndex.from_bytes(data or b"")
+    _index_generation = generation
+    logger.info("phash_index_loaded | entries=%d generation=%s", len(_index), generation)
+
+
+def get_phash_index():
+    """
+    Loads the published-image index from the bucket once per process.
+    Stored as raw little-endian uint64s, 8 bytes per image.
+    """
+    with _index_lock:
+        if _index is None:
+            _load_index(*read_bytes_with_generation(PHASH_INDEX_BLOB))
+
+        return _index
+
+
+def refresh_phash_index():
+    """
+    Reloads the index if the bucket copy changed since it was read, so a
+    long-lived process sees images other instances published. Unchanged
+    costs one conditional request.
+    """
+    with _index_lock:
+        if _index is None or not _index_generation:
+            _load_index(*read_bytes_with_generation(PHASH_INDEX_BLOB))
+            return _index
+
+        data, generation = read_bytes_if_changed(PHASH_INDEX_BLOB, _index_generation)
+        if data is not None:
+            _load_index(data, generation)
+
+        return _index
+
+
+def is_duplicate_image(image_path):
+    """
+    Returns (is_duplicate, hash) for a downloaded candidate image.
+    """
+    value = compute_dhash(image_path)
+    distance = get_phash_index().nearest_within(value)
+
+    if distance is not None:
+        logger.info(
+            "phash_duplicate_found | file=%s hash=%016x distance=%d",
+            image_path,
+            value,
+            distance
+        )
+        return True, value
+
+    return False, value
+
+
+def record_published_hash(value, max_attempts=5):
+    """
+    Appends a published image hash to the bucket index, retrying on
+    concurrent writers via generation preconditions.
+    """
+    entry = array("Q", [value]).tobytes()
+
+    for _ in range(max_attempts):
+        data, generation = read_bytes_with_generation(PHASH_INDEX_BLOB)
+
+        if write_bytes_if_generation(PHASH_INDEX_BLOB, (data or b"") + entry, generation):
+            with _index_lock:
+                if _index is not None:
+                    _index.add(value)
+
+            logger.info("phash_recorded | hash=%016x", value)
+            return
+
+    raise RuntimeError("phash_index_write_conflict")
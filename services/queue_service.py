@@ -0,0 +1,331 @@
+import os
+import uuid
+import logging
+from datetime import datetime, timedelta
+
+from config import (
+    QUEUE_PREFIX,
+    PUBLISH_SLOTS_BLOB,
+    PUBLISH_SLOT_HOURS_UTC,
+    PUBLISH_LEAD_MINUTES,
+    PUBLISH_CLAIM_TIMEOUT_SECONDS,
+    QUOTA_RENDER_AHEAD_DAYS,
+    YOUTUBE_DAILY_QUOTA,
+    YOUTUBE_UPLOAD_QUOTA_COST
+)
+from services.storage_service import (
+    upload_to_gcs,
+    download_from_gcs,
+    delete_from_gcs,
+    list_blob_names,
+    read_json_from_gcs,
+    write_json_to_gcs,
+    read_json_with_generation,
+    write_json_if_generation
+)
+from services.youtube_service import upload_video, UploadNotAttemptedError
+from services.channel_service import load_channel_profiles, publish_to_channels
+from services.quota_service import (
+    QuotaExhaustedError,
+    upload_projects,
+    reserve_uploads,
+    release_uploads,
+    release_unattempted,
+    daily_upload_capacity,
+    uploads_remaining_today
+)
+from utils.logging_utils import log_post_time
+
+logger = logging.getLogger(__name__)
+
+PENDING_PREFIX = f"{QUEUE_PREFIX}pending/"
+CLAIMED_PREFIX = f"{QUEUE_PREFIX}claimed/"
+
+SLOT_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+# ----------------------------------------
+# Publish Slots
+# ----------------------------------------
+
+def _candidate_slots(after, slots_per_day=None):
+    day = after.replace(hour=0, minute=0, second=0, microsecond=0)
+    hours = sorted(PUBLISH_SLOT_HOURS_UTC)[:slots_per_day]
+    if not hours:
+        raise ValueError(f"no_publish_slot_hours | slots_per_day={slots_per_day}")
+
+    while True:
+        for hour in hours:
+            slot = day.replace(hour=hour)
+            if slot > after:
+                yield slot
+        day += timedelta(days=1)
+
+
+def reserve_publish_slot(max_attempts=5, slots_per_day=None):
+    """
+    Reserves the earliest free publish slot (naive UTC datetime).
+    Slots live in a shared JSON blob updated with a generation check,
+    so concurrent renderers never pick the same slot. With slots_per_day
+    only the first that many slot hours of each day are used.
+    """
+    for _ in range(max_attempts):
+        now = datetime.utcnow()
+        earliest = now + timedelta(minutes=PUBLISH_LEAD_MINUTES)
+
+        reserved, generation = read_json_with_generation(PUBLISH_SLOTS_BLOB)
+        reserved = {
+            s for s in (reserved or [])
+            if datetime.strptime(s, SLOT_FORMAT) > now
+        }
+
+        slot = next(
+            s for s in _candidate_slots(earliest, slots_per_day)
+            if s.strftime(SLOT_FORMAT) not in reserved
+        )
+        reserved.add(slot.strftime(SLOT_FORMAT))
+
+        if write_json_if_generation(PUBLISH_SLOTS_BLOB, sorted(reserved), generation):
+            logger.info("publish_slot_reserved | slot=%s", slot.strftime(SLOT_FORMAT))
+            return slot
+
+    raise RuntimeError("publish_slot_reservation_conflict")
+
+
+# ----------------------------------------
+# Render Side
+# ----------------------------------------
+
+def pending_job_count():
+    return sum(1 for name in list_blob_names(PENDING_PREFIX) if name.endswith(".json"))
+
+
+def queue_has_capacity(channels):
+    """
+    False once the pending queue already holds QUOTA_RENDER_AHEAD_DAYS
+    of what the API quota lets us publish, so render-only jobs stop
+    producing videos that would sit unpublished.
+    """
+    capacity = daily_upload_capacity(upload_projects(channels))
+    backlog = pending_job_count()
+
+    logger.info(
+        "publish_capacity_planned | per_day=%d backlog=%d ahead_days=%d",
+        capacity,
+        backlog,
+        QUOTA_RENDER_AHEAD_DAYS
+    )
+
+    return backlog < capacity * QUOTA_RENDER_AHEAD_DAYS
+
+
+def enqueue_render(video_file, title, subreddit_name, publish_at=None, channels=None):
+    """
+    Uploads a finished render and its metadata into the pending queue.
+    The metadata blob is written last; its presence marks the job ready.
+    Slots are paced to the number of uploads the quota allows per day.
+    """
+    if publish_at is None:
+        capacity = daily_upload_capacity(upload_projects(channels))
+
+        # A channel whose upload alone costs more than the daily quota
+        # can never be published
+        if capacity < 1:
+            raise QuotaExhaustedError(
+                f"publish_capacity_zero | daily_quota={YOUTUBE_DAILY_QUOTA} "
+                f"upload_cost={YOUTUBE_UPLOAD_QUOTA_COST}"
+            )
+
+        publish_at = reserve_publish_slot(slots_per_day=capacity)
+
+    job_id = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    video_blob = f"{PENDING_PREFIX}{job_id}.mp4"
+
+    upload_to_gcs(video_file, video_blob)
+
+    meta = {
+        "job_id": job_id,
+        "video_blob": video_blob,
+        "title": title,
+        "subreddit": subreddit_name,
+        "publish_at": publish_at.strftime(SLOT_FORMAT)
+    }
+
+    if not write_json_if_generation(f"{PENDING_PREFIX}{job_id}.json", meta, 0):
+        raise RuntimeError(f"queue_job_id_collision | job_id={job_id}")
+
+    logger.info(
+        "render_enqueued | job_id=%s subreddit=%s publish_at=%s",
+        job_id,
+        subreddit_name,
+        meta["publish_at"]
+    )
+
+    return job_id
+
+
+# ----------------------------------------
+# Publish Side
+# ----------------------------------------
+
+def _claim(job_id, existing=False):
+    """
+    Claims a pending job with a create-only write. An existing claim
+    older than PUBLISH_CLAIM_TIMEOUT_SECONDS was left by a publisher
+    that died mid-job; it is taken over at its current generation, so
+    only one publisher wins it.
+    """
+    claim_blob = f"{CLAIMED_PREFIX}{job_id}.json"
+    generation = 0
+
+    if existing:
+        claim, generation = read_json_with_generation(claim_blob)
+
+        if claim is not None:
+            claimed_at = datetime.strptime(claim["claimed_at"], SLOT_FORMAT)
+            if (datetime.utcnow() - claimed_at).total_seconds() < PUBLISH_CLAIM_TIMEOUT_SECONDS:
+                return False
+
+            logger.warning(
+                "queued_job_claim_expired | job_id=%s claimed_at=%s",
+                job_id,
+                claim["claimed_at"]
+            )
+
+    return write_json_if_generation(
+        claim_blob,
+        {"claimed_at": datetime.utcnow().strftime(SLOT_FORMAT)},
+        generation
+    )
+
+
+def _publish_to_channels(meta, local_path, scheduled_time, channels, reservations):
+    """
+    Fans the job out to every channel. Channels that succeeded are saved
+    into the job metadata before raising, so a retry only re-uploads the
+    channels that failed; quota is returned for channels that failed
+    before their insert was sent.
+    """
+    published, failed = publish_to_channels(
+        local_path,
+        meta["title"],
+        meta["subreddit"],
+        channels,
+        scheduled_time=scheduled_time,
+        already_published=meta.get("published")
+    )
+
+    if failed:
+        release_unattempted(reservations, [
+            channel.project for channel in channels
+            if isinstance(failed.get(channel.name), UploadNotAttemptedError)
+        ])
+        meta["published"] = published
+        write_json_to_gcs(f"{PENDING_PREFIX}{meta['job_id']}.json", meta)
+        raise RuntimeError(
+            f"channel_publish_incomplete | job_id={meta['job_id']} "
+            f"failed={','.join(sorted(failed))}"
+        )
+
+    log_post_time(meta["subreddit"], meta["title"])
+    return published
+
+
+def publish_queued_job(meta, description="Enjoy memes daily!", channels=None):
+    job_id = meta["job_id"]
+    local_path = f"/tmp/{job_id}.mp4"
+
+    publish_at = datetime.strptime(meta["publish_at"], SLOT_FORMAT)
+    earliest = datetime.utcnow() + timedelta(minutes=PUBLISH_LEAD_MINUTES)
+
+    # A slot that slipped into the past would publish immediately
+    scheduled_time = publish_at if publish_at > earliest else None
+
+    download_from_gcs(meta["video_blob"], local_path)
+
+    try:
+        # Reserved once the video is local; units count as spent
+        # whatever the outcome once an insert has been sent
+        reservations = reserve_uploads(
+            upload_projects(channels, skip=meta.get("published", {})),
+            label=f"publish-{job_id}"
+        )
+
+        if channels:
+            video_id = _publish_to_channels(meta, local_path, scheduled_time, channels, reservations)
+        else:
+            try:
+                video_id = upload_video(
+                    0,
+                    meta["subreddit"],
+                    local_path,
+                    meta["title"],
+                    description,
+                    scheduled_time=scheduled_time,
+                    # Logged when the render was queued
+                    record_post=False
+                )
+            except UploadNotAttemptedError:
+                release_uploads(reservations)
+                raise
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+    delete_from_gcs(meta["video_blob"])
+    delete_from_gcs(f"{PENDING_PREFIX}{job_id}.json")
+    delete_from_gcs(f"{CLAIMED_PREFIX}{job_id}.json")
+
+    return video_id
+
+
+def drain_publish_queue(limit):
+    """
+    Publishes up to `limit` pending jobs, oldest first, and no more
+    than today's remaining API quota allows.
+    Stops at the first failure so an outage or exhausted quota does not
+    burn through the queue; the failed job is released for the next run.
+    """
+    pending = sorted(
+        name for name in list_blob_names(PENDING_PREFIX)
+        if name.endswith(".json")
+    )
+    claimed = {
+        os.path.basename(name)
+        for name in list_blob_names(CLAIMED_PREFIX)
+    }
+
+    published = 0
+    channels = load_channel_profiles()
+
+    affordable = uploads_remaining_today(upload_projects(channels))
+    if affordable < limit:
+        logger.info("publish_limit_capped_by_quota | limit=%d affordable=%d", limit, affordable)
+        limit = affordable
+
+    for meta_blob in pending:
+        if published >= limit:
+            break
+
+        meta = read_json_from_gcs(meta_blob)
+        if not meta or not _claim(meta["job_id"], existing=os.path.basename(meta_blob) in claimed):
+            continue
+
+        logger.info("queued_job_claimed | job_id=%s", meta["job_id"])
+
+        try:
+            publish_queued_job(meta, channels=channels)
+        except QuotaExhaustedError as e:
+            # Not a job failure: leave it pending for the next quota day
+            logger.warning("publish_stopped_quota_exhausted | job_id=%s error=%s", meta["job_id"], e)
+            delete_from_gcs(f"{CLAIMED_PREFIX}{meta['job_id']}.json")
+            break
+        except Exception:
+            logger.exception("queued_job_publish_failed | job_id=%s", meta["job_id"])
+            delete_from_gcs(f"{CLAIMED_PREFIX}{meta['job_id']}.json")
+            raise
+
+        published += 1
+
+    logger.info("publish_queue_drained | published=%d", published)
+    return published
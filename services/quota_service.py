@@ -0,0 +1,260 @@
+import uuid
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+
+import pytz
+
+from config import (
+    YOUTUBE_PROJECT_ID,
+    YOUTUBE_DAILY_QUOTA,
+    YOUTUBE_UPLOAD_QUOTA_COST,
+    QUOTA_LEDGER_PREFIX,
+    QUOTA_TIMEZONE,
+    PUBLISH_SLOT_HOURS_UTC
+)
+from services.storage_service import read_json_with_generation, write_json_if_generation
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExhaustedError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class QuotaReservation:
+    project: str
+    day: str
+    entry_id: str
+    units: int
+
+
+# ----------------------------------------
+# Ledger
+# ----------------------------------------
+
+def quota_day(now=None):
+    """
+    The quota day (YYYY-MM-DD) an API call made at `now` is billed to.
+    Budgets reset at midnight Pacific time, not UTC.
+    """
+    now = now or datetime.now(pytz.utc)
+    return now.astimezone(pytz.timezone(QUOTA_TIMEZONE)).strftime("%Y-%m-%d")
+
+
+def _ledger_blob(project, day):
+    return f"{QUOTA_LEDGER_PREFIX}{project}/{day}.json"
+
+
+def _spent(ledger):
+    return sum(entry["units"] for entry in ledger["entries"].values())
+
+
+def _empty_ledger(project, day):
+    return {"project": project, "day": day, "exhausted": False, "entries": {}}
+
+
+def read_ledger(project=YOUTUBE_PROJECT_ID, day=None):
+    day = day or quota_day()
+    ledger, _ = read_json_with_generation(_ledger_blob(project, day))
+    return ledger or _empty_ledger(project, day)
+
+
+def remaining_units(project=YOUTUBE_PROJECT_ID):
+    ledger = read_ledger(project)
+    if ledger["exhausted"]:
+        return 0
+    return max(0, YOUTUBE_DAILY_QUOTA - _spent(ledger))
+
+
+def _update_ledger(project, day, change, max_attempts=5):
+    """
+    Applies change(ledger) under a generation check, so concurrent jobs
+    never overwrite each other's entries. change returns False to leave
+    the ledger untouched.
+    """
+    blob_name = _ledger_blob(project, day)
+
+    for _ in range(max_attempts):
+        ledger, generation = read_json_with_generation(blob_name)
+        ledger = ledger or _empty_ledger(project, day)
+
+        if change(ledger) is False:
+            return ledger
+
+        if write_json_if_generation(blob_name, ledger, generation):
+            return ledger
+
+    raise RuntimeError(f"quota_ledger_update_conflict | project={project} day={day}")
+
+
+# ----------------------------------------
+# Reservations
+# ----------------------------------------
+
+def upload_projects(channels, skip=()):
+    """
+    The project billed for each upload one render needs: one per channel
+    not in `skip`, or the default project when no channels are set up.
+    """
+    if not channels:
+        return [YOUTUBE_PROJECT_ID]
+    return [channel.project for channel in channels if channel.name not in skip]
+
+
+def _reserve(project, units, label):
+    day = quota_day()
+    entry_id = uuid.uuid4().hex[:12]
+
+    def change(ledger):
+        spent = _spent(ledger)
+
+        if ledger["exhausted"] or spent + units > YOUTUBE_DAILY_QUOTA:
+            raise QuotaExhaustedError(
+                f"youtube_quota_exhausted | project={project} day={day} "
+                f"spent={spent} needed={units} budget={YOUTUBE_DAILY_QUOTA}"
+            )
+
+        ledger["entries"][entry_id] = {
+            "units": units,
+            "label": label,
+            "at": datetime.now(pytz.utc).isoformat()
+        }
+
+    ledger = _update_ledger(project, day, change)
+
+    logger.info(
+        "youtube_quota_reserved | project=%s day=%s units=%d spent=%d budget=%d label=%s",
+        project,
+        day,
+        units,
+        _spent(ledger),
+        YOUTUBE_DAILY_QUOTA,
+        label
+    )
+
+    return QuotaReservation(project, day, entry_id, units)
+
+
+def reserve_uploads(projects, label):
+    """
+    Reserves one upload's worth of quota per entry in `projects` (see
+    upload_projects) before any rendering is done. Raises
+    QuotaExhaustedError, holding nothing, if any project lacks budget.
+    """
+    reservations = []
+
+    try:
+        for project, uploads in Counter(projects).items():
+            reservations.append(_reserve(project, uploads * YOUTUBE_UPLOAD_QUOTA_COST, label))
+    except Exception:
+        release_uploads(reservations)
+        raise
+
+    return reservations
+
+
+def release_uploads(reservations):
+    """
+    Returns reserved units when no videos.insert was made for them (no
+    post found, render failed). Units for attempted uploads stay spent,
+    as the API bills the insert whether or not it succeeds.
+    """
+    for reservation in reservations:
+        def change(ledger):
+            if ledger["entries"].pop(reservation.entry_id, None) is None:
+                return False
+
+        _update_ledger(reservation.project, reservation.day, change)
+
+        logger.info(
+            "youtube_quota_released | project=%s day=%s units=%d",
+            reservation.project,
+            reservation.day,
+            reservation.units
+        )
+
+
+def release_unattempted(reservations, projects):
+    """
+    Returns one upload's units out of `reservations` per entry in
+    `projects`, for uploads that failed before any videos.insert was
+    sent. The rest of each reservation stays spent.
+    """
+    per_project = Counter(projects)
+
+    for reservation in reservations:
+        units = min(reservation.units, per_project[reservation.project] * YOUTUBE_UPLOAD_QUOTA_COST)
+        if not units:
+            continue
+
+        def change(ledger):
+            entry = ledger["entries"].get(reservation.entry_id)
+            if entry is None:
+                return False
+
+            entry["units"] -= units
+            if entry["units"] <= 0:
+                del ledger["entries"][reservation.entry_id]
+
+        _update_ledger(reservation.project, reservation.day, change)
+
+        logger.info(
+            "youtube_quota_released | project=%s day=%s units=%d",
+            reservation.project,
+            reservation.day,
+            units
+        )
+
+
+def mark_quota_exhausted(project=YOUTUBE_PROJECT_ID):
+    """
+    Records that the API refused an upload for quota, so every job stops
+    spending for the rest of the Pacific day even if the ledger
+    undercounts (uploads made outside this pipeline).
+    """
+    day = quota_day()
+
+    def change(ledger):
+        if ledger["exhausted"]:
+            return False
+        ledger["exhausted"] = True
+
+    _update_ledger(project, day, change)
+    logger.warning("youtube_quota_marked_exhausted | project=%s day=%s", project, day)
+
+
+# ----------------------------------------
+# Planning
+# ----------------------------------------
+
+def daily_upload_capacity(projects):
+    """
+    Videos that can be published per day: bounded by the publish slots
+    and by how many renders the tightest project's budget can upload.
+    """
+    per_render = Counter(projects)
+    if not per_render:
+        return len(PUBLISH_SLOT_HOURS_UTC)
+
+    by_quota = min(
+        YOUTUBE_DAILY_QUOTA // (uploads * YOUTUBE_UPLOAD_QUOTA_COST)
+        for uploads in per_render.values()
+    )
+    return min(len(PUBLISH_SLOT_HOURS_UTC), by_quota)
+
+
+def uploads_remaining_today(projects):
+    """
+    Renders whose uploads still fit in today's remaining budget.
+    """
+    per_render = Counter(projects)
+    if not per_render:
+        return len(PUBLISH_SLOT_HOURS_UTC)
+
+    return min(
+        remaining_units(project) // (uploads * YOUTUBE_UPLOAD_QUOTA_COST)
+        for project, uploads in per_render.items()
+    )
@@ -1,11 +1,13 @@
 import os
-import json
+import html
 import random
-import requests
 import unicodedata
 import re
 import praw
 import logging
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logger = logging.getLogger(__name__)
 
@@ -13,85 +15,278 @@ from config import (
     REDDIT_CLIENT_ID,
     REDDIT_CLIENT_SECRET,
     REDDIT_USER_AGENT,
+    REDDIT_MAX_CONCURRENCY,
+    REDDIT_CANDIDATE_TARGET,
+    VIDEO_PADDING_SECONDS,
+    OVERLAY_WIDTH,
+    MAX_FOREGROUND_CLIP_SECONDS,
     CSV_FILE
 )
+from services.tts_service import estimate_narration
+from services.phash_service import is_duplicate_image
+from utils.network import call, http_session
+
+# PRAW instances are not thread-safe, so harvest workers get their own
+_thread_clients = threading.local()
+
+# Builds a Reddit client; replaced by the replay harness with recorded listings
+_reddit_factory = None
+
+# Shared across harvests, so a resident worker keeps its threads (and
+# their clients and connection pools) warm between jobs
+_harvest_pool = None
+_harvest_pool_lock = threading.Lock()
+
+
+def set_reddit_factory(factory):
+    global _reddit_factory, _thread_clients
+    _reddit_factory = factory
+    # Drop the clients cached on every harvest thread, not just this one
+    _thread_clients = threading.local()
+
+
+def _new_reddit():
+    if _reddit_factory is not None:
+        return _reddit_factory()
+
+    return praw.Reddit(
+        client_id=REDDIT_CLIENT_ID,
+        client_secret=REDDIT_CLIENT_SECRET,
+        user_agent=REDDIT_USER_AGENT
+    )
 
-# Initialize Reddit client once
-reddit = praw.Reddit(
-    client_id=REDDIT_CLIENT_ID,
-    client_secret=REDDIT_CLIENT_SECRET,
-    user_agent=REDDIT_USER_AGENT
-)
 
+def _get_harvest_pool():
+    global _harvest_pool
 
-def fetch_top_post(config_blob_path):
+    with _harvest_pool_lock:
+        if _harvest_pool is None:
+            _harvest_pool = ThreadPoolExecutor(
+                max_workers=REDDIT_MAX_CONCURRENCY,
+                thread_name_prefix="reddit"
+            )
+        return _harvest_pool
+
+
+def _thread_reddit():
+    client = getattr(_thread_clients, "reddit", None)
+
+    if client is None:
+        client = _new_reddit()
+        _thread_clients.reddit = client
+
+    return client
+
+
+def fetch_top_post(config, image_dir="."):
     """
     Fetches a top Reddit post from configured subreddits.
-    Avoids duplicates based on logged CSV entries.
+    Avoids duplicates based on logged CSV entries and, after a cheap
+    reduced-resolution decode, on perceptual hashes of published images.
+    Returns (title, image_path, subreddit_name, image_hash).
     """
 
-    with open(config_blob_path, 'r') as f:
-        config = json.load(f)
+    candidates = harvest_candidates(
+        config.subreddits,
+        config.time_filters,
+        load_logged_titles()
+    )
+    candidates = prefer_duration_window(
+        candidates,
+        config.duration_window.min_seconds,
+        config.duration_window.max_seconds
+    )
 
-    subreddits = config.get("subreddits", [])
-    time_filters = config.get("time_filters", [])
+    for candidate in candidates:
+        image_name = download_image(candidate["url"], image_dir)
+
+        if not image_name:
+            continue
+
+        try:
+            duplicate, image_hash = is_duplicate_image(image_name)
+        except Exception:
+            logger.exception("phash_check_failed | file=%s", image_name)
+            os.remove(image_name)
+            continue
+
+        if duplicate:
+            os.remove(image_name)
+            continue
+
+        logger.info(
+            "post_selected | subreddit=%s title=%s est_duration=%.1f tts_chars=%d",
+            candidate["subreddit"],
+            candidate["title"],
+            candidate["est_duration"],
+            candidate["tts_chars"]
+        )
+        return candidate["title"], image_name, candidate["subreddit"], image_hash
+
+    logger.error("no_posts_available_across_all_subreddits")
+    return None, None, None, None
+
+
+def _scan_listing(subreddit_name, time_filter, logged_titles, found, stop):
+    """
+    Walks one subreddit/time-filter listing, adding unseen image posts to
+    `found` until the shared stop event is set.
+    """
+    if stop.is_set():
+        return
+
+    logger.info(
+        "fetching_posts | subreddit=%s time_filter=%s",
+        subreddit_name,
+        time_filter or "all_time"
+    )
 
-    tried_subreddits = set()
+    subreddit = _thread_reddit().subreddit(subreddit_name)
 
-    while len(tried_subreddits) < len(subreddits):
+    posts = (
+        subreddit.top(time_filter, limit=1000)
+        if time_filter
+        else subreddit.top(limit=1000)
+    )
+
+    for post in posts:
+        if stop.is_set():
+            return
+
+        final_title = format_title(subreddit_name, post.title)
+        norm_title = normalize(final_title)
+
+        if norm_title in logged_titles:
+            continue
+
+        image_url = select_image_url(post) or select_clip_url(post)
 
-        subreddit_name = random.choice(
-            [s for s in subreddits if s not in tried_subreddits]
+        if not image_url:
+            continue
+
+        found.add(
+            norm_title,
+            {
+                "subreddit": subreddit_name,
+                "title": final_title,
+                "url": image_url,
+                "score": post.score
+            }
         )
-        tried_subreddits.add(subreddit_name)
 
-        logger.info("subreddit_selected | name=%s", subreddit_name)
+        if len(found) >= REDDIT_CANDIDATE_TARGET:
+            stop.set()
+            return
 
-        subreddit = reddit.subreddit(subreddit_name)
-        logged_titles = load_logged_titles()
 
-        for time_filter in time_filters:
+class _CandidateSet:
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
 
-            logger.info(
-                "fetching_posts | subreddit=%s time_filter=%s",
-                subreddit_name,
-                time_filter or "all_time"
-            )
+    def add(self, key, candidate):
+        with self._lock:
+            self._items.setdefault(key, candidate)
 
-            posts = (
-                subreddit.top(time_filter, limit=1000)
-                if time_filter
-                else subreddit.top(limit=1000)
-            )
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
 
-            for post in posts:
+    def values(self):
+        with self._lock:
+            return list(self._items.values())
 
-                final_title = format_title(subreddit_name, post.title)
-                norm_title = normalize(final_title)
 
-                if norm_title in logged_titles:
-                    continue
+def harvest_candidates(subreddits, time_filters, logged_titles):
+    """
+    Scans every subreddit/time-filter listing concurrently and returns
+    unseen image posts ranked for selection. Stops all listings once
+    REDDIT_CANDIDATE_TARGET candidates exist.
 
-                if not is_image_or_gif(post.url):
-                    continue
+    Ranking keeps the old behaviour of trying subreddits in random order
+    with top posts first, by interleaving per-subreddit score rankings.
+    """
+    found = _CandidateSet()
+    stop = threading.Event()
+
+    listings = [
+        (subreddit_name, time_filter)
+        for subreddit_name in subreddits
+        for time_filter in time_filters
+    ]
+
+    pool = _get_harvest_pool()
+    futures = [
+        pool.submit(_scan_listing, name, time_filter, logged_titles, found, stop)
+        for name, time_filter in listings
+    ]
+
+    for future in as_completed(futures):
+        try:
+            future.result()
+        except Exception:
+            logger.exception("listing_scan_failed")
+
+    by_subreddit = {}
+    for candidate in found.values():
+        by_subreddit.setdefault(candidate["subreddit"], []).append(candidate)
+
+    order = list(by_subreddit)
+    random.shuffle(order)
+
+    ranked = []
+    queues = [
+        sorted(by_subreddit[name], key=lambda c: c["score"], reverse=True)
+        for name in order
+    ]
+    for rank in range(max((len(q) for q in queues), default=0)):
+        ranked += [q[rank] for q in queues if rank < len(q)]
+
+    # After an early stop, an empty subreddit may simply not have been scanned
+    if not stop.is_set():
+        for name in subreddits:
+            if name not in by_subreddit:
+                logger.warning("no_valid_post_found | subreddit=%s", name)
+
+    logger.info(
+        "candidates_harvested | count=%d listings=%d",
+        len(ranked),
+        len(listings)
+    )
 
-                image_name = download_image(post.url)
+    return ranked
 
-                if image_name:
-                    logger.info(
-                        "post_selected | subreddit=%s title=%s",
-                        subreddit_name,
-                        final_title
-                    )
-                    return final_title, image_name, subreddit_name
 
-        logger.warning(
-            "no_valid_post_found | subreddit=%s",
-            subreddit_name
-        )
+def prefer_duration_window(candidates, min_seconds, max_seconds):
+    """
+    Annotates candidates with estimated video duration and TTS characters,
+    then moves those inside [min_seconds, max_seconds] to the front
+    (keeping their ranking). The rest follow, closest to the window first.
+    """
+    def distance(candidate):
+        duration = candidate["est_duration"]
+        if duration < min_seconds:
+            return min_seconds - duration
+        return max(0.0, duration - max_seconds)
+
+    for candidate in candidates:
+        narration, chars = estimate_narration(candidate["title"])
+        candidate["est_duration"] = narration + VIDEO_PADDING_SECONDS
+        candidate["tts_chars"] = chars
+
+    ordered = sorted(candidates, key=distance)
+
+    logger.info(
+        "duration_window_applied | window=%.0f-%.0fs in_window=%d total=%d",
+        min_seconds,
+        max_seconds,
+        sum(1 for c in candidates if distance(c) == 0),
+        len(candidates)
+    )
+
+    return ordered
+
 
-    logger.error("no_posts_available_across_all_subreddits")
-    return None, None, None
 def load_logged_titles():
     try:
         with open(CSV_FILE, "r") as log_file:
@@ -116,29 +311,117 @@ def format_title(subreddit_name, raw_title):
     return raw_title
 
 
-def download_image(url):
+def select_image_url(post):
+    """
+    Picks the cheapest image URL that still covers the overlay width:
+    the smallest Reddit preview rendition at least OVERLAY_WIDTH wide,
+    else the original when it is a direct image link, else the largest
+    preview. GIFs stay animated: their MP4 (or GIF) variant, else the
+    original. Returns None for posts that are not images.
+    """
+    # Read listing attributes directly; PRAW getattr would lazily
+    # re-fetch the whole submission for a missing attribute
+    attrs = vars(post)
+    images = (attrs.get("preview") or {}).get("images") or []
+    is_image_post = attrs.get("post_hint") == "image"
+
+    # Static previews of a GIF are its first frame only
+    if urlparse(post.url).path.lower().endswith(".gif"):
+        variants = images[0].get("variants", {}) if images else {}
+        for kind in ("mp4", "gif"):
+            source = (variants.get(kind) or {}).get("source")
+            if source:
+                return html.unescape(source["url"])
+        return post.url
+
+    if images and (is_image_post or is_image_or_gif(post.url)):
+        source = images[0].get("source")
+        renditions = list(images[0].get("resolutions", []))
+        if source:
+            renditions.append(source)
+
+        suitable = [r for r in renditions if r.get("width", 0) >= OVERLAY_WIDTH]
+        if suitable:
+            return html.unescape(min(suitable, key=lambda r: r["width"])["url"])
+
+    if is_image_or_gif(post.url):
+        return post.url
+
+    if images and is_image_post and images[0].get("source"):
+        return html.unescape(images[0]["source"]["url"])
+
+    return None
+
+
+def select_clip_url(post):
+    """
+    Returns a silent MP4 URL for Reddit-hosted videos no longer than
+    MAX_FOREGROUND_CLIP_SECONDS, else None.
+    """
+    attrs = vars(post)
+    if not attrs.get("is_video"):
+        return None
+
+    video = (attrs.get("media") or {}).get("reddit_video") or {}
+    if not video.get("fallback_url"):
+        return None
+
+    if video.get("duration", 0) > MAX_FOREGROUND_CLIP_SECONDS:
+        return None
+
+    return video["fallback_url"]
+
+
+def _image_extension(url, content_type):
+    ext = IMAGE_CONTENT_TYPES.get((content_type or "").split(";")[0].strip())
+    if ext:
+        return ext
+    return os.path.splitext(urlparse(url).path)[-1] or ".jpg"
+
+
+def download_image(url, image_dir="."):
     try:
         headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
 
-        image_ext = os.path.splitext(url)[-1]
-        image_name = f"downloaded_meme{image_ext}"
+        def fetch(timeout):
+            # The body is read inside the attempt, so the timeout and a
+            # hedged second request cover the transfer, not just headers
+            response = http_session("media").get(url, headers=headers, timeout=timeout)
+            response.raise_for_status()
+            return response.content, response.headers.get("Content-Type")
+
+        content, content_type = call("image", fetch)
+
+        image_ext = _image_extension(url, content_type)
+        image_name = os.path.join(image_dir, f"downloaded_meme{image_ext}")
 
         with open(image_name, 'wb') as handler:
-            handler.write(response.content)
+            handler.write(content)
 
-        logger.info("image_downloaded | file=%s", image_name)
+        logger.info(
+            "image_downloaded | file=%s bytes=%d",
+            image_name,
+            len(content)
+        )
         return image_name
 
     except Exception:
         logger.exception("image_download_failed | url=%s", url)
         return None
 
+IMAGE_CONTENT_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "video/mp4": ".mp4"
+}
+
+
 def is_image_or_gif(url):
     return any(
-        url.lower().endswith(ext)
-        for ext in [".jpg", ".jpeg", ".png"]
+        urlparse(url).path.lower().endswith(ext)
+        for ext in [".jpg", ".jpeg", ".png", ".gif"]
     )
 
 
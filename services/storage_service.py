@@ -1,14 +1,197 @@
 import os
+import json
+import uuid
+import base64
 import random
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import google_crc32c
+from google.api_core.exceptions import NotFound, NotModified, PreconditionFailed
 from google.cloud import storage
-from config import BUCKET_NAME, LOCAL_MUSIC_DIR, LOCAL_GAMEPLAY_DIR
+from config import (
+    BUCKET_NAME,
+    LOCAL_MUSIC_DIR,
+    LOCAL_GAMEPLAY_DIR,
+    GCS_PARALLEL_THRESHOLD_MB,
+    GCS_CHUNK_SIZE_MB,
+    GCS_MAX_WORKERS,
+    ASSET_CACHE_MUSIC_MB,
+    ASSET_CACHE_GAMEPLAY_MB
+)
+from services.asset_cache import AssetCache
+from utils.network import call, pooled_adapter
 
 logger = logging.getLogger(__name__)
 
-# Initialize GCS client once
-storage_client = storage.Client()
-bucket = storage_client.bucket(BUCKET_NAME)
+MB = 1024 * 1024
+
+# GCS compose accepts at most 32 source objects per call
+MAX_COMPOSE_SOURCES = 32
+COMPOSITE_TMP_PREFIX = "_tmp/composite/"
+
+# Created on first use; the replay harness swaps in a local bucket
+_bucket = None
+_bucket_lock = threading.Lock()
+
+
+def get_bucket():
+    global _bucket
+
+    if _bucket is None:
+        with _bucket_lock:
+            if _bucket is None:
+                storage_client = storage.Client()
+
+                # Size the shared session's pool so chunk workers (and
+                # their hedged requests) reuse connections instead of
+                # opening (and discarding) one per request.
+                pool_adapter = pooled_adapter(2 * GCS_MAX_WORKERS)
+                storage_client._http.mount("https://", pool_adapter)
+                storage_client._http.mount("http://", pool_adapter)
+
+                _bucket = storage_client.bucket(BUCKET_NAME)
+
+    return _bucket
+
+
+def set_bucket(replacement):
+    """
+    Replaces the bucket used by every helper in this module. Anything
+    implementing the google.cloud.storage Bucket/Blob calls used here works.
+    """
+    global _bucket
+    _bucket = replacement
+
+
+# Assets survive across runs on warm instances or a mounted volume
+music_cache = AssetCache(LOCAL_MUSIC_DIR, ASSET_CACHE_MUSIC_MB * MB)
+gameplay_cache = AssetCache(LOCAL_GAMEPLAY_DIR, ASSET_CACHE_GAMEPLAY_MB * MB)
+
+
+# ----------------------------------------
+# Chunked Transfers
+# ----------------------------------------
+
+def _file_crc32c(local_path):
+    checksum = google_crc32c.Checksum()
+    with open(local_path, "rb") as f:
+        for block in iter(lambda: f.read(MB), b""):
+            checksum.update(block)
+    return base64.b64encode(checksum.digest()).decode("utf-8")
+
+
+def _chunk_ranges(size, chunk_size):
+    return [
+        (start, min(start + chunk_size, size) - 1)
+        for start in range(0, size, chunk_size)
+    ]
+
+
+def _verify_crc32c(blob, local_path):
+    local_crc = _file_crc32c(local_path)
+
+    if blob.crc32c and blob.crc32c != local_crc:
+        raise RuntimeError(
+            f"gcs_checksum_mismatch | blob={blob.name} "
+            f"remote={blob.crc32c} local={local_crc}"
+        )
+
+
+def _download_chunked(blob, local_path):
+    """
+    Downloads a blob as concurrent ranged reads pinned to one generation,
+    then verifies the assembled file against the object's CRC32C.
+    """
+    chunk_size = GCS_CHUNK_SIZE_MB * MB
+    ranges = _chunk_ranges(blob.size, chunk_size)
+
+    with open(local_path, "wb") as f:
+        f.truncate(blob.size)
+
+    fd = os.open(local_path, os.O_WRONLY)
+
+    def fetch(byte_range):
+        start, end = byte_range
+        data = call("gcs_range", lambda timeout: blob.download_as_bytes(
+            start=start,
+            end=end,
+            if_generation_match=blob.generation,
+            checksum=None,
+            timeout=timeout,
+            retry=None
+        ))
+        os.pwrite(fd, data, start)
+
+    try:
+        with ThreadPoolExecutor(max_workers=GCS_MAX_WORKERS) as pool:
+            list(pool.map(fetch, ranges))
+    finally:
+        os.close(fd)
+
+    _verify_crc32c(blob, local_path)
+
+
+def _upload_composite(local_path, blob, size):
+    """
+    Uploads a file as parallel part objects and composes them into the
+    destination, then checks the composed CRC32C against the local file.
+    """
+    chunk_size = max(GCS_CHUNK_SIZE_MB * MB, -(-size // MAX_COMPOSE_SOURCES))
+    ranges = _chunk_ranges(size, chunk_size)
+
+    tmp_prefix = f"{COMPOSITE_TMP_PREFIX}{uuid.uuid4().hex}/"
+    parts = [get_bucket().blob(f"{tmp_prefix}{i:02d}") for i in range(len(ranges))]
+
+    def send(index):
+        start, end = ranges[index]
+        with open(local_path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start + 1)
+        call("gcs_write", lambda timeout: parts[index].upload_from_string(
+            data,
+            content_type="application/octet-stream",
+            checksum="crc32c",
+            timeout=timeout,
+            retry=None
+        ))
+
+    try:
+        with ThreadPoolExecutor(max_workers=GCS_MAX_WORKERS) as pool:
+            list(pool.map(send, range(len(parts))))
+
+        call("gcs_write", lambda timeout: blob.compose(parts, timeout=timeout, retry=None))
+
+    finally:
+        for part in parts:
+            try:
+                part.delete()
+            except NotFound:
+                pass
+
+    _verify_crc32c(blob, local_path)
+
+
+def _download_blob(blob, local_path):
+    """
+    Downloads a blob whose metadata (size, crc32c) is already loaded,
+    switching to chunked parallel reads above the size threshold. Small
+    blobs are read into memory first, so a hedged read never has two
+    requests writing the same file.
+    """
+    if blob.size and blob.size >= GCS_PARALLEL_THRESHOLD_MB * MB:
+        _download_chunked(blob, local_path)
+        return
+
+    data = call("gcs_read", lambda timeout: blob.download_as_bytes(
+        if_generation_match=blob.generation,
+        timeout=timeout,
+        retry=None
+    ))
+
+    with open(local_path, "wb") as f:
+        f.write(data)
 
 
 def download_from_gcs(blob_name, local_path=None):
@@ -20,8 +203,15 @@ def download_from_gcs(blob_name, local_path=None):
         local_path = f"/tmp/{blob_name}"
 
     try:
-        blob = bucket.blob(blob_name)
-        blob.download_to_filename(local_path)
+        blob = call("gcs_read", lambda timeout: get_bucket().get_blob(
+            blob_name,
+            timeout=timeout,
+            retry=None
+        ))
+        if blob is None:
+            raise NotFound(f"gcs_blob_missing | blob={blob_name}")
+
+        _download_blob(blob, local_path)
 
         logger.info(
             "gcs_download_success | bucket=%s blob=%s local_path=%s",
@@ -41,13 +231,24 @@ def download_from_gcs(blob_name, local_path=None):
         raise
 
 
-def upload_to_gcs(local_path: str, blob_name: str):
+def upload_to_gcs(local_path: str, blob_name: str, metadata=None):
     """
     Uploads a local file to GCS, overwriting existing object.
     """
     try:
-        blob = bucket.blob(blob_name)
-        blob.upload_from_filename(local_path)
+        blob = get_bucket().blob(blob_name)
+        if metadata:
+            blob.metadata = metadata
+
+        size = os.path.getsize(local_path)
+        if size >= GCS_PARALLEL_THRESHOLD_MB * MB:
+            _upload_composite(local_path, blob, size)
+        else:
+            call("gcs_write", lambda timeout: blob.upload_from_filename(
+                local_path,
+                timeout=timeout,
+                retry=None
+            ))
 
         logger.info(
             "gcs_upload_success | bucket=%s blob=%s local_path=%s",
@@ -65,11 +266,209 @@ def upload_to_gcs(local_path: str, blob_name: str):
         raise
 
 
+def read_json_from_gcs(blob_name):
+    """
+    Reads a JSON blob straight into memory.
+    Returns None when the blob does not exist.
+    """
+    try:
+        data = call("gcs_read", lambda timeout: get_bucket().blob(blob_name).download_as_text(
+            timeout=timeout,
+            retry=None
+        ))
+
+    except NotFound:
+        logger.info(
+            "gcs_json_missing | bucket=%s blob=%s",
+            BUCKET_NAME,
+            blob_name
+        )
+        return None
+
+    except Exception:
+        logger.exception(
+            "gcs_json_read_failed | bucket=%s blob=%s",
+            BUCKET_NAME,
+            blob_name
+        )
+        raise
+
+    return json.loads(data)
+
+
+def write_json_to_gcs(blob_name, data):
+    """
+    Writes a JSON-serialisable object to GCS, overwriting existing object.
+    """
+    try:
+        payload = json.dumps(data)
+        call("gcs_write", lambda timeout: get_bucket().blob(blob_name).upload_from_string(
+            payload,
+            content_type="application/json",
+            timeout=timeout,
+            retry=None
+        ))
+
+        logger.info(
+            "gcs_json_written | bucket=%s blob=%s",
+            BUCKET_NAME,
+            blob_name
+        )
+
+    except Exception:
+        logger.exception(
+            "gcs_json_write_failed | bucket=%s blob=%s",
+            BUCKET_NAME,
+            blob_name
+        )
+        raise
+
+
+def read_bytes_with_generation(blob_name):
+    """
+    Reads a blob into memory together with its generation.
+    Returns (None, 0) when the blob does not exist, so the generation can
+    be passed straight to write_bytes_if_generation as a create-only guard.
+    """
+    def read(timeout):
+        # A blob object per attempt: a hedged read must not mix the
+        # generation of one response with the data of another
+        blob = get_bucket().blob(blob_name)
+        return blob.download_as_bytes(timeout=timeout, retry=None), blob.generation
+
+    try:
+        return call("gcs_read", read)
+    except NotFound:
+        return None, 0
+
+
+def read_bytes_if_changed(blob_name, generation):
+    """
+    Downloads a blob only if its generation differs from `generation`,
+    in a single conditional request.
+    Returns (data, new_generation), or (None, generation) when unchanged.
+    """
+    def read(timeout):
+        blob = get_bucket().blob(blob_name)
+        data = blob.download_as_bytes(
+            if_generation_not_match=generation or None,
+            timeout=timeout,
+            retry=None
+        )
+        return data, blob.generation
+
+    try:
+        return call("gcs_read", read)
+    except NotModified:
+        return None, generation
+
+
+def write_bytes_if_generation(blob_name, data, generation, content_type="application/octet-stream"):
+    """
+    Writes a blob only if it is still at `generation`.
+    Returns False when another writer got there first.
+    """
+    try:
+        call("gcs_write", lambda timeout: get_bucket().blob(blob_name).upload_from_string(
+            data,
+            content_type=content_type,
+            if_generation_match=generation,
+            timeout=timeout,
+            retry=None
+        ))
+
+    except PreconditionFailed:
+        logger.info(
+            "gcs_write_conflict | bucket=%s blob=%s generation=%s",
+            BUCKET_NAME,
+            blob_name,
+            generation
+        )
+        return False
+
+    return True
+
+
+def read_json_with_generation(blob_name):
+    data, generation = read_bytes_with_generation(blob_name)
+
+    if data is None:
+        return None, 0
+
+    return json.loads(data), generation
+
+
+def write_json_if_generation(blob_name, data, generation):
+    return write_bytes_if_generation(
+        blob_name,
+        json.dumps(data),
+        generation,
+        content_type="application/json"
+    )
+
+
+def _list_blobs(prefix):
+    # Listing pages are fetched lazily, so the whole walk is one attempt
+    return call("gcs_read", lambda timeout: list(get_bucket().list_blobs(
+        prefix=prefix,
+        timeout=timeout,
+        retry=None
+    )))
+
+
+def list_blob_names(prefix):
+    return [blob.name for blob in _list_blobs(prefix)]
+
+
+def list_blob_info(prefix):
+    """
+    Lists blobs under a prefix with the metadata returned by the listing
+    itself, without a per-blob request.
+    """
+    return [
+        {
+            "name": blob.name,
+            "size": blob.size,
+            "time_created": blob.time_created,
+            "metadata": blob.metadata or {}
+        }
+        for blob in _list_blobs(prefix)
+    ]
+
+
+def blob_exists(blob_name):
+    return call("gcs_read", lambda timeout: get_bucket().blob(blob_name).exists(
+        timeout=timeout,
+        retry=None
+    ))
+
+
+def delete_from_gcs(blob_name):
+    try:
+        call("gcs_write", lambda timeout: get_bucket().blob(blob_name).delete(
+            timeout=timeout,
+            retry=None
+        ))
+
+        logger.info(
+            "gcs_delete_success | bucket=%s blob=%s",
+            BUCKET_NAME,
+            blob_name
+        )
+
+    except NotFound:
+        logger.warning(
+            "gcs_delete_missing | bucket=%s blob=%s",
+            BUCKET_NAME,
+            blob_name
+        )
+
+
 def get_random_music_file():
     """
-    Downloads a random .mp3 file from GCS music/ folder.
+    Returns a random .mp3 from the GCS music/ folder via the local cache.
     """
-    blobs = list(bucket.list_blobs(prefix="music/"))
+    blobs = _list_blobs("music/")
     music_blobs = [blob for blob in blobs if blob.name.endswith(".mp3")]
 
     if not music_blobs:
@@ -78,13 +477,9 @@ def get_random_music_file():
 
     selected_blob = random.choice(music_blobs)
 
-    os.makedirs(LOCAL_MUSIC_DIR, exist_ok=True)
-    local_path = os.path.join(
-        LOCAL_MUSIC_DIR,
-        os.path.basename(selected_blob.name)
-    )
-
-    selected_blob.download_to_filename(local_path)
+    # The listing already carries generation and size, so the cache
+    # check costs no extra request
+    local_path = music_cache.get(selected_blob, _download_blob)
 
     logger.info(
         "music_selected | blob=%s local_path=%s",
@@ -97,9 +492,10 @@ def get_random_music_file():
 
 def get_next_gameplay_file():
     """
-    Downloads a random gameplay .mp4 file from GCS gameplay/ folder.
+    Returns a random gameplay .mp4 from the GCS gameplay/ folder via the
+    local cache.
     """
-    blobs = list(bucket.list_blobs(prefix="gameplay/"))
+    blobs = _list_blobs("gameplay/")
     gameplay_blobs = [blob for blob in blobs if blob.name.endswith(".mp4")]
 
     if not gameplay_blobs:
@@ -108,13 +504,7 @@ def get_next_gameplay_file():
 
     selected_blob = random.choice(gameplay_blobs)
 
-    os.makedirs(LOCAL_GAMEPLAY_DIR, exist_ok=True)
-    local_path = os.path.join(
-        LOCAL_GAMEPLAY_DIR,
-        os.path.basename(selected_blob.name)
-    )
-
-    selected_blob.download_to_filename(local_path)
+    local_path = gameplay_cache.get(selected_blob, _download_blob)
 
     logger.info(
         "gameplay_selected | blob=%s local_path=%s",
@@ -1,19 +1,37 @@
 import re
-import json
 from io import BytesIO
-from datetime import timedelta
 
 import pydub
 from elevenlabs import ElevenLabs
 
-from config import ELEVEN_API_KEY
+from config import ELEVEN_API_KEY, NARRATION_WORDS_PER_SECOND
+from utils.network import call
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Initialize ElevenLabs client once
-client = ElevenLabs(api_key=ELEVEN_API_KEY)
+# Created on first use; the replay harness swaps in a canned responder
+_client = None
+
+
+def get_tts_client():
+    global _client
+
+    if _client is None:
+        _client = ElevenLabs(api_key=ELEVEN_API_KEY)
+
+    return _client
+
+
+def set_tts_client(client):
+    global _client
+    _client = client
+
+
+def _request_options(timeout):
+    # Retries are left to utils.network, which budgets them
+    return {"timeout_in_seconds": max(1, int(timeout)), "max_retries": 0}
 
 
 # ----------------------------
@@ -92,13 +110,41 @@ def clean_text_for_subtitles(text):
     return re.sub(r"[^\w\s]", "", text)
 
 
+NARRATION_PREAMBLE = "This meme is titled "
+
+
+def prepare_narration_text(original_text):
+    """
+    Builds the exact text sent to TTS: preamble, expanded acronyms and
+    softened profanity.
+    """
+    full_text = expand_acronyms(NARRATION_PREAMBLE + original_text)
+    return clean_profanity(full_text)
+
+
+def estimate_narration(original_text):
+    """
+    Estimates, without calling the API, how long the narration kept in
+    the video will run (preamble is trimmed) and how many characters the
+    TTS request will bill.
+    Returns (seconds, characters).
+    """
+    clean_text = prepare_narration_text(original_text)
+    title_text = clean_text[len(NARRATION_PREAMBLE):]
+
+    words = len(title_text.split())
+    seconds = words / NARRATION_WORDS_PER_SECOND
+
+    return seconds, len(clean_text)
+
+
 # ----------------------------
 # TTS + Alignment
 # ----------------------------
 
 def text_to_speech_with_alignment(
     original_text,
-    config_blob_path,
+    config,
     output_audio="tts_output.mp3",
     trimmed_audio="trimmed_tts_output.mp3"
 ):
@@ -110,29 +156,26 @@ def text_to_speech_with_alignment(
     try:
         logger.info("tts_generation_started")
 
-        preamble = "This meme is titled "
-        full_text = preamble + original_text
+        clean_text = prepare_narration_text(original_text)
+        client = get_tts_client()
 
-        full_text = expand_acronyms(full_text)
-        clean_text = clean_profanity(full_text)
+        def synthesize(timeout):
+            # The stream is consumed inside the attempt, so a connection
+            # dropped mid-audio is retried from scratch, not left truncated
+            stream = client.text_to_speech.convert(
+                text=clean_text,
+                voice_id=config.voice.voice_id,
+                model_id="eleven_multilingual_v2",
+                output_format="mp3_44100_128",
+                voice_settings=dict(config.voice.settings),
+                request_options=_request_options(timeout)
+            )
 
-        with open(config_blob_path, 'r') as f:
-            config = json.load(f)
+            with open(output_audio, "wb") as f:
+                for chunk in stream:
+                    f.write(chunk)
 
-        voice_id = config.get("voice", {}).get("voice_id")
-        voice_settings = config.get("voice", {}).get("settings", {})
-
-        stream = client.text_to_speech.convert(
-            text=clean_text,
-            voice_id=voice_id,
-            model_id="eleven_multilingual_v2",
-            output_format="mp3_44100_128",
-            voice_settings=voice_settings
-        )
-
-        with open(output_audio, "wb") as f:
-            for chunk in stream:
-                f.write(chunk)
+        call("tts", synthesize)
 
         logger.info("tts_audio_generated | file=%s", output_audio)
 
@@ -140,10 +183,15 @@ def text_to_speech_with_alignment(
         with open(output_audio, "rb") as f:
             audio_data = BytesIO(f.read())
 
-        transcription = client.forced_alignment.create(
-            file=audio_data,
-            text=clean_text
-        )
+        def align(timeout):
+            audio_data.seek(0)
+            return client.forced_alignment.create(
+                file=audio_data,
+                text=clean_text,
+                request_options=_request_options(timeout)
+            )
+
+        transcription = call("alignment", align)
 
         raw_word_timings = [
             {
@@ -192,43 +240,3 @@ def text_to_speech_with_alignment(
     except Exception:
         logger.exception("tts_pipeline_failed")
         raise
-
-# ----------------------------
-# Subtitle Utilities
-# ----------------------------
-
-def sec_to_timestamp(seconds):
-    td = timedelta(seconds=seconds)
-    total_seconds = int(td.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    secs = total_seconds % 60
-    millis = int(round((seconds - total_seconds) * 1000))
-    return f"{hours:02}:{minutes:02}:{secs:02},{millis:03}"
-
-
-def save_srt(word_timings, output_srt="output_subtitles.srt", offset_seconds=1.0):
-    try:
-        with open(output_srt, 'w', encoding='utf-8') as f:
-            count = 1
-
-            for word in word_timings:
-                text = clean_text_for_subtitles(word["text"].strip().upper())
-
-                if not text:
-                    continue
-
-                start = sec_to_timestamp(word["start"] + offset_seconds)
-                end = sec_to_timestamp(word["end"] + offset_seconds)
-
-                f.write(f"{count}\n")
-                f.write(f"{start} --> {end}\n")
-                f.write(f"{text}\n\n")
-
-                count += 1
-
-        logger.info("subtitles_written | file=%s lines=%d", output_srt, count - 1)
-
-    except Exception:
-        logger.exception("subtitle_generation_failed")
-        raise
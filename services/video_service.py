@@ -1,54 +1,210 @@
 import os
+import glob
+import json
 import random
 import subprocess
 import logging
 
-import cv2
-import numpy as np
-from PIL import Image
-
-from config import FFMPEG_PATH, FFPROBE_PATH
+from config import (
+    FFMPEG_PATH,
+    FFPROBE_PATH,
+    OVERLAY_WIDTH,
+    CAPTION_FONTS_DIR,
+    FOREGROUND_MOTION,
+    FOREGROUND_VIEW_HEIGHT,
+    FOREGROUND_ZOOM_PER_SECOND,
+    FOREGROUND_ZOOM_MAX,
+    FOREGROUND_PAN_HOLD_SECONDS,
+    FOREGROUND_BOUNCE_PIXELS,
+    FOREGROUND_BOUNCE_SECONDS,
+    ENCODE_MODE,
+    MASTER_VIDEO_BYTES_PER_SECOND,
+    COMPRESSED_VIDEO_BYTES_PER_SECOND
+)
+from utils.ffmpeg_runner import run_ffmpeg, start_ffmpeg
 
 logger = logging.getLogger(__name__)
 
-def create_video_from_image(image_path, duration, output="image_video.mp4"):
-    try:
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"{image_path} not found")
-
-        img = Image.open(image_path).convert("RGB")
-
-        img_width, img_height = img.size
-        img_array = np.array(img)
-        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-
-        resolution = (img_width, img_height)
-
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        fps = 30
-        out = cv2.VideoWriter(output, fourcc, fps, resolution)
-
-        total_frames = int(duration * fps)
-
-        for _ in range(total_frames):
-            out.write(img_bgr)
-
-        out.release()
-
-        logger.info(
-            "image_video_created | input=%s output=%s duration=%.2f",
-            image_path,
-            output,
-            duration
+STATIC_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+FOREGROUND_FPS = 30
+
+# Top margin of the foreground on the 1080x1920 canvas
+FOREGROUND_TOP = 30
+
+# Narration starts this far into the mix (audio_service's tts delay and
+# the caption offset), so word onsets are shifted by it
+NARRATION_DELAY_SECONDS = 1.0
+
+MOTION_EFFECTS = ("zoom", "pan", "bounce")
+
+
+def is_static_image(path):
+    return path.lower().endswith(STATIC_IMAGE_EXTENSIONS)
+
+
+def unknown_motion_effects(names):
+    return [name for name in names if name not in MOTION_EFFECTS]
+
+
+def foreground_input_args(path, duration):
+    """
+    ffmpeg input arguments that loop an animated foreground (GIF or
+    clip) with -stream_loop for `duration` seconds. Still images are
+    decoded once by foreground_filters and never come through here.
+    """
+    return [
+        "-stream_loop", "-1",
+        "-t", str(duration),
+        "-i", path
+    ]
+
+
+def probe_dimensions(path):
+    """
+    Displayed width and height of the first video stream (images
+    included), with rotated phone clips swapped the way ffmpeg
+    autorotates them on decode.
+    """
+    result = subprocess.run(
+        [
+            FFPROBE_PATH,
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "stream=width,height:stream_side_data=rotation",
+            "-of", "json",
+            path
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+
+    stream = json.loads(result.stdout)["streams"][0]
+    width, height = stream["width"], stream["height"]
+
+    rotation = next(
+        (data["rotation"] for data in stream.get("side_data_list", []) if "rotation" in data),
+        0
+    )
+    if abs(int(rotation)) % 180 == 90:
+        width, height = height, width
+
+    return width, height
+
+
+def _bounce_expression(word_timings):
+    """
+    0..1 lift for overlay y: a half-sine of FOREGROUND_BOUNCE_SECONDS
+    from each word onset. Onsets closer than one pulse to the previous
+    pulse are skipped, so pulses never stack.
+    """
+    pulses = []
+    last_start = None
+
+    for word in word_timings:
+        start = word["start"] + NARRATION_DELAY_SECONDS
+        if last_start is not None and start - last_start < FOREGROUND_BOUNCE_SECONDS:
+            continue
+
+        pulses.append(
+            f"between(t,{start:.3f},{start + FOREGROUND_BOUNCE_SECONDS:.3f})"
+            f"*sin(PI*(t-{start:.3f})/{FOREGROUND_BOUNCE_SECONDS})"
+        )
+        last_start = start
+
+    return "+".join(pulses) or "0"
+
+
+def foreground_motion(scaled_height, duration, word_timings=None, effects=FOREGROUND_MOTION):
+    """
+    Filters that move the foreground once it is scaled to OVERLAY_WIDTH x
+    `scaled_height`, as expressions ffmpeg evaluates per frame: no
+    frames are generated outside the encoder.
+    Returns (motion filters, overlay y).
+    """
+    unknown = unknown_motion_effects(effects)
+    if unknown:
+        raise ValueError(f"unknown_motion_effects | {unknown}")
+
+    view_height = scaled_height
+    filters = []
+
+    if "pan" in effects and scaled_height > FOREGROUND_VIEW_HEIGHT:
+        # Holds on the top while narration starts, scrolls linearly,
+        # then holds on the bottom
+        view_height = FOREGROUND_VIEW_HEIGHT
+        hold = FOREGROUND_PAN_HOLD_SECONDS
+        travel = max(0.1, duration - 2 * hold)
+        filters.append(
+            f"crop=w={OVERLAY_WIDTH}:h={view_height}:x=0:"
+            f"y='(ih-oh)*clip((t-{hold})/{travel:.3f},0,1)'"
         )
 
-        return output
-
-    except Exception:
-        logger.exception("image_video_creation_failed")
-        raise
+    if "zoom" in effects:
+        # d=1 turns every input frame into one output frame at the same
+        # size, so zoompan works on looped stills and clips alike
+        filters.append(
+            f"zoompan=z='min(1+{FOREGROUND_ZOOM_PER_SECOND}*on/{FOREGROUND_FPS},{FOREGROUND_ZOOM_MAX})':"
+            "x='iw/2-iw/zoom/2':y='ih/2-ih/zoom/2':"
+            f"d=1:s={OVERLAY_WIDTH}x{view_height}:fps={FOREGROUND_FPS}"
+        )
 
-def merge_with_background(foreground, gameplay_file, duration, output="merged_video.mp4"):
+    overlay_y = str(FOREGROUND_TOP)
+    if "bounce" in effects and word_timings:
+        overlay_y = f"'{FOREGROUND_TOP}-{FOREGROUND_BOUNCE_PIXELS}*({_bounce_expression(word_timings)})'"
+
+    return filters, overlay_y
+
+
+def foreground_filters(path, duration, word_timings=None, motion=FOREGROUND_MOTION):
+    """
+    Input arguments and filter chain that turn the foreground into a
+    scaled, optionally moving OVERLAY_WIDTH-wide stream of `duration`
+    seconds. A still is scaled once and then looped as frames, rather
+    than decoded and rescaled for every output frame.
+    Returns (input args, filters, overlay y).
+    """
+    height = -1
+    if motion:
+        width, source_height = probe_dimensions(path)
+        height = max(2, int(round(source_height * OVERLAY_WIDTH / width / 2)) * 2)
+
+    scale = [f"scale={OVERLAY_WIDTH}:{height}:flags=lanczos", "setsar=1"]
+
+    if is_static_image(path):
+        input_args = ["-framerate", str(FOREGROUND_FPS), "-i", path]
+        filters = scale + [
+            "loop=loop=-1:size=1",
+            f"fps={FOREGROUND_FPS}",
+            f"trim=duration={duration}"
+        ]
+    else:
+        input_args = foreground_input_args(path, duration)
+        filters = [f"fps={FOREGROUND_FPS}"] + scale
+
+    overlay_y = str(FOREGROUND_TOP)
+
+    if motion:
+        motion_filters, overlay_y = foreground_motion(height, duration, word_timings, motion)
+        filters += motion_filters
+
+    return input_args, filters, overlay_y
+
+
+def merge_with_background(
+    foreground,
+    gameplay_file,
+    duration,
+    output="merged_video.mp4",
+    trimmed_gameplay="trimmed_gameplay.mp4",
+    word_timings=None,
+    motion=FOREGROUND_MOTION
+):
+    """
+    Trims a random stretch of gameplay and overlays the foreground on it.
+    `motion` lists the foreground_motion effects to apply; bounce follows
+    `word_timings` (narration-relative, as returned by TTS alignment).
+    """
     try:
         logger.info(
             "gameplay_selected | file=%s duration=%.2f",
@@ -82,9 +238,7 @@ def merge_with_background(foreground, gameplay_file, duration, output="merged_vi
             gameplay_duration
         )
 
-        trimmed_gameplay = "trimmed_gameplay.mp4"
-
-        subprocess.run(
+        run_ffmpeg(
             [
                 FFMPEG_PATH,
                 "-ss", str(start_time),
@@ -100,16 +254,24 @@ def merge_with_background(foreground, gameplay_file, duration, output="merged_vi
 
         logger.info("gameplay_trim_complete | file=%s", trimmed_gameplay)
 
-        subprocess.run(
-            [
-                FFMPEG_PATH,
-                "-i", trimmed_gameplay,
-                "-i", foreground,
+        fg_input_args, fg_filters, overlay_y = foreground_filters(
+            foreground,
+            duration,
+            word_timings,
+            motion
+        )
+
+        # The foreground (image, GIF or clip) is looped, resampled,
+        # scaled and moved inside the filter graph rather than pre-rendered
+        run_ffmpeg(
+            [FFMPEG_PATH, "-i", trimmed_gameplay]
+            + fg_input_args
+            + [
                 "-filter_complex",
                 (
                     "[0:v]scale=1080:1920,setsar=1[bg];"
-                    "[1:v]scale=920:-1:flags=lanczos,setsar=1[fg];"
-                    "[bg][fg]overlay=(main_w-overlay_w)/2:30[outv]"
+                    f"[1:v]{','.join(fg_filters)}[fg];"
+                    f"[bg][fg]overlay=x=(main_w-overlay_w)/2:y={overlay_y}[outv]"
                 ),
                 "-map", "[outv]",
                 "-c:v", "libx264",
@@ -122,9 +284,10 @@ def merge_with_background(foreground, gameplay_file, duration, output="merged_vi
         )
 
         logger.info(
-            "video_overlay_complete | output=%s foreground=%s",
+            "video_overlay_complete | output=%s foreground=%s motion=%s",
             output,
-            foreground
+            foreground,
+            ",".join(motion) or "none"
         )
 
         return output
@@ -133,73 +296,344 @@ def merge_with_background(foreground, gameplay_file, duration, output="merged_vi
         logger.exception("video_merge_failed")
         raise
 
-def burn_srt_subtitles(input_video, subtitle_file, output_video):
-    try:
-        if not os.path.exists(subtitle_file) or os.path.getsize(subtitle_file) == 0:
-            logger.warning("subtitle_missing_or_empty | skipping_overlay")
-            return input_video
-
-        force_style = (
-            "FontName=Montserrat,"
-            "FontSize=12,"
-            "PrimaryColour=&H00FFFF00,"
-            "Bold=1,"
-            "Outline=2,"
-            "OutlineColour=&H00000000,"
-            "Shadow=0,"
-            "Alignment=10"
-        )
+SUBTITLE_FORCE_STYLE = (
+    "FontName=Montserrat,"
+    "FontSize=12,"
+    "PrimaryColour=&H00FFFF00,"
+    "Bold=1,"
+    "Outline=2,"
+    "OutlineColour=&H00000000,"
+    "Shadow=0,"
+    "Alignment=10"
+)
+
+# empty_moov puts the header first and every fragment is appended once,
+# so bytes already written are final and can be uploaded immediately.
+FRAGMENTED_MP4_FLAGS = "frag_keyframe+empty_moov+default_base_moof"
+
+
+def _has_subtitles(subtitle_file):
+    return os.path.exists(subtitle_file) and os.path.getsize(subtitle_file) > 0
 
-        subprocess.run(
-            [
-                FFMPEG_PATH,
-                "-i", input_video,
-                "-vf", f"subtitles='{subtitle_file}':force_style='{force_style}'",
-                "-c:a", "copy",
-                output_video
-            ],
-            check=True
-        )
+
+def subtitle_filter(subtitle_file):
+    """
+    libass filter for a caption file. ASS scripts carry their own styles;
+    SRT still gets force_style. Either way fonts come from the bundled
+    directory when it exists.
+    """
+    fontsdir = f":fontsdir='{CAPTION_FONTS_DIR}'" if os.path.isdir(CAPTION_FONTS_DIR) else ""
+
+    if subtitle_file.lower().endswith(".ass"):
+        return f"ass='{subtitle_file}'{fontsdir}"
+
+    return f"subtitles='{subtitle_file}':force_style='{SUBTITLE_FORCE_STYLE}'{fontsdir}"
+
+
+def start_fragmented_subtitle_burn(input_video, subtitle_file):
+    """
+    Starts the subtitle pass as fragmented MP4 written to stdout.
+    The caller must drain proc.stdout while ffmpeg is still encoding.
+    """
+    try:
+        command = [FFMPEG_PATH, "-i", input_video]
+
+        if _has_subtitles(subtitle_file):
+            # Output streams as it is encoded, so there is no room for a
+            # first pass: two_pass profiles fall back to capped CRF
+            command += ["-vf", subtitle_filter(subtitle_file)]
+            command += video_encode_args("master", mode="capped")
+            command += ["-c:a", "copy"]
+        else:
+            logger.warning("subtitle_missing_or_empty | remuxing_only")
+            command += ["-c", "copy"]
+
+        command += [
+            "-f", "mp4",
+            "-movflags", FRAGMENTED_MP4_FLAGS,
+            "pipe:1"
+        ]
+
+        proc = start_ffmpeg(command, stdout=subprocess.PIPE)
 
         logger.info(
-            "subtitle_burn_complete | input=%s output=%s",
+            "subtitle_burn_stream_started | input=%s pid=%d",
             input_video,
-            output_video
+            proc.pid
         )
 
-        return output_video
+        return proc
 
     except Exception:
-        logger.exception("subtitle_burn_failed")
+        logger.exception("subtitle_burn_stream_failed")
         raise
 
-def compress_short(input_file, output_file="compressed_short.mp4", crf=26):
+# Uniform parameters for cached segments. Every segment, intro and outro
+# must match exactly so compilations can be joined with a stream copy.
+SEGMENT_ENCODE_ARGS = [
+    "-c:v", "libx264",
+    "-preset", "fast",
+    "-crf", "20",
+    "-pix_fmt", "yuv420p",
+    "-r", "30",
+    "-g", "60",
+    "-video_track_timescale", "15360",
+    "-c:a", "aac",
+    "-ar", "44100",
+    "-ac", "2",
+    "-b:a", "128k"
+]
+
+# Size-targeted video encoding, chosen per rendition. Each profile has
+# a video bytes-per-second budget:
+# - "capped": CRF under a VBV cap (maxrate/bufsize). Mostly static
+#   meme-over-gameplay content stays well under the budget, and only
+#   busy scenes are held to it.
+# - "two_pass": a fast analysis pass, then an average-bitrate pass that
+#   lands on the budget.
+ENCODE_PROFILES = {
+    "master": {
+        "bytes_per_second": MASTER_VIDEO_BYTES_PER_SECOND,
+        "crf": 23,
+        "preset": "medium",
+        "mode": ENCODE_MODE
+    },
+    "compressed": {
+        "bytes_per_second": COMPRESSED_VIDEO_BYTES_PER_SECOND,
+        "crf": 26,
+        "preset": "veryfast",
+        "mode": ENCODE_MODE
+    }
+}
+
+ENCODE_MODES = ("capped", "two_pass")
+
+
+def video_encode_args(profile_name, mode=None, pass_number=None, passlog=None):
+    """
+    libx264 arguments for an encode profile. Two-pass encodes call this
+    once per pass with the same `passlog` prefix.
+    """
+    profile = ENCODE_PROFILES[profile_name]
+    mode = mode or profile["mode"]
+    if mode not in ENCODE_MODES:
+        raise ValueError(f"unknown_encode_mode | profile={profile_name} mode={mode}")
+
+    kbps = profile["bytes_per_second"] * 8 // 1000
+    args = [
+        "-c:v", "libx264",
+        "-preset", profile["preset"],
+        "-pix_fmt", "yuv420p"
+    ]
+
+    if mode == "capped":
+        # A one-second buffer: Shorts are too short for a larger one to
+        # average out, and the budget would be overshot
+        return args + [
+            "-crf", str(profile["crf"]),
+            "-maxrate", f"{kbps}k",
+            "-bufsize", f"{kbps}k"
+        ]
+
+    return args + [
+        "-b:v", f"{kbps}k",
+        "-maxrate", f"{kbps * 3 // 2}k",
+        "-bufsize", f"{2 * kbps}k",
+        "-pass", str(pass_number),
+        "-passlogfile", passlog
+    ]
+
+
+def media_duration(path):
+    result = subprocess.run(
+        [
+            FFPROBE_PATH,
+            "-i", path,
+            "-show_entries", "format=duration",
+            "-v", "quiet",
+            "-of", "csv=p=0"
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        check=True
+    )
+    return float(result.stdout.decode().strip())
+
+
+def encode_report(path, profile_name, rendition):
+    """
+    Logs the size and bitrate an encode achieved against its profile's
+    budget. Returns the same figures.
+    """
+    profile = ENCODE_PROFILES[profile_name]
+    size = os.path.getsize(path)
+    seconds = media_duration(path)
+    bytes_per_second = size / seconds if seconds > 0 else 0.0
+
+    report = {
+        "rendition": rendition,
+        "profile": profile_name,
+        "mode": profile["mode"],
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        "kbps": round(bytes_per_second * 8 / 1000, 1),
+        "bytes_per_second": int(bytes_per_second),
+        "budget_bytes_per_second": profile["bytes_per_second"]
+    }
+
+    logger.info(
+        "encode_profile_result | rendition=%s profile=%s mode=%s bytes=%d seconds=%.2f "
+        "kbps=%.0f bytes_per_second=%d budget_bytes_per_second=%d",
+        rendition,
+        profile_name,
+        report["mode"],
+        size,
+        seconds,
+        report["kbps"],
+        report["bytes_per_second"],
+        report["budget_bytes_per_second"]
+    )
+
+    return report
+
+
+# Output renditions produced from the single final decode.
+# "filter" is applied to that rendition's branch of the split;
+# "profile" names its ENCODE_PROFILES entry, whose video arguments come
+# before "args".
+RENDITIONS = {
+    "master": {
+        "ext": "mp4",
+        "filter": None,
+        "profile": "master",
+        "args": ["-c:a", "copy"],
+        "audio": True
+    },
+    "compressed": {
+        "ext": "mp4",
+        "filter": "scale=720:-2",
+        "profile": "compressed",
+        "args": [
+            "-c:a", "aac",
+            "-b:a", "128k",
+            "-movflags", "+faststart"
+        ],
+        "audio": True
+    },
+    "segment": {
+        "ext": "mp4",
+        "filter": "scale=1080:1920,setsar=1",
+        "args": SEGMENT_ENCODE_ARGS,
+        "audio": True
+    },
+    "preview": {
+        "ext": "jpg",
+        "filter": "fps=1/3,scale=216:-2,tile=6x1",
+        "args": ["-frames:v", "1", "-update", "1", "-q:v", "4"],
+        "audio": False
+    }
+}
+
+
+def unknown_renditions(names):
+    return [name for name in names if name not in RENDITIONS]
+
+
+def _rendition_command(input_video, base, names, outputs, passlogs, first_pass=False):
+    """
+    One decode, split into `names`. A first pass encodes only to
+    analyse: its outputs are discarded and it leaves the pass logs.
+    """
+    split_labels = "".join(f"[s{i}]" for i in range(len(names)))
+    graph = [f"[0:v]{base},split={len(names)}{split_labels}"]
+    output_args = []
+
+    for i, name in enumerate(names):
+        spec = RENDITIONS[name]
+        label = f"[{name}]"
+        graph.append(f"[s{i}]{spec['filter'] or 'null'}{label}")
+
+        output_args += ["-map", label]
+
+        if spec.get("profile"):
+            output_args += video_encode_args(
+                spec["profile"],
+                pass_number=(1 if first_pass else 2) if name in passlogs else None,
+                passlog=passlogs.get(name)
+            )
+
+        if first_pass:
+            output_args += ["-an", "-f", "null", os.devnull]
+            continue
+
+        if spec["audio"]:
+            output_args += ["-map", "0:a?"]
+        output_args += spec["args"] + [outputs[name]]
+
+    return [FFMPEG_PATH, "-i", input_video, "-filter_complex", ";".join(graph)] + output_args
+
+
+def render_renditions(input_video, subtitle_file, outputs):
+    """
+    Burns subtitles once and encodes every requested rendition from the
+    same decode via a split filter, each video rendition under its
+    encode profile. Two-pass profiles get a first analysis pass over
+    the same graph.
+    `outputs` maps rendition name -> output path; returns the same map.
+    """
+    passlogs = {}
+
     try:
-        subprocess.run(
-            [
-                FFMPEG_PATH,
-                "-i", input_file,
-                "-vf", "scale=720:-2",
-                "-c:v", "libx264",
-                "-preset", "veryfast",
-                "-crf", str(crf),
-                "-c:a", "aac",
-                "-b:a", "128k",
-                "-movflags", "+faststart",
-                output_file
-            ],
-            check=True
-        )
+        names = list(outputs)
+        unknown = unknown_renditions(names)
+        if unknown:
+            raise ValueError(f"unknown_renditions | {unknown}")
+
+        base = "null"
+        if _has_subtitles(subtitle_file):
+            base = subtitle_filter(subtitle_file)
+        else:
+            logger.warning("subtitle_missing_or_empty | skipping_overlay")
+
+        passlogs = {
+            name: f"{outputs[name]}.pass"
+            for name in names
+            if RENDITIONS[name].get("profile")
+            and ENCODE_PROFILES[RENDITIONS[name]["profile"]]["mode"] == "two_pass"
+        }
+
+        if passlogs:
+            run_ffmpeg(
+                _rendition_command(input_video, base, list(passlogs), outputs, passlogs, first_pass=True),
+                check=True
+            )
+
+        run_ffmpeg(_rendition_command(input_video, base, names, outputs, passlogs), check=True)
 
         logger.info(
-            "video_compression_complete | input=%s output=%s crf=%d",
-            input_file,
-            output_file,
-            crf
+            "renditions_complete | input=%s renditions=%s",
+            input_video,
+            ",".join(names)
         )
 
-        return output_file
+        for name in names:
+            if not RENDITIONS[name].get("profile"):
+                continue
+
+            # Diagnostics only: a failed probe must not fail an encode
+            # that already succeeded
+            try:
+                encode_report(outputs[name], RENDITIONS[name]["profile"], name)
+            except Exception as e:
+                logger.warning("encode_report_failed | rendition=%s error=%s", name, e)
+
+        return outputs
 
     except Exception:
-        logger.exception("video_compression_failed")
+        logger.exception("rendition_render_failed")
         raise
+
+    finally:
+        for prefix in passlogs.values():
+            for path in glob.glob(f"{glob.escape(prefix)}-*"):
+                os.remove(path)
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import uuid
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from config import WORKER_PREFIX, WORKER_CLAIM_TIMEOUT_SECONDS
+from services.storage_service import (
+    delete_from_gcs,
+    list_blob_info,
+    read_json_from_gcs,
+    write_json_to_gcs,
+    read_json_with_generation,
+    write_json_if_generation
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class JobRequest:
+    job_id: str
+    request: dict
+    # When the request was queued (UTC), for queue-latency metrics
+    enqueued_at: datetime
+    # Identifies this worker's claim, so a claim taken over after it
+    # expired is not refreshed or finished by the worker that lost it
+    claim_id: str = ""
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _job_id(name):
+    return os.path.basename(name)[:-len(".json")]
+
+
+class BucketRequestQueue:
+    """
+    Job requests as JSON blobs under `prefix`requests/. A worker claims
+    one by creating claims/<id>.json with a create-only generation
+    check, rewrites the claim as a heartbeat while the job runs, and on
+    completion writes done/ or failed/<id>.json and deletes the request
+    and the claim.
+    """
+
+    def __init__(self, prefix=WORKER_PREFIX, claim_timeout=WORKER_CLAIM_TIMEOUT_SECONDS):
+        self.requests_prefix = f"{prefix}requests/"
+        self.claims_prefix = f"{prefix}claims/"
+        self.done_prefix = f"{prefix}done/"
+        self.failed_prefix = f"{prefix}failed/"
+        self.status_prefix = f"{prefix}status/"
+        self.claim_timeout = claim_timeout
+
+    def claim(self, worker_id):
+        requests = sorted(
+            (info for info in list_blob_info(self.requests_prefix) if info["name"].endswith(".json")),
+            key=lambda info: info["name"]
+        )
+        if not requests:
+            return None
+
+        claims = {
+            _job_id(info["name"]): info["time_created"]
+            for info in list_blob_info(self.claims_prefix)
+        }
+
+        for info in requests:
+            job_id = _job_id(info["name"])
+            claim_blob = f"{self.claims_prefix}{job_id}.json"
+            generation = 0
+
+            if job_id in claims:
+                if (_now() - claims[job_id]).total_seconds() < self.claim_timeout:
+                    continue
+
+                # The holder died mid-job; take the claim over at its
+                # current generation so only one worker succeeds
+                _, generation = read_json_with_generation(claim_blob)
+                logger.warning("worker_claim_expired | job_id=%s", job_id)
+
+            claim_id = uuid.uuid4().hex
+            claim = {"worker": worker_id, "claim_id": claim_id, "claimed_at": _now().isoformat()}
+            if not write_json_if_generation(claim_blob, claim, generation):
+                continue
+
+            request = read_json_from_gcs(info["name"])
+            if request is None:
+                # Finished by another worker between listing and claiming
+                delete_from_gcs(claim_blob)
+                continue
+
+            return JobRequest(job_id, request, info["time_created"], claim_id)
+
+        return None
+
+    def _owned_claim(self, job):
+        claim, generation = read_json_with_generation(f"{self.claims_prefix}{job.job_id}.json")
+        if claim is None or claim.get("claim_id") != job.claim_id:
+            return None, 0
+        return claim, generation
+
+    def heartbeat(self, job):
+        """
+        Rewrites the claim (renewing its creation time) at the generation
+        just read. Returns False once the claim belongs to another worker.
+        """
+        claim, generation = self._owned_claim(job)
+        if claim is None:
+            return False
+
+        claim["heartbeat_at"] = _now().isoformat()
+        return write_json_if_generation(f"{self.claims_prefix}{job.job_id}.json", claim, generation)
+
+    def finish(self, job, result):
+        """
+        Records the result, unless the claim expired and another worker
+        took the job over; that worker records it instead.
+        """
+        if self._owned_claim(job)[0] is None:
+            logger.warning("worker_claim_lost | job_id=%s", job.job_id)
+            return False
+
+        prefix = self.done_prefix if result["ok"] else self.failed_prefix
+        write_json_to_gcs(f"{prefix}{job.job_id}.json", {"request": job.request, **result})
+        delete_from_gcs(f"{self.requests_prefix}{job.job_id}.json")
+        delete_from_gcs(f"{self.claims_prefix}{job.job_id}.json")
+        return True
+
+    def publish_status(self, worker_id, status):
+        write_json_to_gcs(f"{self.status_prefix}{worker_id}.json", status)
+
+
+class DirectoryRequestQueue:
+    """
+    The same queue in a local directory, for tests and replay runs.
+    Claiming is an atomic rename into claims/<id>.<claim id>.json, and a
+    claim's mtime is its last heartbeat.
+    """
+
+    def __init__(self, root, claim_timeout=WORKER_CLAIM_TIMEOUT_SECONDS):
+        self.root = root
+        self.claims_dir = os.path.join(root, "claims")
+        self.done_dir = os.path.join(root, "done")
+        self.failed_dir = os.path.join(root, "failed")
+        self.status_dir = os.path.join(root, "status")
+        self.claim_timeout = claim_timeout
+
+        for path in (self.claims_dir, self.done_dir, self.failed_dir, self.status_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def _claim_path(self, job):
+        return os.path.join(self.claims_dir, f"{job.job_id}.{job.claim_id}.json")
+
+    def _requeue_expired(self):
+        for name in os.listdir(self.claims_dir):
+            path = os.path.join(self.claims_dir, name)
+            job_id = _job_id(name).rsplit(".", 1)[0]
+            try:
+                if time.time() - os.path.getmtime(path) >= self.claim_timeout:
+                    os.replace(path, os.path.join(self.root, f"{job_id}.json"))
+                    logger.warning("worker_claim_expired | job_id=%s", job_id)
+            except FileNotFoundError:
+                continue
+
+    def claim(self, worker_id):
+        self._requeue_expired()
+
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith(".json"):
+                continue
+
+            claim_id = uuid.uuid4().hex
+            source = os.path.join(self.root, name)
+            target = os.path.join(self.claims_dir, f"{_job_id(name)}.{claim_id}.json")
+
+            try:
+                enqueued_at = datetime.fromtimestamp(os.path.getmtime(source), tz=timezone.utc)
+                os.rename(source, target)
+            except FileNotFoundError:
+                # Claimed by another worker first
+                continue
+
+            os.utime(target)
+
+            try:
+                with open(target, "r", encoding="utf-8") as f:
+                    request = json.load(f)
+            except ValueError:
+                # Unreadable requests are failed by the worker, not retried
+                request = None
+
+            return JobRequest(_job_id(name), request, enqueued_at, claim_id)
+
+        return None
+
+    def _write(self, path, data):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+    def heartbeat(self, job):
+        try:
+            os.utime(self._claim_path(job))
+        except FileNotFoundError:
+            # Requeued after expiring
+            return False
+        return True
+
+    def finish(self, job, result):
+        # Removing the claim first is the ownership check: once it is
+        # gone it can no longer be requeued to another worker
+        try:
+            os.remove(self._claim_path(job))
+        except FileNotFoundError:
+            logger.warning("worker_claim_lost | job_id=%s", job.job_id)
+            return False
+
+        directory = self.done_dir if result["ok"] else self.failed_dir
+        self._write(os.path.join(directory, f"{job.job_id}.json"), {"request": job.request, **result})
+        return True
+
+    def publish_status(self, worker_id, status):
+        self._write(os.path.join(self.status_dir, f"{worker_id}.json"), status)
+
+
+def request_queue(queue_dir=None):
+    if queue_dir:
+        return DirectoryRequestQueue(queue_dir)
+    return BucketRequestQueue()
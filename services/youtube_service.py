@@ -5,156 +5,501 @@ import random
 import pickle
 import gc
 import logging
-
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+import json
+import threading
+from datetime import datetime, timedelta
+
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaUpload
 from google.auth.transport.requests import Request
-
-from config import PREDEFINED_TAGS, TOKEN_FILE
+from google.oauth2.credentials import Credentials
+
+from config import (
+    PREDEFINED_TAGS,
+    TOKEN_FILE,
+    TOKEN_JSON_BLOB,
+    TOKEN_REFRESH_MARGIN_SECONDS,
+    DISCOVERY_DOC_BLOB,
+    DISCOVERY_DOC_FILE,
+    YOUTUBE_PROJECT_ID
+)
+from services.storage_service import download_from_gcs, read_json_from_gcs, write_json_to_gcs
+from services.quota_service import QuotaExhaustedError, mark_quota_exhausted
 from utils.logging_utils import log_post, log_post_time, log_error, cleanup_files
+from utils.network import backoff_delay, retry_budget
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+STREAM_READ_SIZE = 256 * 1024
+
+# Error reasons after which retrying the upload only burns more quota
+QUOTA_ERROR_REASONS = ("quotaExceeded", "dailyLimitExceeded", "uploadLimitExceeded")
+
+# Built once per process per credential blob and reused across uploads
+_youtube_clients = {}
+_youtube_client_lock = threading.Lock()
+
+# Set by the replay harness; bypasses credential loading entirely
+_client_factory = None
+
+
+class UploadNotAttemptedError(RuntimeError):
+    """
+    Raised when an upload failed before any videos.insert was sent
+    (missing or invalid credentials), so no quota was spent on it.
+    """
+
+
+class GrowingFileUpload(MediaUpload):
+    """
+    Resumable upload source for a file an encoder is still appending to.
+    Total size stays unknown until the writer finishes, so each chunk is
+    sent as soon as it exists and the session closes on the last chunk.
+
+    A chunk sent while the size is unknown never ends at the current end
+    of file: if the writer then stopped exactly on a chunk boundary, the
+    closing request would carry no bytes and an invalid Content-Range.
+    size() is read before each chunk, so it waits for the same condition.
+    """
+
+    def __init__(self, path, writer, chunksize=UPLOAD_CHUNK_SIZE, poll_interval=0.2):
+        self._path = path
+        self._writer = writer
+        self._chunksize = chunksize
+        self._poll_interval = poll_interval
+        # End of the last chunk handed out; the next one starts at or before it
+        self._sent = 0
+
+    def _wait_beyond(self, offset):
+        """
+        Waits until the file extends past `offset` or the writer is done.
+        """
+        while not self._writer.done.is_set():
+            if os.path.getsize(self._path) > offset:
+                break
+            self._writer.done.wait(self._poll_interval)
+
+        if self._writer.error:
+            raise RuntimeError(f"stream_encoder_failed | {self._writer.error}")
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return "video/mp4"
+
+    def size(self):
+        self._wait_beyond(self._sent + self._chunksize)
+        if self._writer.done.is_set():
+            return os.path.getsize(self._path)
+        return None
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    def getbytes(self, begin, length):
+        self._wait_beyond(begin + length)
+
+        with open(self._path, "rb") as f:
+            f.seek(begin)
+            data = f.read(length)
+
+        self._sent = begin + len(data)
+        return data
+
+
+class EncoderTee:
+    """
+    Copies an encoder's stdout into a local file on a background thread.
+    """
+
+    def __init__(self, proc, path):
+        self.proc = proc
+        self.path = path
+        self.done = threading.Event()
+        self.error = None
+
+        # Create the file before the uploader polls its size
+        open(path, "wb").close()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            with open(self.path, "ab") as out:
+                while True:
+                    block = self.proc.stdout.read(STREAM_READ_SIZE)
+                    if not block:
+                        break
+                    out.write(block)
+                    out.flush()
+
+            returncode = self.proc.wait()
+            if returncode != 0:
+                # Set by the ffmpeg watchdog when it killed the encoder
+                monitor = getattr(self.proc, "monitor", None)
+                self.error = (monitor and monitor.failure) or f"returncode={returncode}"
+
+        except Exception as e:
+            self.error = str(e)
+            self.proc.kill()
+
+        finally:
+            self.done.set()
+
+    def join(self):
+        self._thread.join()
+        if self.error:
+            raise RuntimeError(f"stream_encoder_failed | {self.error}")
+        return self.path
+
 def sanitize_title(title: str) -> str:
     clean = title.replace("<", "").replace(">", "")
     clean = re.sub(r"\s+", " ", clean).strip()
     return clean
 
-def get_youtube_client():
-    try:
-        creds = None
-
-        if os.path.exists(TOKEN_FILE):
-            with open(TOKEN_FILE, "rb") as token:
-                creds = pickle.load(token)
-
-        if creds and creds.expired and creds.refresh_token:
-            logger.info("youtube_token_refresh_started")
-            creds.refresh(Request())
-            with open(TOKEN_FILE, "wb") as token:
-                pickle.dump(creds, token)
-            logger.info("youtube_token_refresh_complete")
+def _load_discovery_document():
+    """
+    Returns the YouTube v3 discovery document without a network fetch.
+    Prefers the copy bundled with google-api-python-client, then a local
+    cached copy, then the copy kept in the bucket.
+    """
+    doc = discovery_cache.get_static_doc("youtube", "v3")
+    if doc:
+        return doc
+
+    if not os.path.exists(DISCOVERY_DOC_FILE):
+        download_from_gcs(DISCOVERY_DOC_BLOB, DISCOVERY_DOC_FILE)
+
+    with open(DISCOVERY_DOC_FILE, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _load_credentials(token_blob=TOKEN_JSON_BLOB):
+    """
+    Loads credentials from a JSON cache in the bucket.
+    The default channel falls back to the legacy pickle once and
+    migrates it to JSON.
+    """
+    info = read_json_from_gcs(token_blob)
+    if info:
+        return Credentials.from_authorized_user_info(info)
+
+    if token_blob != TOKEN_JSON_BLOB or not os.path.exists(TOKEN_FILE):
+        return None
+
+    logger.info("youtube_token_migrating_from_pickle")
+    with open(TOKEN_FILE, "rb") as token:
+        creds = pickle.load(token)
+
+    write_json_to_gcs(TOKEN_JSON_BLOB, json.loads(creds.to_json()))
+    return creds
+
+
+def _needs_refresh(creds):
+    if not creds.expiry:
+        return not creds.valid
+
+    margin = timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS)
+    return creds.expiry - margin <= datetime.utcnow()
+
+
+def get_youtube_client(token_blob=TOKEN_JSON_BLOB):
+    """
+    Returns the YouTube client for the channel whose credentials live in
+    `token_blob`, reused for every upload to it in this process.
+    Credentials are refreshed ahead of expiry and written back to the
+    JSON cache so the next cold start does not have to refresh.
+    """
+    if _client_factory is not None:
+        with _youtube_client_lock:
+            if token_blob not in _youtube_clients:
+                _youtube_clients[token_blob] = (_client_factory(token_blob), None)
+            return _youtube_clients[token_blob][0]
 
-        if not creds or not creds.valid:
-            raise RuntimeError("youtube_auth_invalid_or_missing")
+    try:
+        with _youtube_client_lock:
+            client, creds = _youtube_clients.get(token_blob, (None, None))
+            creds = creds or _load_credentials(token_blob)
+
+            if not creds:
+                raise RuntimeError(f"youtube_auth_invalid_or_missing | token_blob={token_blob}")
+
+            if _needs_refresh(creds) and creds.refresh_token:
+                logger.info("youtube_token_refresh_started | token_blob=%s", token_blob)
+                creds.refresh(Request())
+                write_json_to_gcs(token_blob, json.loads(creds.to_json()))
+                logger.info("youtube_token_refresh_complete | token_blob=%s", token_blob)
+
+            if not creds.valid:
+                raise RuntimeError(f"youtube_auth_invalid_or_missing | token_blob={token_blob}")
+
+            if client is None:
+                client = build_from_document(
+                    _load_discovery_document(),
+                    credentials=creds
+                )
+                _youtube_clients[token_blob] = (client, creds)
+                logger.info("youtube_client_initialized | token_blob=%s", token_blob)
 
-        logger.info("youtube_client_initialized")
-        return build("youtube", "v3", credentials=creds)
+            return client
 
     except Exception:
-        logger.exception("youtube_client_init_failed")
+        logger.exception("youtube_client_init_failed | token_blob=%s", token_blob)
         raise
 
-def upload_video(
-    counter,
-    subreddit_name,
-    video_file,
-    title,
-    description,
-    scheduled_time=None,
-    max_retries=3
-):
-    try:
-        tags = PREDEFINED_TAGS
 
-        formatted_title = sanitize_title(title)
-        counter = random.randint(100, 1000)
+def set_youtube_client_factory(factory):
+    """
+    Builds channel clients with factory(token_blob) instead of stored
+    credentials, e.g. clients pointed at a local upload endpoint.
+    """
+    global _client_factory
+
+    with _youtube_client_lock:
+        _client_factory = factory
+        _youtube_clients.clear()
+
+
+def build_video_body(title, description, scheduled_time=None, tags=PREDEFINED_TAGS):
+    """
+    videos.insert body: sanitised title (long titles move into the
+    description), hashtags, and a private publishAt when scheduled.
+    """
+    formatted_title = sanitize_title(title)
+
+    if len(title) > 100:
+        formatted_title = f"Wholesome Meme {random.randint(100, 1000)}"
+        description = f"{title}\n{description}"
+
+    hashtag_string = " ".join([f"#{t}" for t in tags])
+    description = (
+        f"{description}\n"
+        f"{hashtag_string}\n"
+        "This is just a parody."
+    )
+
+    body = {
+        "snippet": {
+            "title": formatted_title,
+            "description": description,
+            "tags": list(tags),
+            "categoryId": "22"
+        },
+        "status": {
+            "privacyStatus": "private" if scheduled_time else "public",
+            "selfDeclaredMadeForKids": False
+        }
+    }
 
-        if len(title) > 100:
-            formatted_title = f"Wholesome Meme {counter}"
-            description = f"{title}\n{description}"
+    if scheduled_time:
+        iso_time = scheduled_time.isoformat("T") + "Z"
+        body["status"]["publishAt"] = iso_time
 
-        hashtag_string = " ".join([f"#{t}" for t in tags])
-        description = (
-            f"{description}\n"
-            f"{hashtag_string}\n"
-            "This is just a parody."
-        )
+    return body
 
-        youtube = get_youtube_client()
-
-        body = {
-            "snippet": {
-                "title": formatted_title,
-                "description": description,
-                "tags": tags,
-                "categoryId": "22"
-            },
-            "status": {
-                "privacyStatus": "private" if scheduled_time else "public",
-                "selfDeclaredMadeForKids": False
-            }
-        }
 
-        if scheduled_time:
-            iso_time = scheduled_time.isoformat("T") + "Z"
-            body["status"]["publishAt"] = iso_time
+def _is_quota_error(error):
+    if not isinstance(error, HttpError) or error.resp.status not in (403, 429):
+        return False
+
+    content = error.content
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", "replace")
+
+    return any(reason in (content or "") for reason in QUOTA_ERROR_REASONS)
 
-        media = MediaFileUpload(
-            video_file,
-            chunksize=1024 * 1024,
-            resumable=True
-        )
 
-        request = youtube.videos().insert(
+def run_resumable_upload(
+    request,
+    video_file,
+    max_retries=3,
+    on_attempt_error=None,
+    label="default",
+    project=YOUTUBE_PROJECT_ID
+):
+    """
+    Drives a resumable videos.insert to completion. A failed attempt
+    resumes the same session after a jittered backoff instead of
+    starting over, while the shared upload retry budget allows.
+    Returns the video id; raises after max_retries failed attempts, or
+    QuotaExhaustedError at once when the API refuses for quota.
+    """
+    attempt = 0
+    retries = retry_budget("youtube_upload")
+    retries.earn()
+
+    while attempt < max_retries:
+        try:
+            logger.info(
+                "youtube_upload_attempt | channel=%s attempt=%d file=%s",
+                label,
+                attempt + 1,
+                video_file
+            )
+
+            response = None
+
+            while response is None:
+                status, response = request.next_chunk()
+                if status:
+                    progress = int(status.progress() * 100)
+                    logger.info(
+                        "youtube_upload_progress | channel=%s progress=%d%%",
+                        label,
+                        progress
+                    )
+
+            video_id = response["id"]
+
+            logger.info(
+                "youtube_upload_success | channel=%s video_id=%s",
+                label,
+                video_id
+            )
+
+            return video_id
+
+        except Exception as e:
+            logger.exception(
+                "youtube_upload_attempt_failed | channel=%s attempt=%d",
+                label,
+                attempt + 1
+            )
+
+            if on_attempt_error:
+                on_attempt_error(e)
+
+            if _is_quota_error(e):
+                mark_quota_exhausted(project)
+                raise QuotaExhaustedError(
+                    f"youtube_quota_exhausted | project={project} channel={label}"
+                ) from e
+
+            attempt += 1
+            if attempt >= max_retries:
+                break
+
+            if not retries.spend():
+                logger.error("youtube_upload_retry_budget_exhausted | channel=%s", label)
+                break
+
+            time.sleep(backoff_delay("youtube_upload", attempt))
+
+    logger.error("youtube_upload_failed_max_retries | channel=%s", label)
+    raise RuntimeError("youtube_upload_failed_after_retries")
+
+
+def insert_request(body, media, token_blob=TOKEN_JSON_BLOB):
+    """
+    Builds the videos.insert request for `body` and `media`. Nothing is
+    sent yet, so a failure here raises UploadNotAttemptedError.
+    """
+    try:
+        return get_youtube_client(token_blob).videos().insert(
             part="snippet,status",
             body=body,
             media_body=media
         )
+    except Exception as e:
+        raise UploadNotAttemptedError(str(e)) from e
 
-        attempt = 0
-
-        while attempt < max_retries:
-            try:
-                logger.info(
-                    "youtube_upload_attempt | attempt=%d file=%s",
-                    attempt + 1,
-                    video_file
-                )
-
-                response = None
 
-                while response is None:
-                    status, response = request.next_chunk()
-                    if status:
-                        progress = int(status.progress() * 100)
-                        logger.info(
-                            "youtube_upload_progress | progress=%d%%",
-                            progress
-                        )
+def upload_video(
+    counter,
+    subreddit_name,
+    video_file,
+    title,
+    description,
+    scheduled_time=None,
+    max_retries=3,
+    media_body=None,
+    record_post=True
+):
+    """
+    Uploads a rendered file to the default channel. With record_post
+    False the post is not written to the post log again (the render
+    job that queued it already did); only its publish time is.
+    """
+    try:
+        media = media_body or MediaFileUpload(
+            video_file,
+            chunksize=UPLOAD_CHUNK_SIZE,
+            resumable=True
+        )
 
-                video_id = response["id"]
+        request = insert_request(build_video_body(title, description, scheduled_time), media)
 
-                logger.info(
-                    "youtube_upload_success | video_id=%s",
-                    video_id
-                )
+        try:
+            video_id = run_resumable_upload(
+                request,
+                video_file,
+                max_retries=max_retries,
+                on_attempt_error=lambda e: log_error(subreddit_name, title, str(e))
+            )
 
+        except RuntimeError:
+            if record_post:
                 log_post(subreddit_name, title)
-                log_post_time(subreddit_name, title)
+            cleanup_files()
+            gc.collect()
+            raise
 
-                cleanup_files()
-                return video_id
-
-            except Exception as e:
-                logger.exception(
-                    "youtube_upload_attempt_failed | attempt=%d",
-                    attempt + 1
-                )
+        if record_post:
+            log_post(subreddit_name, title)
+        log_post_time(subreddit_name, title)
 
-                log_error(subreddit_name, title, str(e))
-
-                attempt += 1
-                time.sleep(10)
+        cleanup_files()
+        return video_id
 
-        logger.error("youtube_upload_failed_max_retries")
+    except Exception:
+        logger.exception("youtube_upload_fatal_error")
+        raise
 
-        log_post(subreddit_name, title)
-        cleanup_files()
-        gc.collect()
+def upload_video_streaming(
+    subreddit_name,
+    encoder,
+    output_video,
+    title,
+    description,
+    scheduled_time=None,
+    max_retries=3
+):
+    """
+    Uploads the final render while it is still being encoded.
+    `encoder` is a Popen writing fragmented MP4 to its stdout.
+    """
+    tee = EncoderTee(encoder, output_video)
+
+    logger.info(
+        "youtube_stream_upload_started | file=%s pid=%d",
+        output_video,
+        encoder.pid
+    )
 
-        raise RuntimeError("youtube_upload_failed_after_retries")
+    try:
+        video_id = upload_video(
+            0,
+            subreddit_name,
+            output_video,
+            title,
+            description,
+            scheduled_time=scheduled_time,
+            max_retries=max_retries,
+            media_body=GrowingFileUpload(output_video, tee)
+        )
 
     except Exception:
-        logger.exception("youtube_upload_fatal_error")
+        if encoder.poll() is None:
+            encoder.kill()
         raise
+
+    tee.join()
+    return video_id
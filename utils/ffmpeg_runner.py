@@ -0,0 +1,580 @@
+import os
+import time
+import logging
+import threading
+import subprocess
+
+from config import (
+    FFPROBE_PATH,
+    FFMPEG_MAX_CONCURRENT,
+    FFMPEG_MIN_THREADS_PER_JOB,
+    FFMPEG_STALL_TIMEOUT_SECONDS,
+    FFMPEG_DEADLINE_BASE_SECONDS,
+    FFMPEG_DEADLINE_PER_MEDIA_SECOND,
+    FFMPEG_DEFAULT_TIMEOUT_SECONDS,
+    FFMPEG_PROGRESS_LOG_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+VIDEO_CODEC_FLAGS = ("-c:v", "-vcodec")
+WATCHDOG_INTERVAL_SECONDS = 1.0
+
+# Receives one resource-usage record per finished ffmpeg child while
+# set (see utils.profiling)
+_usage_sink = None
+
+
+class FFmpegTimeoutError(RuntimeError):
+    """
+    Raised when an ffmpeg process is killed for stalling or for running
+    past its deadline.
+    """
+
+
+def _read_first_line(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.readline().strip()
+
+
+def available_cpus():
+    """
+    CPUs this process may actually use: the cgroup CPU quota when one is
+    set (Cloud Run), otherwise the scheduler affinity mask.
+    ffmpeg and libx264 only see the host core count, which is why they
+    oversubscribe a quota-limited container.
+    """
+    host_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+
+    try:
+        quota, period = _read_first_line(CGROUP_V2_CPU_MAX).split()
+        if quota != "max":
+            return min(host_cpus, max(1.0, int(quota) / int(period)))
+        return float(host_cpus)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        quota = int(_read_first_line(CGROUP_V1_QUOTA))
+        period = int(_read_first_line(CGROUP_V1_PERIOD))
+        if quota > 0:
+            return min(host_cpus, max(1.0, quota / period))
+    except (OSError, ValueError):
+        pass
+
+    return float(host_cpus or 1)
+
+
+# ----------------------------------------
+# Progress Monitoring
+# ----------------------------------------
+
+def _parse_seconds(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_duration(path):
+    """
+    Container duration in seconds, or None when ffprobe cannot tell.
+    """
+    try:
+        result = subprocess.run(
+            [
+                FFPROBE_PATH,
+                "-v", "error",
+                "-show_entries", "format=duration",
+                "-of", "default=noprint_wrappers=1:nokey=1",
+                path
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=30
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+    return _parse_seconds(result.stdout.strip())
+
+
+def expected_media_duration(command):
+    """
+    Output duration of an ffmpeg command: the first -t, otherwise the
+    duration of the first file input.
+    """
+    args = command[1:]
+    for previous, arg in zip([None] + args[:-1], args):
+        if previous == "-t":
+            return _parse_seconds(arg)
+
+    for previous, arg in zip([None] + args[:-1], args):
+        if previous == "-i" and os.path.isfile(arg):
+            return probe_duration(arg)
+
+    return None
+
+
+def deadline_for(duration):
+    if duration is None:
+        return FFMPEG_DEFAULT_TIMEOUT_SECONDS
+    return FFMPEG_DEADLINE_BASE_SECONDS + duration * FFMPEG_DEADLINE_PER_MEDIA_SECOND
+
+
+def set_child_usage_sink(sink):
+    global _usage_sink
+    _usage_sink = sink
+
+
+class _ChildPopen(subprocess.Popen):
+    """
+    Popen that reaps with wait4, keeping the child's own CPU time and
+    peak RSS in `rusage` (getrusage(RUSAGE_CHILDREN) would mix in every
+    concurrent encode).
+    """
+
+    rusage = None
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, status, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # Reaped elsewhere; same fallback as Popen._try_wait
+            return (self.pid, 0)
+
+        if pid == self.pid:
+            self.rusage = rusage
+        return (pid, status)
+
+    def exited(self):
+        """
+        Whether the process has exited, without reaping it, so wait()
+        still collects its rusage.
+        """
+        if self.returncode is not None:
+            return True
+
+        try:
+            return os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+        except ChildProcessError:
+            return True
+
+
+class ProgressMonitor:
+    """
+    Follows an ffmpeg process through its -progress key=value stream.
+
+    A reader thread keeps the latest fps, speed and out_time; a watchdog
+    kills the process when out_time stops advancing for stall_timeout
+    seconds or the whole run passes its deadline.
+    """
+
+    def __init__(self, proc, progress_fd, label, duration, stall_timeout=FFMPEG_STALL_TIMEOUT_SECONDS):
+        self.proc = proc
+        self.label = label
+        self.duration = duration
+        self.deadline = deadline_for(duration)
+        self.stall_timeout = stall_timeout
+        self.failure = None
+
+        self._exited = threading.Event()
+        self._progress_file = os.fdopen(progress_fd, "r", encoding="utf-8", errors="replace")
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._advanced_at = self._started_at
+        self._logged_at = self._started_at
+        self._finished_at = None
+        self._latest = {"out_time": 0.0, "fps": 0.0, "speed": None, "frame": 0}
+
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._reader.start()
+        self._watchdog.start()
+
+    def snapshot(self):
+        with self._lock:
+            progress = dict(self._latest)
+            end = self._finished_at or time.monotonic()
+
+        wall = end - self._started_at
+        progress["wall"] = wall
+        progress["realtime_factor"] = progress["out_time"] / wall if wall > 0 else 0.0
+        # Some builds report fps=0 on short runs; fall back to frames over wall time
+        if not progress["fps"] and wall > 0:
+            progress["fps"] = progress["frame"] / wall
+        return progress
+
+    def _read(self):
+        block = {}
+        with self._progress_file:
+            for line in self._progress_file:
+                key, _, value = line.strip().partition("=")
+                if key != "progress":
+                    block[key] = value
+                    continue
+
+                self._update(block)
+                block = {}
+
+    def _update(self, block):
+        now = time.monotonic()
+        out_time_us = _parse_seconds(block.get("out_time_us"))
+        speed = block.get("speed", "").rstrip("x")
+
+        with self._lock:
+            if out_time_us is not None and out_time_us / 1e6 > self._latest["out_time"]:
+                self._latest["out_time"] = out_time_us / 1e6
+                self._advanced_at = now
+
+            self._latest["fps"] = _parse_seconds(block.get("fps")) or self._latest["fps"]
+            self._latest["speed"] = _parse_seconds(speed) or self._latest["speed"]
+            self._latest["frame"] = int(_parse_seconds(block.get("frame")) or self._latest["frame"])
+
+            if now - self._logged_at < FFMPEG_PROGRESS_LOG_SECONDS:
+                return
+            self._logged_at = now
+
+        progress = self.snapshot()
+        logger.info(
+            "ffmpeg_progress | label=%s out_time=%.1f/%s fps=%.1f speed=%s",
+            self.label,
+            progress["out_time"],
+            f"{self.duration:.1f}" if self.duration else "?",
+            progress["fps"],
+            progress["speed"]
+        )
+
+    def _watch(self):
+        while not self._exited.wait(WATCHDOG_INTERVAL_SECONDS):
+            if self.proc.exited():
+                return
+
+            now = time.monotonic()
+
+            with self._lock:
+                stalled_for = now - self._advanced_at
+
+            if stalled_for > self.stall_timeout:
+                self._kill(f"ffmpeg_stalled | label={self.label} no_progress_for={stalled_for:.0f}s")
+                return
+
+            if now - self._started_at > self.deadline:
+                self._kill(f"ffmpeg_deadline_exceeded | label={self.label} deadline={self.deadline:.0f}s")
+                return
+
+    def _kill(self, reason):
+        progress = self.snapshot()
+        self.failure = f"{reason} out_time={progress['out_time']:.1f}"
+        logger.error(self.failure)
+        self.proc.kill()
+
+    def finish(self):
+        """
+        Waits for the monitor threads after the process exited and
+        returns the final progress snapshot.
+        """
+        with self._lock:
+            self._finished_at = time.monotonic()
+
+        self._exited.set()
+        self._watchdog.join()
+        self._reader.join(timeout=5)
+
+        progress = self.snapshot()
+        usage = self.proc.rusage
+
+        if usage is not None:
+            progress["user_seconds"] = usage.ru_utime
+            progress["system_seconds"] = usage.ru_stime
+            # ru_maxrss is in KiB on Linux
+            progress["max_rss_mb"] = usage.ru_maxrss / 1024
+
+        logger.info(
+            "ffmpeg_render_speed | label=%s returncode=%s out_time=%.1f wall=%.1f realtime_factor=%.2f fps=%.1f "
+            "cpu_s=%.1f max_rss_mb=%.0f",
+            self.label,
+            self.proc.returncode,
+            progress["out_time"],
+            progress["wall"],
+            progress["realtime_factor"],
+            progress["fps"],
+            progress.get("user_seconds", 0.0) + progress.get("system_seconds", 0.0),
+            progress.get("max_rss_mb", 0.0)
+        )
+
+        sink = _usage_sink
+        if sink is not None:
+            sink({
+                "label": self.label,
+                "returncode": self.proc.returncode,
+                "command": list(self.proc.args),
+                **progress
+            })
+
+        return progress
+
+
+# ----------------------------------------
+# Scheduling
+# ----------------------------------------
+
+class FFmpegScheduler:
+    """
+    Admission control for ffmpeg subprocesses.
+
+    At most max_concurrent encodes run at once; the rest queue on a
+    semaphore. Each admitted encode is given an equal share
+    of the CPU quota through -filter_threads, -filter_complex_threads and
+    -threads on every video encoder (libx264 maps -threads to its own
+    frame-thread count). Stream copies and tiny probes pass with
+    encode=False and skip all three.
+
+    Every process, admitted or not, reports through -progress and is
+    watched by a ProgressMonitor.
+    """
+
+    def __init__(self, cpus=None, max_concurrent=None):
+        self.cpus = cpus or available_cpus()
+        self.max_concurrent = max_concurrent or max(
+            1,
+            int(self.cpus // FFMPEG_MIN_THREADS_PER_JOB)
+        )
+        self.threads_per_job = max(1, int(self.cpus // self.max_concurrent))
+
+        self._slots = threading.Semaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._active = 0
+        self._stats = {
+            "jobs_completed": 0,
+            "jobs_failed": 0,
+            "queue_wait_seconds": 0.0,
+            "jobs_timed_out": 0,
+            "busy_seconds": 0.0,
+            "thread_seconds": 0.0,
+            "media_seconds": 0.0,
+            "render_seconds": 0.0
+        }
+
+        logger.info(
+            "ffmpeg_scheduler_initialized | cpus=%.2f max_concurrent=%d threads_per_job=%d",
+            self.cpus,
+            self.max_concurrent,
+            self.threads_per_job
+        )
+
+    def with_thread_limits(self, command):
+        threads = str(self.threads_per_job)
+        # -filter_threads covers -vf/-af graphs, -filter_complex_threads
+        # the complex graphs most encodes here use
+        limited = [command[0], "-filter_threads", threads, "-filter_complex_threads", threads]
+        has_video_codec = False
+
+        args = command[1:]
+        for previous, arg in zip([None] + args[:-1], args):
+            limited.append(arg)
+            if previous in VIDEO_CODEC_FLAGS:
+                limited += ["-threads", threads]
+                has_video_codec = True
+
+        # Implicit encoder (no -c:v): limit the single output instead
+        if not has_video_codec:
+            limited[-1:-1] = ["-threads", threads]
+
+        return limited
+
+    def _acquire(self):
+        queued_at = time.monotonic()
+        self._slots.acquire()
+        waited = time.monotonic() - queued_at
+
+        with self._lock:
+            self._active += 1
+            self._stats["queue_wait_seconds"] += waited
+
+        return time.monotonic()
+
+    def _release(self, started_at, ok):
+        elapsed = time.monotonic() - started_at
+
+        with self._lock:
+            self._active -= 1
+            self._stats["jobs_completed" if ok else "jobs_failed"] += 1
+            self._stats["busy_seconds"] += elapsed
+            self._stats["thread_seconds"] += elapsed * self.threads_per_job
+
+        self._slots.release()
+
+    def _spawn(self, command, duration, stdin=None, stdout=None, stderr=None):
+        """
+        Starts ffmpeg with -progress written to a private pipe so stdout
+        stays free for media output.
+        """
+        read_fd, write_fd = os.pipe()
+        command = [command[0], "-progress", f"pipe:{write_fd}", "-nostats"] + command[1:]
+
+        if duration is None:
+            duration = expected_media_duration(command)
+
+        try:
+            proc = _ChildPopen(
+                command,
+                stdin=stdin,
+                stdout=stdout,
+                stderr=stderr,
+                pass_fds=(write_fd,)
+            )
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+
+        label = os.path.basename(str(command[-1]))
+        return proc, ProgressMonitor(proc, read_fd, label, duration)
+
+    def _record(self, monitor):
+        progress = monitor.finish()
+
+        with self._lock:
+            self._stats["render_seconds"] += progress["wall"]
+            self._stats["media_seconds"] += progress["out_time"]
+            if monitor.failure:
+                self._stats["jobs_timed_out"] += 1
+
+        return progress
+
+    def _execute(self, command, duration, stdin=None, stdout=None, stderr=None, check=False):
+        proc, monitor = self._spawn(command, duration, stdin, stdout, stderr)
+
+        try:
+            out, err = proc.communicate()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            self._record(monitor)
+
+        if monitor.failure:
+            raise FFmpegTimeoutError(monitor.failure)
+
+        if check and proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args, out, err)
+
+        return subprocess.CompletedProcess(proc.args, proc.returncode, out, err)
+
+    def run(self, command, encode=True, duration=None, stdin=None, stdout=None, stderr=None, check=False):
+        """
+        subprocess.run for an ffmpeg command, queued behind running
+        encodes and limited to this job's thread share.
+
+        `duration` is the expected output length in seconds and sets the
+        deadline; when omitted it is read from -t or the first input.
+        """
+        if not encode:
+            return self._execute(command, duration, stdin, stdout, stderr, check)
+
+        started_at = self._acquire()
+        ok = False
+        try:
+            result = self._execute(
+                self.with_thread_limits(command),
+                duration,
+                stdin,
+                stdout,
+                stderr,
+                check
+            )
+            ok = result.returncode == 0
+            return result
+        finally:
+            self._release(started_at, ok)
+
+    def popen(self, command, duration=None, stdin=None, stdout=None, stderr=None):
+        """
+        subprocess.Popen for a streaming encode; the slot is held until
+        the process exits. A stalled consumer shows up as stalled
+        progress, so the watchdog also covers a hung upload.
+        """
+        started_at = self._acquire()
+
+        try:
+            proc, monitor = self._spawn(
+                self.with_thread_limits(command),
+                duration,
+                stdin,
+                stdout,
+                stderr
+            )
+        except Exception:
+            self._release(started_at, False)
+            raise
+
+        def release_on_exit():
+            returncode = proc.wait()
+            self._record(monitor)
+            self._release(started_at, returncode == 0)
+
+        proc.monitor = monitor
+        threading.Thread(target=release_on_exit, daemon=True).start()
+        return proc
+
+    def metrics(self):
+        """
+        Utilization is allocated thread-seconds over available
+        CPU-seconds since the scheduler started.
+        """
+        wall = time.monotonic() - self._started_at
+
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active"] = self._active
+
+        stats["cpus"] = self.cpus
+        stats["max_concurrent"] = self.max_concurrent
+        stats["threads_per_job"] = self.threads_per_job
+        stats["utilization"] = (
+            stats["thread_seconds"] / (self.cpus * wall) if wall > 0 else 0.0
+        )
+        stats["realtime_factor"] = (
+            stats["media_seconds"] / stats["render_seconds"]
+            if stats["render_seconds"] > 0 else 0.0
+        )
+
+        return stats
+
+
+scheduler = FFmpegScheduler(max_concurrent=FFMPEG_MAX_CONCURRENT or None)
+
+
+def run_ffmpeg(command, encode=True, **kwargs):
+    return scheduler.run(command, encode=encode, **kwargs)
+
+
+def start_ffmpeg(command, **kwargs):
+    return scheduler.popen(command, **kwargs)
+
+
+def log_scheduler_metrics():
+    stats = scheduler.metrics()
+
+    logger.info(
+        "ffmpeg_scheduler_metrics | completed=%d failed=%d timed_out=%d busy_s=%.1f "
+        "queue_wait_s=%.1f utilization=%.2f media_s=%.1f realtime_factor=%.2f",
+        stats["jobs_completed"],
+        stats["jobs_failed"],
+        stats["jobs_timed_out"],
+        stats["busy_seconds"],
+        stats["queue_wait_seconds"],
+        stats["utilization"],
+        stats["media_seconds"],
+        stats["realtime_factor"]
+    )
+
+    return stats
@@ -115,7 +115,8 @@ def cleanup_files() -> None:
         "final_output.mp4",
         "merged_video.mp4",
         "OUT.mp4",
-        "output_subtitles.srt"
+        "output_subtitles.srt",
+        "output_captions.ass"
     ]
 
     for file in files:
@@ -0,0 +1,390 @@
+import time
+import random
+import logging
+import threading
+import http.client
+from collections import Counter, deque
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth.exceptions import TransportError
+
+from config import (
+    NET_POOL_SIZE,
+    NET_RETRY_BUDGET_RATIO,
+    NET_RETRY_BUDGET_BURST,
+    NET_RETRY_REFILL_PER_MINUTE,
+    NET_HEDGING,
+    NET_HEDGE_PERCENTILE,
+    NET_HEDGE_WORKERS
+)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+@dataclass(frozen=True)
+class CallPolicy:
+    # Wall-clock limit across every attempt and backoff pause
+    deadline: float
+    # Passed to the client as its request timeout
+    attempt_timeout: float
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+    # Only for idempotent reads whose result is returned, never written
+    # by the call itself: both requests may complete
+    hedge: bool = False
+    # Hedge delay until enough latencies are recorded for a percentile
+    hedge_after: float = 1.0
+
+
+POLICIES = {
+    # Small objects, metadata and listings
+    "gcs_read": CallPolicy(deadline=120, attempt_timeout=60, max_attempts=4, base_delay=0.5, max_delay=8,
+                           hedge=True, hedge_after=2.0),
+    # One GCS_CHUNK_SIZE_MB range of a chunked download
+    "gcs_range": CallPolicy(deadline=300, attempt_timeout=120, max_attempts=4, base_delay=0.5, max_delay=8,
+                            hedge=True, hedge_after=5.0),
+    "gcs_write": CallPolicy(deadline=600, attempt_timeout=300, max_attempts=4, base_delay=0.5, max_delay=8),
+    "image": CallPolicy(deadline=30, attempt_timeout=10, max_attempts=3, base_delay=0.5, max_delay=4,
+                        hedge=True, hedge_after=1.5),
+    # Billed per character, so never hedged
+    "tts": CallPolicy(deadline=180, attempt_timeout=60, max_attempts=3, base_delay=1, max_delay=10),
+    "alignment": CallPolicy(deadline=180, attempt_timeout=60, max_attempts=3, base_delay=1, max_delay=10),
+    # Pauses between resumed upload attempts (youtube_service drives them)
+    "youtube_upload": CallPolicy(deadline=3600, attempt_timeout=600, max_attempts=3, base_delay=5, max_delay=60)
+}
+
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+TRANSIENT_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    http.client.IncompleteRead,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    TransportError
+) + ((httpx.TransportError,) if httpx else ())
+
+
+def _status_code(error):
+    """
+    HTTP status carried by an error from any of the clients in use:
+    google.api_core (code), requests/httpx (response.status_code),
+    elevenlabs (status_code) and googleapiclient (resp.status).
+    """
+    candidates = (
+        getattr(error, "code", None),
+        getattr(error, "status_code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+        getattr(getattr(error, "resp", None), "status", None)
+    )
+    for candidate in candidates:
+        if isinstance(candidate, int):
+            return candidate
+    return None
+
+
+def is_transient(error):
+    """
+    True for errors worth retrying: timeouts, dropped connections and
+    408/429/5xx responses. Other 4xx (not found, precondition failed)
+    are answers, not failures.
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status in TRANSIENT_STATUS
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+# ----------------------------------------
+# Connection pools
+# ----------------------------------------
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def pooled_adapter(size=NET_POOL_SIZE):
+    # Retries belong to call(), not the transport
+    return HTTPAdapter(pool_connections=size, pool_maxsize=size, max_retries=0)
+
+
+def http_session(name="default"):
+    """
+    A process-wide requests.Session per name, so repeated fetches reuse
+    kept-alive connections instead of opening one per request.
+    """
+    with _sessions_lock:
+        session = _sessions.get(name)
+
+        if session is None:
+            session = requests.Session()
+            adapter = pooled_adapter()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[name] = session
+
+    return session
+
+
+# ----------------------------------------
+# Retry budgets and latency
+# ----------------------------------------
+
+class RetryBudget:
+    """
+    Token bucket shared by every call under one policy. Each call earns
+    `ratio` of a retry, time earns `refill_per_minute`, and each retry
+    spends one token, capped at `burst`.
+    """
+
+    def __init__(self, ratio=NET_RETRY_BUDGET_RATIO, burst=NET_RETRY_BUDGET_BURST,
+                 refill_per_minute=NET_RETRY_REFILL_PER_MINUTE):
+        self.ratio = ratio
+        self.burst = burst
+        self.refill_per_second = refill_per_minute / 60
+        self.tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, extra=0.0):
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst,
+            self.tokens + (now - self._updated_at) * self.refill_per_second + extra
+        )
+        self._updated_at = now
+
+    def earn(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def spend(self):
+        with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class LatencyTracker:
+    """
+    Latencies of the last `window` successful requests under one policy.
+    """
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+_budgets = {name: RetryBudget() for name in POLICIES}
+_latency = {name: LatencyTracker() for name in POLICIES}
+_stats = {name: Counter() for name in POLICIES}
+_stats_lock = threading.Lock()
+
+# Separate from pools running the callers, so a hedge never waits
+# behind the request it is hedging
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+# Private so jitter does not shift the sequence seeded runs rely on
+_jitter = random.Random()
+
+
+def _count(name, key, amount=1):
+    with _stats_lock:
+        _stats[name][key] += amount
+
+
+def _get_hedge_pool():
+    global _hedge_pool
+
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(
+                max_workers=NET_HEDGE_WORKERS,
+                thread_name_prefix="hedge"
+            )
+
+    return _hedge_pool
+
+
+def retry_budget(name):
+    return _budgets[name]
+
+
+def backoff_delay(name, attempt):
+    """
+    Full-jitter exponential backoff before retry number `attempt` (1-based).
+    """
+    policy = POLICIES[name]
+    return _jitter.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1)))
+
+
+# ----------------------------------------
+# Calls
+# ----------------------------------------
+
+def _timed(name, fn, timeout):
+    started_at = time.monotonic()
+    result = fn(timeout)
+    _latency[name].record(time.monotonic() - started_at)
+    return result
+
+
+def _hedged(name, policy, fn, timeout):
+    """
+    Runs fn, and if it has not answered within the policy's latency
+    percentile, a second copy alongside it. The first success wins; the
+    loser is left to finish on its own timeout.
+    """
+    pool = _get_hedge_pool()
+    hedge_after = _latency[name].percentile(NET_HEDGE_PERCENTILE / 100) or policy.hedge_after
+    hedge_after = min(hedge_after, timeout)
+
+    primary = pool.submit(_timed, name, fn, timeout)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done:
+        return primary.result()
+
+    _count(name, "hedges")
+    secondary = pool.submit(_timed, name, fn, timeout)
+
+    pending = {primary, secondary}
+    ends_at = time.monotonic() + timeout - hedge_after
+    error = None
+
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, ends_at - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+
+        for future in done:
+            if future.exception() is None:
+                if future is secondary:
+                    _count(name, "hedge_wins")
+                return future.result()
+            error = future.exception()
+
+    if error is not None and not pending:
+        raise error
+
+    raise DeadlineExceeded(f"net_attempt_timed_out | call={name} timeout_s={timeout:.1f}")
+
+
+def call(name, fn, retryable=is_transient):
+    """
+    Runs fn(timeout) under the named policy: each attempt gets the
+    policy's timeout (never past the overall deadline), transient errors
+    are retried after full-jitter backoff while the policy's retry
+    budget allows, and hedge-enabled policies race a second request
+    against slow ones. The last error is raised unchanged.
+    """
+    policy = POLICIES[name]
+    budget = _budgets[name]
+    deadline = time.monotonic() + policy.deadline
+    attempt = 0
+
+    budget.earn()
+    _count(name, "calls")
+
+    while True:
+        attempt += 1
+        timeout = min(policy.attempt_timeout, deadline - time.monotonic())
+
+        try:
+            if policy.hedge and NET_HEDGING:
+                return _hedged(name, policy, fn, timeout)
+            return _timed(name, fn, timeout)
+
+        except Exception as e:
+            # Non-transient errors (not found, precondition failed) are
+            # answers the caller handles, not network failures
+            if not retryable(e):
+                raise
+
+            if attempt >= policy.max_attempts:
+                _count(name, "failures")
+                raise
+
+            delay = backoff_delay(name, attempt)
+
+            if time.monotonic() + delay >= deadline:
+                _count(name, "deadline_exceeded")
+                logger.warning("net_deadline_exceeded | call=%s attempts=%d", name, attempt)
+                raise
+
+            if not budget.spend():
+                _count(name, "budget_exhausted")
+                logger.warning("net_retry_budget_exhausted | call=%s attempts=%d", name, attempt)
+                raise
+
+            _count(name, "retries")
+            logger.warning(
+                "net_retry | call=%s attempt=%d delay_s=%.2f error=%s",
+                name,
+                attempt,
+                delay,
+                e
+            )
+            time.sleep(delay)
+
+
+def network_metrics():
+    with _stats_lock:
+        stats = {name: dict(counts) for name, counts in _stats.items() if counts}
+
+    for name, counts in stats.items():
+        p50 = _latency[name].percentile(0.5)
+        p95 = _latency[name].percentile(0.95)
+        counts["p50_seconds"] = round(p50, 3) if p50 is not None else None
+        counts["p95_seconds"] = round(p95, 3) if p95 is not None else None
+
+    return stats
+
+
+def log_network_metrics():
+    stats = network_metrics()
+
+    for name, counts in stats.items():
+        logger.info(
+            "net_metrics | call=%s calls=%d retries=%d failures=%d hedges=%d hedge_wins=%d "
+            "budget_exhausted=%d p50_s=%s p95_s=%s",
+            name,
+            counts.get("calls", 0),
+            counts.get("retries", 0),
+            counts.get("failures", 0),
+            counts.get("hedges", 0),
+            counts.get("hedge_wins", 0),
+            counts.get("budget_exhausted", 0),
+            counts["p50_seconds"],
+            counts["p95_seconds"]
+        )
+
+    return stats
@@ -0,0 +1,321 @@
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import tarfile
+import logging
+import cProfile
+import resource
+import tempfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from config import (
+    PROFILE_RUN,
+    PROFILE_MODE,
+    PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_TOP_ALLOCATIONS,
+    PROFILE_PREFIX
+)
+from services.storage_service import upload_to_gcs
+from utils.timing import set_stage_observer, stage_timings
+from utils.ffmpeg_runner import set_child_usage_sink
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Allocation sites that only describe the profiler itself. Dropped
+# after grouping: Snapshot.filter_traces matches every trace with
+# fnmatch and took over a second per stage boundary.
+EXCLUDED_ALLOCATION_FILES = {
+    tracemalloc.__file__,
+    __file__,
+    "<frozen importlib._bootstrap>",
+    "<unknown>"
+}
+
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler over every Python thread. Stacks are
+    counted in collapsed form ("thread;outer;...;inner count"), which
+    flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, interval_ms=PROFILE_SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+
+                self.counts[";".join([names.get(ident, "thread")] + stack[::-1])] += 1
+
+            self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class MemoryTracker:
+    """
+    Stage observer recording tracemalloc state at every stage boundary:
+    traced memory at start and end, the peak while the stage ran, and
+    the allocation sites that grew the most.
+    """
+
+    def __init__(self, top=PROFILE_TOP_ALLOCATIONS):
+        self.top = top
+        self.records = []
+        self.overall_peak = 0
+        self._open = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+
+    def _line_stats(self):
+        """
+        Live allocations grouped by source line: {"file:line": (bytes, blocks)}.
+        """
+        stats = {}
+        for stat in tracemalloc.take_snapshot().statistics("lineno"):
+            frame = stat.traceback[0]
+            if frame.filename not in EXCLUDED_ALLOCATION_FILES:
+                stats[f"{frame.filename}:{frame.lineno}"] = (stat.size, stat.count)
+        return stats
+
+    def _fold_peak(self):
+        # One global peak counter serves nested stages: fold it into
+        # every open stage before resetting it
+        current, peak = tracemalloc.get_traced_memory()
+        for entry in self._open.values():
+            entry["peak"] = max(entry["peak"], peak)
+        self.overall_peak = max(self.overall_peak, peak)
+        tracemalloc.reset_peak()
+        return current
+
+    def stage_started(self, name):
+        with self._lock:
+            current = self._fold_peak()
+            token = self._next_token
+            self._next_token += 1
+            self._open[token] = {"start": current, "peak": current, "lines": self._line_stats()}
+            return token
+
+    def stage_finished(self, name, token, seconds, ok):
+        with self._lock:
+            current = self._fold_peak()
+            entry = self._open.pop(token)
+            end = self._line_stats()
+
+        start = entry["lines"]
+        growth = sorted(
+            (
+                (where, size - start.get(where, (0, 0))[0], count - start.get(where, (0, 0))[1])
+                for where, (size, count) in end.items()
+            ),
+            key=lambda item: item[1],
+            reverse=True
+        )[:self.top]
+        live = sorted(end.items(), key=lambda item: item[1][0], reverse=True)[:self.top]
+
+        self.records.append({
+            "stage": name,
+            "seconds": round(seconds, 3),
+            "ok": ok,
+            "start_mb": round(entry["start"] / MB, 2),
+            "end_mb": round(current / MB, 2),
+            "peak_mb": round(entry["peak"] / MB, 2),
+            "top_growth": [
+                {"where": where, "size_diff_kb": round(size_diff / 1024, 1), "count_diff": count_diff}
+                for where, size_diff, count_diff in growth if size_diff > 0
+            ],
+            "top_live": [
+                {"where": where, "size_kb": round(size / 1024, 1), "count": count}
+                for where, (size, count) in live
+            ]
+        })
+
+        logger.info(
+            "profile_stage_memory | stage=%s start_mb=%.1f end_mb=%.1f peak_mb=%.1f",
+            name,
+            entry["start"] / MB,
+            current / MB,
+            entry["peak"] / MB
+        )
+
+
+class RunProfile:
+    """
+    Everything captured for one run: Python stacks (sampled, or cProfile
+    on the calling thread with mode="cprofile"), stage memory, ffmpeg
+    child rusage and process CPU totals.
+    """
+
+    def __init__(self, run_id, mode=PROFILE_MODE):
+        self.run_id = run_id
+        self.mode = mode
+        self.memory = MemoryTracker()
+        self.children = []
+        self.sampler = None
+        self.profiler = None
+        self._started_at = None
+        self._usage_before = None
+        self._lock = threading.Lock()
+
+    def _add_child(self, record):
+        with self._lock:
+            self.children.append(record)
+
+    def start(self):
+        self._started_at = time.monotonic()
+        self._usage_before = resource.getrusage(resource.RUSAGE_SELF)
+
+        tracemalloc.start()
+        set_stage_observer(self.memory)
+        set_child_usage_sink(self._add_child)
+
+        if self.mode == "cprofile":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.sampler = StackSampler()
+            self.sampler.start()
+
+        logger.info("profile_started | run_id=%s mode=%s", self.run_id, self.mode)
+
+    def stop(self):
+        if self.profiler:
+            self.profiler.disable()
+        if self.sampler:
+            self.sampler.stop()
+
+        set_child_usage_sink(None)
+        set_stage_observer(None)
+        _, peak = tracemalloc.get_traced_memory()
+        self._traced_peak = max(self.memory.overall_peak, peak)
+        tracemalloc.stop()
+
+        self._wall = time.monotonic() - self._started_at
+        self._usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    def summary(self):
+        before, after = self._usage_before, self._usage_after
+
+        return {
+            "run_id": self.run_id,
+            "mode": self.mode,
+            "wall_seconds": round(self._wall, 3),
+            "python_user_seconds": round(after.ru_utime - before.ru_utime, 3),
+            "python_system_seconds": round(after.ru_stime - before.ru_stime, 3),
+            # Process high-water mark, not just this run's (KiB on Linux)
+            "python_max_rss_mb": round(after.ru_maxrss / 1024, 1),
+            "python_traced_peak_mb": round(self._traced_peak / MB, 2),
+            "ffmpeg_children": len(self.children),
+            "ffmpeg_cpu_seconds": round(sum(
+                child.get("user_seconds", 0.0) + child.get("system_seconds", 0.0)
+                for child in self.children
+            ), 3),
+            "ffmpeg_max_rss_mb": round(max((child.get("max_rss_mb", 0.0) for child in self.children), default=0.0), 1),
+            "stack_samples": self.sampler.samples if self.sampler else None,
+            "stages": stage_timings()
+        }
+
+    def write_bundle(self, path):
+        files = {
+            "summary.json": json.dumps(self.summary(), indent=2),
+            "memory.json": json.dumps(self.memory.records, indent=2),
+            "ffmpeg.json": json.dumps(self.children, indent=2)
+        }
+
+        if self.sampler:
+            files["stacks.collapsed"] = self.sampler.collapsed()
+
+        if self.profiler:
+            text = io.StringIO()
+            pstats.Stats(self.profiler, stream=text).sort_stats("cumulative").print_stats(80)
+            files["profile.txt"] = text.getvalue()
+
+        with tarfile.open(path, "w:gz") as bundle:
+            for name, content in files.items():
+                data = content.encode("utf-8")
+                info = tarfile.TarInfo(f"{self.run_id}/{name}")
+                info.size = len(data)
+                info.mtime = int(time.time())
+                bundle.addfile(info, io.BytesIO(data))
+
+            if self.profiler:
+                with tempfile.NamedTemporaryFile(suffix=".prof") as raw:
+                    self.profiler.dump_stats(raw.name)
+                    bundle.add(raw.name, arcname=f"{self.run_id}/profile.prof")
+
+        return path
+
+
+@contextmanager
+def profiled_run(run_id, enabled=PROFILE_RUN):
+    """
+    Profiles the enclosed run when enabled and uploads the bundle to
+    PROFILE_PREFIX/<date>/<run_id>.tar.gz. A failed upload is logged,
+    never raised, so profiling cannot fail a run.
+    """
+    if not enabled:
+        yield None
+        return
+
+    profile = RunProfile(run_id)
+    profile.start()
+
+    try:
+        yield profile
+
+    finally:
+        profile.stop()
+
+        fd, path = tempfile.mkstemp(suffix=".tar.gz")
+        os.close(fd)
+
+        try:
+            profile.write_bundle(path)
+            day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+            upload_to_gcs(path, f"{PROFILE_PREFIX}{day}/{run_id}.tar.gz")
+
+            logger.info(
+                "profile_uploaded | run_id=%s bytes=%d",
+                run_id,
+                os.path.getsize(path)
+            )
+
+        except Exception:
+            logger.exception("profile_upload_failed | run_id=%s", run_id)
+
+        finally:
+            os.remove(path)
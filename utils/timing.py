@@ -0,0 +1,62 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_timings = []
+_timings_lock = threading.Lock()
+
+# Optional hooks around every stage (see utils.profiling)
+_observer = None
+
+
+def set_stage_observer(observer):
+    """
+    Registers an object with stage_started(name) -> token and
+    stage_finished(name, token, seconds, ok), or None to remove it.
+    """
+    global _observer
+    _observer = observer
+
+
+@contextmanager
+def stage(name):
+    """
+    Times one pipeline stage and records it for the end-of-run report.
+    Failed stages are recorded too, so a slow failure still shows up.
+    """
+    observer = _observer
+    token = observer.stage_started(name) if observer else None
+
+    started_at = time.perf_counter()
+    ok = False
+
+    try:
+        yield
+        ok = True
+
+    finally:
+        elapsed = time.perf_counter() - started_at
+
+        with _timings_lock:
+            _timings.append((name, elapsed, ok))
+
+        logger.info("stage_timing | stage=%s seconds=%.3f ok=%s", name, elapsed, ok)
+
+        if observer:
+            observer.stage_finished(name, token, elapsed, ok)
+
+
+def stage_timings():
+    """
+    Returns [(stage, seconds, ok)] in completion order.
+    """
+    with _timings_lock:
+        return list(_timings)
+
+
+def reset_stage_timings():
+    with _timings_lock:
+        _timings.clear()
@@ -0,0 +1,174 @@
+import os
+import uuid
+import shutil
+import logging
+import threading
+
+from config import WORKSPACE_ROOT, WORKSPACE_BUDGET_MB
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class WorkspaceBudgetExceeded(RuntimeError):
+    pass
+
+
+class Workspace:
+    """
+    Per-run directory for intermediate files.
+
+    On Cloud Run /tmp is RAM-backed, so every artifact is tracked with
+    the number of steps still waiting to read it. When the last consumer
+    releases an artifact it is deleted straight away, keeping the live
+    footprint (and the reported peak) small. The footprint is measured
+    on disk whenever an artifact is tracked, and a run that goes past
+    the budget fails there rather than running the container out of memory.
+    """
+
+    def __init__(self, root=WORKSPACE_ROOT, budget_mb=WORKSPACE_BUDGET_MB, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.dir = os.path.join(root, self.run_id)
+        self.budget_bytes = budget_mb * MB
+
+        self._artifacts = {}
+        self._peak_bytes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.dir, exist_ok=True)
+
+        logger.info(
+            "workspace_created | dir=%s budget_mb=%d",
+            self.dir,
+            budget_mb
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def usage(self):
+        """
+        Bytes currently on disk under the workspace, tracked or not.
+        """
+        total = 0
+        for dirpath, _, filenames in os.walk(self.dir):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except FileNotFoundError:
+                    continue
+        return total
+
+    def track(self, path, consumers=1):
+        """
+        Registers a freshly written artifact that `consumers` later steps
+        will read. Tracking an existing path again adds to its consumers.
+        Raises WorkspaceBudgetExceeded once the workspace holds more than
+        its budget.
+        """
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+
+        with self._lock:
+            if path in self._artifacts:
+                self._artifacts[path] += consumers
+            else:
+                self._artifacts[path] = consumers
+
+        logger.info(
+            "workspace_artifact_tracked | file=%s size_mb=%.1f consumers=%d",
+            os.path.basename(path),
+            size / MB,
+            consumers
+        )
+
+        self.check()
+        return path
+
+    def check(self):
+        """
+        Samples the footprint into the peak and raises
+        WorkspaceBudgetExceeded when it is over budget. Called by track()
+        and after steps whose inputs and outputs briefly coexist.
+        """
+        current_bytes = self.usage()
+
+        with self._lock:
+            self._peak_bytes = max(self._peak_bytes, current_bytes)
+
+        if current_bytes > self.budget_bytes:
+            raise WorkspaceBudgetExceeded(
+                f"workspace_budget_exceeded | current_mb={current_bytes / MB:.1f} "
+                f"budget_mb={self.budget_bytes / MB:.1f}"
+            )
+
+        return current_bytes
+
+    def release(self, *paths):
+        """
+        Marks one consumer of each artifact as finished and deletes
+        artifacts that nothing is waiting on any more.
+        """
+        for path in paths:
+            with self._lock:
+                if path not in self._artifacts:
+                    continue
+
+                self._artifacts[path] -= 1
+                if self._artifacts[path] > 0:
+                    continue
+
+                del self._artifacts[path]
+
+            self._remove(path)
+
+    def discard(self, *paths):
+        """
+        Deletes intermediates that no later step reads.
+        """
+        for path in paths:
+            self._remove(path)
+
+    def report(self):
+        current_bytes = self.usage()
+
+        with self._lock:
+            self._peak_bytes = max(self._peak_bytes, current_bytes)
+            return {
+                "run_id": self.run_id,
+                "current_mb": round(current_bytes / MB, 1),
+                "peak_mb": round(self._peak_bytes / MB, 1),
+                "budget_mb": round(self.budget_bytes / MB, 1),
+                "live_artifacts": len(self._artifacts)
+            }
+
+    def close(self):
+        stats = self.report()
+
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+        logger.info(
+            "workspace_closed | run_id=%s peak_mb=%.1f budget_mb=%.1f leftover_artifacts=%d",
+            stats["run_id"],
+            stats["peak_mb"],
+            stats["budget_mb"],
+            stats["live_artifacts"]
+        )
+
+        return stats
+
+    def _remove(self, path):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info("workspace_artifact_removed | file=%s", os.path.basename(path))
+
+        except Exception:
+            logger.exception("workspace_artifact_removal_failed | file=%s", path)
@@ -0,0 +1,349 @@
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import logging
+import threading
+import statistics
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from utils.logger import setup_logging
+from main import MODES
+from services.storage_service import get_bucket
+from services.config_service import load_runtime_config
+from services.phash_service import get_phash_index, refresh_phash_index
+from services.tts_service import get_tts_client
+from services.worker_queue import request_queue
+from services.video_service import (
+    unknown_renditions,
+    unknown_motion_effects,
+    RENDITIONS,
+    MOTION_EFFECTS,
+    ENCODE_MODES
+)
+from utils.logging_utils import cleanup_files, log_error
+from utils.job_control import should_run_job
+from utils.workspace import Workspace
+from utils.ffmpeg_runner import log_scheduler_metrics
+from utils.network import log_network_metrics
+from utils.timing import stage, stage_timings, reset_stage_timings
+from utils.profiling import profiled_run
+from config import (
+    PIPELINE_MODE,
+    OUTPUT_RENDITIONS,
+    FOREGROUND_MOTION,
+    ENCODE_MODE,
+    WORKER_QUEUE_DIR,
+    WORKER_POLL_SECONDS,
+    WORKER_IDLE_EXIT_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# While the error threshold holds the worker back, errors.csv is
+# re-checked this often instead of on every poll
+ERROR_RECHECK_SECONDS = 300
+
+
+class WorkerMetrics:
+    """
+    Throughput and latency counters for one worker process. Latencies
+    keep the most recent `window` jobs.
+    """
+
+    def __init__(self, window=200):
+        self.started_at = time.monotonic()
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.busy_seconds = 0.0
+        self.run_seconds = deque(maxlen=window)
+        self.queue_seconds = deque(maxlen=window)
+
+    def record(self, ok, run_seconds, queue_seconds):
+        if ok:
+            self.jobs_completed += 1
+        else:
+            self.jobs_failed += 1
+
+        self.busy_seconds += run_seconds
+        self.run_seconds.append(run_seconds)
+        self.queue_seconds.append(queue_seconds)
+
+    @staticmethod
+    def _percentile(values, fraction):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self):
+        uptime = time.monotonic() - self.started_at
+        jobs = self.jobs_completed + self.jobs_failed
+
+        return {
+            "uptime_seconds": round(uptime, 1),
+            "jobs_completed": self.jobs_completed,
+            "jobs_failed": self.jobs_failed,
+            "jobs_per_hour": round(jobs * 3600 / uptime, 2) if uptime else 0.0,
+            "utilization": round(self.busy_seconds / uptime, 3) if uptime else 0.0,
+            "run_p50_seconds": round(statistics.median(self.run_seconds), 2) if self.run_seconds else 0.0,
+            "run_p95_seconds": round(self._percentile(self.run_seconds, 0.95), 2),
+            "queue_p50_seconds": round(statistics.median(self.queue_seconds), 2) if self.queue_seconds else 0.0,
+            "queue_p95_seconds": round(self._percentile(self.queue_seconds, 0.95), 2)
+        }
+
+    def log(self):
+        stats = self.snapshot()
+        logger.info(
+            "worker_metrics | completed=%d failed=%d jobs_per_hour=%.2f utilization=%.2f "
+            "run_p50_s=%.1f run_p95_s=%.1f queue_p50_s=%.1f queue_p95_s=%.1f",
+            stats["jobs_completed"],
+            stats["jobs_failed"],
+            stats["jobs_per_hour"],
+            stats["utilization"],
+            stats["run_p50_seconds"],
+            stats["run_p95_seconds"],
+            stats["queue_p50_seconds"],
+            stats["queue_p95_seconds"]
+        )
+        return stats
+
+
+def warm_up():
+    """
+    Builds the clients and loads the shared state every job needs, once,
+    before the first job is claimed. Each piece is optional: a worker
+    that only renders has no use for YouTube credentials.
+    """
+    steps = {
+        "storage": get_bucket,
+        "runtime_config": load_runtime_config,
+        "phash_index": get_phash_index,
+        "tts": get_tts_client
+    }
+
+    for name, step in steps.items():
+        try:
+            with stage(f"warm_{name}"):
+                step()
+        except Exception:
+            logger.exception("worker_warm_up_failed | step=%s", name)
+
+
+@contextmanager
+def claim_heartbeat(queue, job):
+    """
+    Refreshes the job's claim on a background thread while the body
+    runs, so a long job is not taken over by another worker.
+    """
+    stop = threading.Event()
+    interval = queue.claim_timeout / 3
+
+    def beat():
+        while not stop.wait(interval):
+            try:
+                if not queue.heartbeat(job):
+                    logger.error("worker_claim_lost | job_id=%s", job.job_id)
+                    return
+            except Exception:
+                # A missed beat is retried; the claim only expires after
+                # several in a row
+                logger.exception("worker_heartbeat_failed | job_id=%s", job.job_id)
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job.job_id}", daemon=True)
+    thread.start()
+
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def request_mode(job):
+    """
+    The pipeline mode a request asks for, or None if it is malformed.
+    """
+    if not isinstance(job.request, dict):
+        return None
+
+    mode = job.request.get("mode", PIPELINE_MODE)
+    return mode if mode in MODES else None
+
+
+def run_job(job, mode):
+    """
+    Runs one job request in its own workspace. Clients, runtime config,
+    the hash index and asset caches stay warm in the process; the index
+    is brought up to date first, as other instances publish too.
+    """
+    reset_stage_timings()
+    cleanup_files()
+
+    with Workspace(run_id=job.job_id) as ws:
+        with profiled_run(job.job_id):
+            with stage("total"):
+                with stage("phash_refresh"):
+                    refresh_phash_index()
+                MODES[mode](ws)
+
+    gc.collect()
+
+
+def serve(queue, worker_id, poll_seconds=WORKER_POLL_SECONDS, idle_exit_seconds=WORKER_IDLE_EXIT_SECONDS):
+    """
+    Claims and runs jobs until SIGTERM/SIGINT. A stop request lets the
+    in-flight job finish and be recorded before the loop exits; a worker
+    killed anyway leaves a claim that expires and is taken over.
+    """
+    stopping = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info("worker_stop_requested | signal=%s", signal.Signals(signum).name)
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    metrics = WorkerMetrics()
+    idle_since = time.monotonic()
+
+    # Same error threshold as a one-shot job: checked at start and after
+    # every failure, then every ERROR_RECHECK_SECONDS while it holds
+    check_errors = True
+    next_error_check = 0.0
+
+    while not stopping.is_set():
+        if check_errors:
+            if time.monotonic() < next_error_check:
+                stopping.wait(poll_seconds)
+                continue
+
+            if not should_run_job(10):
+                logger.info("worker_paused_error_threshold")
+                next_error_check = time.monotonic() + ERROR_RECHECK_SECONDS
+                continue
+
+            check_errors = False
+
+        job = queue.claim(worker_id)
+
+        if job is None:
+            if idle_exit_seconds and time.monotonic() - idle_since >= idle_exit_seconds:
+                logger.info("worker_idle_exit | idle_seconds=%.0f", time.monotonic() - idle_since)
+                break
+            stopping.wait(poll_seconds)
+            continue
+
+        queue_seconds = max(0.0, (datetime.now(timezone.utc) - job.enqueued_at).total_seconds())
+        logger.info("worker_job_claimed | job_id=%s queue_seconds=%.1f", job.job_id, queue_seconds)
+
+        started_at = time.monotonic()
+        mode = request_mode(job)
+        result = {"worker": worker_id, "mode": mode}
+
+        if mode is None:
+            # A bad request is not a pipeline failure; it must not hold
+            # the worker back through the error threshold
+            logger.error("worker_request_invalid | job_id=%s request=%r", job.job_id, job.request)
+            result["ok"] = False
+            result["error"] = "worker_request_invalid"
+            result["run_seconds"] = 0.0
+            queue.finish(job, result)
+            continue
+
+        try:
+            with claim_heartbeat(queue, job):
+                run_job(job, mode)
+            result["ok"] = True
+
+        except Exception as e:
+            logger.exception("worker_job_failed | job_id=%s", job.job_id)
+            result["ok"] = False
+            result["error"] = str(e)
+            check_errors = True
+
+            try:
+                log_error("unknown", "unknown", str(e))
+            except Exception:
+                # Already logged; a failed CSV upload must not stop the worker
+                pass
+
+        run_seconds = time.monotonic() - started_at
+        result["run_seconds"] = round(run_seconds, 3)
+        result["stages"] = stage_timings()
+
+        queue.finish(job, result)
+        metrics.record(result["ok"], run_seconds, queue_seconds)
+
+        logger.info(
+            "worker_job_finished | job_id=%s ok=%s run_seconds=%.1f",
+            job.job_id,
+            result["ok"],
+            run_seconds
+        )
+
+        queue.publish_status(worker_id, metrics.log())
+        idle_since = time.monotonic()
+
+    return metrics
+
+
+def main():
+    setup_logging()
+
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    queue = request_queue(WORKER_QUEUE_DIR)
+
+    unknown = unknown_renditions(OUTPUT_RENDITIONS)
+    if unknown:
+        logger.error(
+            "unknown_output_renditions | renditions=%s known=%s",
+            ",".join(unknown),
+            ",".join(RENDITIONS)
+        )
+        sys.exit(2)
+
+    unknown = unknown_motion_effects(FOREGROUND_MOTION)
+    if unknown:
+        logger.error(
+            "unknown_foreground_motion | effects=%s known=%s",
+            ",".join(unknown),
+            ",".join(MOTION_EFFECTS)
+        )
+        sys.exit(2)
+
+    if ENCODE_MODE not in ENCODE_MODES:
+        logger.error(
+            "unknown_encode_mode | mode=%s known=%s",
+            ENCODE_MODE,
+            ",".join(ENCODE_MODES)
+        )
+        sys.exit(2)
+
+    logger.info(
+        "worker_started | worker=%s queue=%s",
+        worker_id,
+        WORKER_QUEUE_DIR or "bucket"
+    )
+
+    warm_up()
+
+    try:
+        metrics = serve(queue, worker_id)
+        queue.publish_status(worker_id, metrics.log())
+
+    finally:
+        log_scheduler_metrics()
+        log_network_metrics()
+
+    logger.info("worker_stopped | worker=%s", worker_id)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()